@@ -5,6 +5,8 @@ import requests
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 
+from scripts.gmail import GMAIL_API, LIST_FIELDS, fetch_messages_sync, message_summary
+
 class IntegrationManager:
     """Manages all external integrations for Michael's AI Assistant"""
     
@@ -61,38 +63,30 @@ class IntegrationManager:
         headers = {"Authorization": f"Bearer {self.google_token}"}
         
         # First get message IDs
-        url = "https://www.googleapis.com/gmail/v1/users/me/messages"
+        url = f"{GMAIL_API}/messages"
         params = {
             'q': 'is:unread OR is:important OR from:client',
-            'maxResults': max_results
+            'maxResults': max_results,
+            'fields': LIST_FIELDS
         }
         
         try:
             response = requests.get(url, headers=headers, params=params)
             if response.status_code == 200:
-                messages = response.json().get('messages', [])
+                message_ids = [msg['id'] for msg in response.json().get('messages', [])]
+
+                # Metadata only, every message in one batch request
                 emails = []
-                
-                for msg in messages[:5]:  # Limit to avoid API overuse
-                    msg_url = f"https://www.googleapis.com/gmail/v1/users/me/messages/{msg['id']}"
-                    msg_response = requests.get(msg_url, headers=headers)
-                    
-                    if msg_response.status_code == 200:
-                        msg_data = msg_response.json()
-                        payload = msg_data.get('payload', {})
-                        headers_list = payload.get('headers', [])
-                        
-                        sender = next((h['value'] for h in headers_list if h['name'] == 'From'), 'Unknown')
-                        subject = next((h['value'] for h in headers_list if h['name'] == 'Subject'), 'No subject')
-                        
-                        emails.append({
-                            'sender': sender,
-                            'subject': subject,
-                            'snippet': msg_data.get('snippet', ''),
-                            'labels': msg_data.get('labelIds', []),
-                            'id': msg['id']
-                        })
-                
+                for msg_data in fetch_messages_sync(self.google_token, message_ids):
+                    summary = message_summary(msg_data)
+                    emails.append({
+                        'sender': summary['sender'],
+                        'subject': summary['subject'],
+                        'snippet': summary['snippet'],
+                        'labels': summary['labels'],
+                        'id': summary['id']
+                    })
+
                 return emails
         except Exception as e:
             print(f"Error fetching emails: {e}")
@@ -1,6 +1,6 @@
 import os, openai, pinecone, json, requests
-from datetime import datetime, timedelta
-from fastapi import FastAPI, Query, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, Query, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,12 +8,31 @@ from pydantic import BaseModel
 from sqlmodel import SQLModel, Field, create_engine, Session, select
 from typing import Optional, List, Dict, Any
 import asyncio
-import aiohttp
+import time
 import urllib.parse
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import sqlite3
+import uuid
 from pathlib import Path
+from scripts.single_flight import single_flight
+from scripts.llm_scheduler import llm_scheduler, estimate_tokens, INTERACTIVE, AdmissionTimeout
+from scripts.deadline import Deadline, DeadlineExceeded
+from scripts.prompt_builder import prompt_builder
+from scripts.offline_fallback import offline_system
+from scripts.sync_worker import sync_worker
+from scripts.http_client import http_client
+from scripts.response_cache import response_cache
+from scripts.calendar_store import calendar_store
+from scripts.calendar_sync import CALENDAR_API, sync_calendars
+from scripts.agenda_cache import agenda_cache, range_events
+from scripts.free_busy import free_busy, answer_schedule_question
+from scripts.calendar_store import normalize_time
+from scripts import gmail
+from scripts.mail_store import mail_store
+from scripts.mail_priority import mail_priority
+from scripts.mail_sync import sync_mailbox
+from scripts.notion_workspaces import load_workspaces
 
 try:
     from dotenv import load_dotenv
@@ -103,14 +122,17 @@ app.add_middleware(
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Background sync task
-sync_task = None
-
 @app.on_event("startup")
 async def start_background_tasks():
-    global sync_task
     print("🚀 Starting ATLAS - Michael's AI Companion")
 
+    # OpenAI calls from the sync worker's thread are queued on this loop
+    llm_scheduler.bind_loop(asyncio.get_running_loop())
+
+    # Pooled HTTP sessions for Notion, Google and OAuth calls; the worker closes its own on stop
+    http_client.open()
+    sync_worker.add_shutdown_hook(http_client.close)
+
     # Initialize database
     init_database()
     print("🗄️  Database initialized")
@@ -125,20 +147,19 @@ async def start_background_tasks():
     if os.environ.get("NOTION_API_KEY"):
         print("🔍 Testing Notion API connection...")
         try:
-            import aiohttp
             headers = {
                 "Authorization": f"Bearer {os.environ.get('NOTION_API_KEY')}",
                 "Content-Type": "application/json",
                 "Notion-Version": "2022-06-28"
             }
-            async with aiohttp.ClientSession() as session:
-                async with session.get("https://api.notion.com/v1/users/me", headers=headers) as response:
-                    if response.status == 200:
-                        user_data = await response.json()
-                        print(f"✅ Notion API connection successful - User: {user_data.get('name', 'Unknown')}")
-                    else:
-                        response_text = await response.text()
-                        print(f"❌ Notion API test failed: {response.status} - {response_text}")
+            session = http_client.session("notion")
+            async with session.get("https://api.notion.com/v1/users/me", headers=headers) as response:
+                if response.status == 200:
+                    user_data = await response.json()
+                    print(f"✅ Notion API connection successful - User: {user_data.get('name', 'Unknown')}")
+                else:
+                    response_text = await response.text()
+                    print(f"❌ Notion API test failed: {response.status} - {response_text}")
         except Exception as e:
             print(f"❌ Notion API test error: {e}")
 
@@ -152,8 +173,18 @@ async def start_background_tasks():
                 replace_existing=True,
                 max_instances=1
             )
+            # The mail mirror follows Gmail history every minute, so email endpoints never call Gmail
+            scheduler.add_job(
+                sync_gmail,
+                IntervalTrigger(seconds=MAIL_SYNC_INTERVAL_S),
+                id='gmail_sync',
+                replace_existing=True,
+                max_instances=1,
+                next_run_time=datetime.now() + timedelta(seconds=30)
+            )
             scheduler.start()
             print("📅 Google Calendar sync scheduler started (every 10 minutes)")
+            print(f"📧 Gmail mirror sync started (every {MAIL_SYNC_INTERVAL_S}s)")
             
             # Run initial calendar sync after 30 seconds
             asyncio.create_task(initial_calendar_sync())
@@ -164,13 +195,12 @@ async def start_background_tasks():
     # Start background sync with improved error handling
     if has_notion and has_required_keys:
         try:
-            from scripts.notion_sync import scheduler as notion_scheduler
-            sync_task = asyncio.create_task(notion_scheduler())
+            from scripts.notion_sync import start_scheduler as start_notion_scheduler
+            # Syncs run on the sync worker's own thread and event loop, off the request loop;
+            # the scheduler runs the first (incremental) pass shortly after startup
+            start_notion_scheduler(sync_worker)
             print("🔄 Background Notion sync started")
 
-            # Run an initial sync after a short delay
-            asyncio.create_task(initial_sync())
-
         except ImportError as e:
             print(f"⚠️  Could not start background sync: {e}")
         except Exception as e:
@@ -185,17 +215,6 @@ async def start_background_tasks():
             missing.append("PINECONE_API_KEY")
         print(f"⚠️  Background sync disabled - missing: {', '.join(missing)}")
 
-async def initial_sync():
-    """Run initial sync after startup"""
-    await asyncio.sleep(5)  # Wait 5 seconds for server to fully start
-    try:
-        from scripts.notion_sync import full_sync
-        print("🔄 Running initial Notion sync...")
-        await full_sync()
-        print("✅ Initial sync completed")
-    except Exception as e:
-        print(f"⚠️  Initial sync failed: {e}")
-
 async def initial_calendar_sync():
     """Run initial calendar sync after startup"""
     await asyncio.sleep(30)  # Wait for server to be fully ready
@@ -203,14 +222,10 @@ async def initial_calendar_sync():
 
 @app.on_event("shutdown")
 async def shutdown_background_tasks():
-    global sync_task
-    if sync_task:
-        sync_task.cancel()
-        try:
-            await sync_task
-        except asyncio.CancelledError:
-            pass
-    
+    # Cancel any running sync and stop the worker thread
+    await asyncio.to_thread(sync_worker.stop)
+    await http_client.close()
+
     # Shutdown scheduler
     if scheduler.running:
         scheduler.shutdown()
@@ -234,6 +249,7 @@ class EmailSummary(BaseModel):
     snippet: str
     importance: str
     timestamp: datetime
+    score: Optional[int] = None
 
 class IntegrationStatus(BaseModel):
     name: str
@@ -298,25 +314,7 @@ def init_database():
     SQLModel.metadata.create_all(engine)
     
     # Create events database
-    
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id TEXT PRIMARY KEY,
-            title TEXT NOT NULL,
-            start_time TEXT NOT NULL,
-            end_time TEXT NOT NULL,
-            color TEXT DEFAULT '#3b82f6',
-            description TEXT,
-            location TEXT,
-            last_updated TEXT NOT NULL
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    calendar_store.init_database()
 
 def get_db_connection():
     """Get database connection"""
@@ -330,87 +328,98 @@ def get_session():
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
 calendar_sync_running = False
+mail_sync_running = False
+MAIL_SYNC_INTERVAL_S = int(os.environ.get("MAIL_SYNC_INTERVAL_S", "60"))
 
 # Helper functions for integrations
 async def get_google_calendar_events(access_token: str, days_ahead: int = 7) -> List[CalendarEvent]:
     """Get calendar events from Google Calendar"""
     try:
         headers = {"Authorization": f"Bearer {access_token}"}
-        now = datetime.utcnow()
-        time_min = now.isoformat() + 'Z'
-        time_max = (now + timedelta(days=days_ahead)).isoformat() + 'Z'
-
-        url = f"https://www.googleapis.com/calendar/v3/calendars/primary/events"
+        # The request asks for whole hours, so every call within the hour shares one cache entry
+        # (and its ETag); the exact window is cut out of the result below
+        now = datetime.now(timezone.utc)
+        window_end = now + timedelta(days=days_ahead)
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        hour_end = window_end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        time_min = hour_start.strftime('%Y-%m-%dT%H:%M:%SZ')
+        time_max = hour_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        url = f"{CALENDAR_API}/calendars/primary/events"
         params = {
             'timeMin': time_min,
             'timeMax': time_max,
-            'singleEvents': True,
+            'singleEvents': 'true',
             'orderBy': 'startTime'
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    events = []
-                    for item in data.get('items', []):
-                        start = item['start'].get('dateTime', item['start'].get('date'))
-                        end = item['end'].get('dateTime', item['end'].get('date'))
-                        events.append(CalendarEvent(
-                            id=item['id'],
-                            title=item.get('summary', 'No title'),
-                            start_time=datetime.fromisoformat(start.replace('Z', '+00:00')),
-                            end_time=datetime.fromisoformat(end.replace('Z', '+00:00')),
-                            description=item.get('description', '')
-                        ))
-                    return events
-                else:
-                    print(f"Calendar API error: {response.status}")
-                    return []
+        # Served from the response cache while fresh, revalidated with the event list's ETag after that
+        status, data = await response_cache.get_json("google", url, headers, params)
+        if status != 200:
+            print(f"Calendar API error: {status}")
+            return []
+
+        events = []
+        for item in data.get('items', []):
+            start = item['start'].get('dateTime', item['start'].get('date'))
+            end = item['end'].get('dateTime', item['end'].get('date'))
+            start_time = datetime.fromisoformat(start.replace('Z', '+00:00'))
+            end_time = datetime.fromisoformat(end.replace('Z', '+00:00'))
+            # Same test Google applies to timeMin/timeMax (all-day dates are local midnight)
+            if end_time.astimezone(timezone.utc) <= now or start_time.astimezone(timezone.utc) >= window_end:
+                continue
+            events.append(CalendarEvent(
+                id=item['id'],
+                title=item.get('summary', 'No title'),
+                start_time=start_time,
+                end_time=end_time,
+                description=item.get('description', '')
+            ))
+        return events
     except Exception as e:
         print(f"Error fetching calendar: {e}")
         return []
 
 async def get_gmail_summary(access_token: str, max_results: int = 10) -> List[EmailSummary]:
-    """Get recent important emails from Gmail"""
+    """Get recent unread or important emails from Gmail, ranked by the mail priority scorer"""
     try:
         headers = {"Authorization": f"Bearer {access_token}"}
-        url = "https://www.googleapis.com/gmail/v1/users/me/messages"
+        url = f"{gmail.GMAIL_API}/messages"
         params = {
             'q': 'is:unread OR is:important',
-            'maxResults': max_results
+            'maxResults': max_results,
+            'fields': gmail.LIST_FIELDS
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    emails = []
-
-                    for message in data.get('messages', []):
-                        msg_url = f"https://www.googleapis.com/gmail/v1/users/me/messages/{message['id']}"
-                        async with session.get(msg_url, headers=headers) as msg_response:
-                            if msg_response.status == 200:
-                                msg_data = await msg_response.json()
-                                payload = msg_data.get('payload', {})
-                                headers_list = payload.get('headers', [])
-
-                                sender = next((h['value'] for h in headers_list if h['name'] == 'From'), 'Unknown')
-                                subject = next((h['value'] for h in headers_list if h['name'] == 'Subject'), 'No subject')
-                                date_str = next((h['value'] for h in headers_list if h['name'] == 'Date'), '')
-
-                                emails.append(EmailSummary(
-                                    sender=sender,
-                                    subject=subject,
-                                    snippet=msg_data.get('snippet', ''),
-                                    importance='high' if 'IMPORTANT' in msg_data.get('labelIds', []) else 'normal',
-                                    timestamp=datetime.now()  # Simplified for now
-                                ))
-
-                    return emails
-                else:
-                    print(f"Gmail API error: {response.status}")
-                    return []
+        session = http_client.session("google")
+        async with session.get(url, headers=headers, params=params) as response:
+            if response.status != 200:
+                print(f"Gmail API error: {response.status}")
+                return []
+            data = await response.json()
+
+        # One batch request for every message's From/Subject/Date and snippet
+        message_ids = [message['id'] for message in data.get('messages', [])]
+        messages, _ = await gmail.fetch_messages(session, access_token, message_ids)
+        summaries = []
+        for message in messages:
+            summary = gmail.message_summary(message)
+            received_at = summary['received_at'] or datetime.now()
+            summaries.append({**summary, 'received_at': received_at, 'received_ts': received_at.timestamp()})
+
+        # Same scoring as the mirror; with no sender history yet only clients, labels and age count
+        ranked = await asyncio.to_thread(mail_priority.rank, summaries)
+        return [
+            EmailSummary(
+                sender=summary['sender'],
+                subject=summary['subject'],
+                snippet=summary['snippet'],
+                importance=summary['importance'],
+                timestamp=summary['received_at'],
+                score=summary['score']
+            )
+            for summary in ranked
+        ]
     except Exception as e:
         print(f"Error fetching emails: {e}")
         return []
@@ -432,67 +441,64 @@ async def sync_google_calendar():
             return
         
         print("📅 Starting Google Calendar sync...")
-        
-        # Get events for the next 30 days
-        calendar_events = await get_google_calendar_events(access_token, days_ahead=30)
-        
-        if not calendar_events:
-            print("📅 No calendar events found")
-            return
-        
-        # Store events in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Clear existing events (simple approach - in production, you'd do incremental sync)
-        cursor.execute("DELETE FROM events WHERE id LIKE 'gcal_%'")
-        
-        synced_count = 0
-        for event in calendar_events:
-            try:
-                event_id = f"gcal_{event.id}"
-                
-                # Determine color based on event title
-                color = "#3b82f6"  # Default blue
-                title_lower = event.title.lower()
-                if any(word in title_lower for word in ['meeting', 'call']):
-                    color = "#10b981"  # Green for meetings
-                elif any(word in title_lower for word in ['project', 'work']):
-                    color = "#f59e0b"  # Amber for work
-                elif any(word in title_lower for word in ['personal', 'doctor', 'appointment']):
-                    color = "#8b5cf6"  # Purple for personal
-                
-                cursor.execute('''
-                    INSERT OR REPLACE INTO events 
-                    (id, title, start_time, end_time, color, description, location, last_updated)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    event_id,
-                    event.title,
-                    event.start_time.isoformat(),
-                    event.end_time.isoformat(),
-                    color,
-                    event.description or '',
-                    getattr(event, 'location', ''),
-                    datetime.now().isoformat()
-                ))
-                
-                synced_count += 1
-                
-            except Exception as e:
-                print(f"❌ Error syncing event {event.title}: {e}")
-                continue
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Calendar sync completed: {synced_count} events synced")
+
+        # Selected calendars sync concurrently; each fetches only changes since its last sync token
+        stats = await sync_calendars(access_token)
+        print(f"✅ Calendar sync completed: {stats['calendars']} calendars ({stats['full']} full, {stats['failed']} failed), "
+              f"{stats['upserted']} events updated, {stats['deleted']} removed")
+
+        # Rebuild agenda snapshots and the free/busy index now so requests never pay for it
+        agenda_cache.refresh()
+        free_busy.refresh()
+        # Cached live calendar reads would otherwise lag a change the sync just saw
+        if stats['upserted'] or stats['deleted']:
+            response_cache.invalidate(f"{CALENDAR_API}/calendars/")
         
     except Exception as e:
         print(f"❌ Calendar sync error: {e}")
     finally:
         calendar_sync_running = False
 
+async def sync_gmail():
+    """Advance the local Gmail mirror from its last history id"""
+    global mail_sync_running
+
+    if mail_sync_running:
+        return
+
+    mail_sync_running = True
+
+    try:
+        access_token = await get_valid_google_token()
+        if not access_token:
+            return
+
+        stats = await sync_mailbox(access_token)
+        if stats["full"] or stats["upserted"] or stats["relabeled"] or stats["deleted"]:
+            print(f"📧 Mail sync{' (seed)' if stats['full'] else ''}: {stats['upserted']} messages updated, "
+                  f"{stats['relabeled']} relabeled, {stats['deleted']} removed")
+        if stats["failed"]:
+            print(f"⚠️  Mail sync: {stats['failed']} messages failed to fetch, queued for the next sync")
+
+    except Exception as e:
+        print(f"❌ Mail sync error: {e}")
+    finally:
+        mail_sync_running = False
+
+def mirrored_emails(limit: int = 10) -> List[EmailSummary]:
+    """Highest priority unread or important emails from the local mail mirror, scored locally"""
+    return [
+        EmailSummary(
+            sender=message['sender'],
+            subject=message['subject'],
+            snippet=message['snippet'],
+            importance=message['importance'],
+            timestamp=datetime.fromtimestamp(message['received_ts']),
+            score=message['score']
+        )
+        for message in mail_priority.prioritized(limit)
+    ]
+
 async def get_notion_data(notion_token: str, database_id: str) -> Dict[str, Any]:
     """Get data from Notion database"""
     try:
@@ -504,17 +510,13 @@ async def get_notion_data(notion_token: str, database_id: str) -> Dict[str, Any]
 
         url = f"https://api.notion.com/v1/databases/{database_id}/query"
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json={}) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 401:
-                    print(f"❌ Notion API 401 Unauthorized - Check your NOTION_API_KEY token")
-                    return {}
-                else:
-                    response_text = await response.text()
-                    print(f"❌ Notion API error: {response.status} - {response_text}")
-                    return {}
+        # Notion sends no validators, so repeated queries are only collapsed by the TTL
+        status, data = await response_cache.get_json("notion", url, headers, method="POST", json_body={})
+        if status == 200:
+            return data
+        if status == 401:
+            print(f"❌ Notion API 401 Unauthorized - Check your NOTION_API_KEY token")
+        return {}
     except Exception as e:
         print(f"❌ Error fetching Notion data: {e}")
         return {}
@@ -587,28 +589,28 @@ async def google_callback(code: str = None, error: str = None):
         print(f"🔄 Exchanging code for tokens...")
         print(f"   Redirect URI: {REDIRECT_URI}")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(token_url, data=data) as response:
-                response_text = await response.text()
+        session = http_client.session("oauth")
+        async with session.post(token_url, data=data) as response:
+            response_text = await response.text()
 
-                if response.status == 200:
-                    tokens = await response.json()
-                    print(f"✅ Successfully received tokens")
+            if response.status == 200:
+                tokens = await response.json()
+                print(f"✅ Successfully received tokens")
 
-                    # Store tokens (in production, associate with user ID)
-                    google_tokens["access_token"] = tokens.get("access_token")
-                    google_tokens["refresh_token"] = tokens.get("refresh_token")
-                    google_tokens["expires_at"] = datetime.now() + timedelta(seconds=tokens.get("expires_in", 3600))
+                # Store tokens (in production, associate with user ID)
+                google_tokens["access_token"] = tokens.get("access_token")
+                google_tokens["refresh_token"] = tokens.get("refresh_token")
+                google_tokens["expires_at"] = datetime.now() + timedelta(seconds=tokens.get("expires_in", 3600))
 
-                    print(f"✅ Tokens stored successfully")
-                    print(f"   Access token: {tokens.get('access_token', 'None')[:20]}...")
-                    print(f"   Refresh token: {'Yes' if tokens.get('refresh_token') else 'No'}")
+                print(f"✅ Tokens stored successfully")
+                print(f"   Access token: {tokens.get('access_token', 'None')[:20]}...")
+                print(f"   Refresh token: {'Yes' if tokens.get('refresh_token') else 'No'}")
 
-                    return RedirectResponse(url="/?auth=success")
-                else:
-                    print(f"❌ Token exchange failed: {response.status}")
-                    print(f"   Response: {response_text}")
-                    return RedirectResponse(url=f"/?error=token_exchange_failed_{response.status}")
+                return RedirectResponse(url="/?auth=success")
+            else:
+                print(f"❌ Token exchange failed: {response.status}")
+                print(f"   Response: {response_text}")
+                return RedirectResponse(url=f"/?error=token_exchange_failed_{response.status}")
 
     except Exception as e:
         print(f"❌ OAuth callback error: {str(e)}")
@@ -632,13 +634,13 @@ async def get_valid_google_token():
                     "grant_type": "refresh_token"
                 }
 
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(refresh_url, data=data) as response:
-                        if response.status == 200:
-                            tokens = await response.json()
-                            google_tokens["access_token"] = tokens.get("access_token")
-                            google_tokens["expires_at"] = datetime.now() + timedelta(seconds=tokens.get("expires_in", 3600))
-                            return google_tokens["access_token"]
+                session = http_client.session("oauth")
+                async with session.post(refresh_url, data=data) as response:
+                    if response.status == 200:
+                        tokens = await response.json()
+                        google_tokens["access_token"] = tokens.get("access_token")
+                        google_tokens["expires_at"] = datetime.now() + timedelta(seconds=tokens.get("expires_in", 3600))
+                        return google_tokens["access_token"]
             except Exception as e:
                 print(f"Token refresh failed: {e}")
                 return None
@@ -691,9 +693,9 @@ def status():
         "google_configured": "✓" if os.environ.get("GOOGLE_CLIENT_ID") else "✗ Not configured",
         "google_authenticated": "✓" if google_tokens.get("access_token") else "✗ Not authenticated",
         "notion_configured": "✓" if os.environ.get("NOTION_API_KEY") else "✗ Not configured",
-        "notion_workspaces": os.environ.get("NOTION_WORKSPACES", "Not set"),
+        "notion_workspaces": list(load_workspaces()) or "Not set",
         "system_ready": idx is not None and openai_client is not None,
-        "background_sync_running": sync_task is not None and not sync_task.done() if sync_task else False
+        "background_sync_running": bool(sync_worker.status()["active"])
     }
 
 @app.get("/integrations")
@@ -838,7 +840,12 @@ async def get_priority_emails():
         }
 
     try:
-        emails = await get_gmail_summary(access_token, max_results=10)
+        # Served from the mail mirror; Gmail is only asked directly until the first mail sync lands
+        synced_at = mail_store.get_state("synced_at")
+        if synced_at:
+            emails = await asyncio.to_thread(mirrored_emails, 10)
+        else:
+            emails = await get_gmail_summary(access_token, max_results=10)
         return {
             "emails": [
                 {
@@ -846,11 +853,14 @@ async def get_priority_emails():
                     "subject": email.subject,
                     "snippet": email.snippet,
                     "importance": email.importance,
+                    "score": email.score,
                     "timestamp": email.timestamp.isoformat()
                 }
                 for email in emails
             ],
-            "count": len(emails)
+            "count": len(emails),
+            "synced_at": synced_at,
+            "source": "mirror" if synced_at else "gmail_fallback"
         }
     except Exception as e:
         return {
@@ -859,280 +869,563 @@ async def get_priority_emails():
         }
 
 @app.get("/notion/projects")
-async def get_notion_projects():
-    """Get current projects from Notion"""
-    notion_token = os.environ.get("NOTION_API_KEY")
-    if not notion_token:
+async def get_notion_projects(status: Optional[str] = None, health: Optional[str] = None,
+                              workspace: Optional[str] = None):
+    """Get current projects from the local mirror of Notion project databases"""
+    if not load_workspaces():
         return {"error": "Notion API key not configured"}
 
-    # This would use actual database ID from configuration
-    return {
-        "message": "Notion integration ready",
-        "setup_required": "Add NOTION_DATABASE_IDS to Secrets with your database IDs"
-    }
+    try:
+        from scripts import notion_mirror
+        projects = await asyncio.to_thread(notion_mirror.list_projects, status, health, workspace)
+        summary = await asyncio.to_thread(notion_mirror.project_summary, workspace)
+        response = {"projects": projects, **summary}
+        if not projects and not (status or health):
+            response["setup_required"] = (
+                "No project databases mirrored yet - run a Notion sync, or set NOTION_PROJECT_DATABASES "
+                "to words from your project database titles"
+            )
+        return response
+    except Exception as e:
+        return {"error": f"Failed to load projects: {str(e)}"}
 
 @app.post("/notion/sync")
-async def manual_notion_sync():
-    """Manually trigger a Notion sync"""
+async def manual_notion_sync(rescan: bool = False):
+    """Start a Notion sync on the sync worker (rescan=true re-checks every page, not just recent edits)"""
     try:
         from scripts.notion_sync import full_sync
-        await full_sync()
-        return {"message": "Notion sync completed successfully"}
+        job = sync_worker.start("notion", full_sync, rescan=rescan)
+        message = "Notion sync already running" if job["already_running"] else "Notion sync started"
+        return {"message": message, "job": job}
     except Exception as e:
-        return {"error": f"Sync failed: {str(e)}"}
+        return {"error": f"Sync failed to start: {str(e)}"}
+
+@app.get("/notion/sync/jobs")
+async def notion_sync_jobs():
+    """Active and recently finished sync jobs"""
+    return sync_worker.status()
+
+@app.get("/notion/sync/jobs/{job_id}")
+async def notion_sync_job(job_id: str):
+    """Status of one sync job"""
+    job = sync_worker.status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
+
+@app.post("/notion/sync/jobs/{job_id}/cancel")
+async def cancel_notion_sync_job(job_id: str):
+    """Cancel a queued or running sync job"""
+    job = sync_worker.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return job
 
 @app.get("/notion/status")
-async def notion_sync_status():
-    """Get Notion sync status and data"""
-    if not idx:
-        return {"error": "Pinecone not configured"}
-
+async def notion_sync_status(history: int = 20):
+    """Get Notion sync status, recent runs and cost trends from the local sync history"""
     try:
-        # Check how many Notion items we have
-        stats = idx.describe_index_stats()
-        notion_count = stats.namespaces.get("notion", {}).get("vector_count", 0)
+        from scripts.notion_store import notion_store
+        totals = await asyncio.to_thread(notion_store.vector_totals)
+        runs = await asyncio.to_thread(notion_store.list_runs, history)
+        trends = await asyncio.to_thread(notion_store.run_trends)
+        last_run = next((run for run in runs if run["finished_at"]), None)
 
         return {
-            "notion_vectors_stored": notion_count,
+            "notion_vectors_stored": sum(workspace["vectors"] for workspace in totals.values()),
+            "notion_pages_indexed": sum(workspace["pages"] for workspace in totals.values()),
+            "workspaces": totals,
             "notion_api_key_configured": bool(os.environ.get("NOTION_API_KEY")),
             "notion_workspaces_configured": bool(os.environ.get("NOTION_WORKSPACES")),
-            "last_sync": "Check logs for sync activity"
+            "notion_workspaces": list(load_workspaces()),
+            "last_sync": last_run["finished_at"] if last_run else None,
+            "last_sync_status": last_run["status"] if last_run else None,
+            "active_jobs": sync_worker.status()["active"],
+            "history": runs,
+            "trends": trends
         }
     except Exception as e:
         return {"error": f"Failed to get status: {str(e)}"}
 
+# Retrieval parameters shared by /ask and /ws/atlas (also part of the single-flight key)
+RETRIEVAL_TOP_K = 20
+DOCUMENTS_TOP_K = 10
+CONTEXT_MATCHES = 8
+NOTION_TOP_K = 10
+# Notion matches are ranked by score times their workspace's weight (see NOTION_WORKSPACES)
+NOTION_WORKSPACE_WEIGHTS = {name: settings["weight"] for name, settings in load_workspaces().items()}
+
+# End-to-end budget per endpoint and the share of it each retrieval stage may use
+REQUEST_DEADLINES = {
+    "ask": float(os.getenv("ASK_DEADLINE_S", "20")),
+    "ws": float(os.getenv("WS_DEADLINE_S", "30"))
+}
+STAGE_SHARES = {
+    "embed": 0.15,
+    "primary_query": 0.15,
+    "documents_query": 0.1,
+    "notion_query": 0.1,
+    "llm_queue": 0.25
+}
+GENERATION_MIN_S = 2.0         # Always left over for generation by the earlier stages
+OPTIONAL_STAGE_MIN_S = 0.3     # Optional stages are skipped below this
+GENERATION_TOKENS_PER_S = float(os.getenv("GENERATION_TOKENS_PER_S", "50"))
+MAX_ANSWER_TOKENS = 1000
+MIN_ANSWER_TOKENS = 150
+
+def generation_token_cap(deadline: Deadline) -> int:
+    """Largest max_tokens the remaining budget can stream at the expected generation rate"""
+    cap = int(deadline.remaining() * GENERATION_TOKENS_PER_S)
+    return max(min(cap, MAX_ANSWER_TOKENS), MIN_ANSWER_TOKENS)
+
+def parse_workspaces(workspaces: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated workspace names from a request, None for all workspaces"""
+    names = [name.strip() for name in (workspaces or "").split(",") if name.strip()]
+    return sorted(set(names)) or None
+
+def question_flight_key(question: str, workspaces: Optional[List[str]] = None) -> str:
+    """Single-flight key for a question under the current retrieval parameters"""
+    return single_flight.make_key(
+        question,
+        namespaces=f"{NS},documents,notion",
+        workspaces=",".join(workspaces) if workspaces else "all",
+        top_k=RETRIEVAL_TOP_K,
+        documents_top_k=DOCUMENTS_TOP_K,
+        notion_top_k=NOTION_TOP_K,
+        context_matches=CONTEXT_MATCHES,
+        model=CHAT_MD,
+        persona=prompt_builder.version
+    )
+
+async def iterate_in_thread(iterable):
+    """Drain a blocking iterator (e.g. an OpenAI stream) without stalling the event loop"""
+    iterator = iter(iterable)
+    sentinel = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, sentinel)
+        if item is sentinel:
+            break
+        yield item
+
+def weighted_score(match) -> float:
+    """Match score, scaled by its Notion workspace's weight for Notion matches"""
+    workspace = (match.metadata or {}).get("workspace")
+    return match.score * NOTION_WORKSPACE_WEIGHTS.get(workspace, 1.0) if workspace else match.score
+
+async def retrieve_context(question: str, deadline: Deadline, workspaces: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Embed the question and pull the best matching context from Pinecone within the deadline.
+
+    workspaces limits Notion matches to those workspaces; by default every workspace is searched.
+    """
+    # Generate embedding for the query (required)
+    embed_timeout = deadline.stage_timeout(STAGE_SHARES["embed"], GENERATION_MIN_S)
+    embed_response = await deadline.run(
+        "embed",
+        asyncio.to_thread(
+            openai_client.embeddings.create,
+            input=question,
+            model=EMBED_MD,
+            timeout=max(embed_timeout, 0.1)
+        ),
+        STAGE_SHARES["embed"],
+        GENERATION_MIN_S
+    )
+    query_vector = embed_response.data[0].embedding
+    print("✓ Generated embedding vector")
+
+    # Query the main namespace (required), uploaded documents and Notion (optional) together
+    primary = asyncio.ensure_future(deadline.run(
+        "primary_query",
+        asyncio.to_thread(idx.query, vector=query_vector, top_k=RETRIEVAL_TOP_K, include_metadata=True, namespace=NS),
+        STAGE_SHARES["primary_query"],
+        GENERATION_MIN_S
+    ))
+    secondary = asyncio.ensure_future(deadline.run_optional(
+        "documents_query",
+        asyncio.to_thread(idx.query, vector=query_vector, top_k=DOCUMENTS_TOP_K, include_metadata=True, namespace="documents"),
+        STAGE_SHARES["documents_query"],
+        OPTIONAL_STAGE_MIN_S,
+        GENERATION_MIN_S
+    ))
+    notion_filter = {"workspace": {"$in": workspaces}} if workspaces else None
+    notion = asyncio.ensure_future(deadline.run_optional(
+        "notion_query",
+        asyncio.to_thread(idx.query, vector=query_vector, top_k=NOTION_TOP_K, include_metadata=True,
+                          namespace="notion", filter=notion_filter),
+        STAGE_SHARES["notion_query"],
+        OPTIONAL_STAGE_MIN_S,
+        GENERATION_MIN_S
+    ))
+    try:
+        results = await primary
+    except BaseException:
+        secondary.cancel()
+        notion.cancel()
+        raise
+    doc_query = await secondary
+    doc_results = doc_query.matches if doc_query else []
+    notion_query = await notion
+    notion_results = notion_query.matches if notion_query else []
+
+    # Combine and deduplicate results
+    all_matches = results.matches + doc_results + notion_results
+    all_matches.sort(key=weighted_score, reverse=True)
+
+    if all_matches:
+        print(f"✓ Found {len(all_matches)} relevant matches ({len(results.matches)} from {NS}, "
+              f"{len(doc_results)} from documents, {len(notion_results)} from Notion)")
+        scores = [f"{match.score:.3f}" for match in all_matches[:CONTEXT_MATCHES]]
+        print(f"✓ Relevance scores: {scores}")
+
+        raw_scores = [f"{match.score:.3f}" for match in results.matches[:5]]
+        print(f"✓ Top 5 raw scores: {raw_scores}")
+
+    # Build context from top matches and collect sources
+    context_parts = []
+    sources = []
+    for match in all_matches[:CONTEXT_MATCHES]:
+        if match.metadata and 'text' in match.metadata:
+            source = match.metadata.get('source', 'Unknown')
+            text = match.metadata['text'][:500]  # Limit length
+            context_parts.append(f"From {source}: {text}")
+
+            # Add to sources list if not already included
+            if source not in sources and source != 'Unknown':
+                sources.append(source)
+
+    print(f"✓ Built context from {len(context_parts)} sources")
+
+    return {
+        "context": "\n\n".join(context_parts),
+        "sources": sources,
+        "sources_used": len(context_parts),
+        "total_matches": len(all_matches)
+    }
+
+async def stream_atlas_answer(message: str, deadline: Deadline, workspaces: Optional[List[str]] = None):
+    """Run the retrieval pipeline and yield a retrieval event, answer chunks, then a done event"""
+    retrieval = await retrieve_context(message, deadline, workspaces)
+    yield {"type": "retrieval", **retrieval}
+
+    # Static persona prefix first, volatile retrieved context after it
+    messages = prompt_builder.build_messages(message, retrieval["context"])
+
+    answer_parts = []
+    truncated = False
+
+    # Hold the scheduler slot until the whole stream has been drained
+    queue_timeout = deadline.stage_timeout(STAGE_SHARES["llm_queue"], GENERATION_MIN_S)
+    try:
+        async with llm_scheduler.slot(INTERACTIVE, estimate_tokens(messages, MAX_ANSWER_TOKENS), timeout=queue_timeout) as slot:
+            # Fit the answer length to the time that is actually left
+            max_tokens = generation_token_cap(deadline)
+            if max_tokens < MAX_ANSWER_TOKENS:
+                deadline.degrade("generation", f"max_tokens capped at {max_tokens}")
+
+            response_stream = await slot.call(
+                openai_client.chat.completions.create,
+                model=CHAT_MD,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=max(deadline.remaining(), 0.1)
+            )
+
+            async for chunk in iterate_in_thread(response_stream):
+                if chunk.usage:
+                    slot.record_usage(chunk.usage.total_tokens)
+                    prompt_builder.record_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    answer_parts.append(chunk.choices[0].delta.content)
+                    yield {"type": "chunk", "content": chunk.choices[0].delta.content}
+
+                if deadline.expired():
+                    truncated = True
+                    deadline.degrade("generation", "truncated at deadline")
+                    await asyncio.to_thread(response_stream.close)
+                    break
+    except AdmissionTimeout:
+        raise DeadlineExceeded(f"no LLM capacity within {queue_timeout:.2f}s")
+
+    yield {"type": "done", "deadline": deadline.summary()}
+
+    # Write complete answers through to the offline cache for later hedging
+    # (answers scoped to some workspaces are not representative of the question)
+    answer = "".join(answer_parts)
+    if answer and not truncated and not workspaces:
+        try:
+            await asyncio.to_thread(offline_system.cache_response, message, answer)
+        except Exception as e:
+            print(f"⚠️  Failed to cache answer offline: {e}")
+
+# Seconds to wait for the first live token before serving a cached answer
+HEDGE_DEADLINES = {
+    "ask": float(os.getenv("ASK_HEDGE_DEADLINE_S", "6")),
+    "ws": float(os.getenv("WS_HEDGE_DEADLINE_S", "4"))
+}
+HEDGE_RESULT_TTL = 300
+# Older cached answers are not served in place of a live one
+HEDGE_MAX_AGE_S = float(os.getenv("HEDGE_MAX_AGE_S", "3600"))
+
+hedge_stats = {
+    "fired": 0,            # Deadline passed before the first live token
+    "served_cached": 0,    # A cached answer was returned in its place
+    "no_cached_answer": 0, # Nothing cached, the client kept waiting on the live path
+    "live_replaced": 0     # The live answer later arrived and superseded the cached one
+}
+
+# Live /ask answers still running after a hedge, keyed by hedge id
+hedged_answers: Dict[str, asyncio.Task] = {}
+
+async def get_hedge_answer(question: str, workspaces: Optional[List[str]] = None) -> Optional[str]:
+    """Recent cached answer to exactly this question, if the offline cache has one"""
+    if workspaces:
+        # Cached answers were drawn from every workspace
+        return None
+    try:
+        # No keyword matching here: that fallback is for offline mode, where any answer beats none
+        return await asyncio.to_thread(offline_system.get_exact_response, question, HEDGE_MAX_AGE_S)
+    except Exception as e:
+        print(f"⚠️  Offline cache lookup failed: {e}")
+        return None
+
+async def with_first_token_deadline(events, budget: float):
+    """Pass stream events through, inserting one {"type": "hedge"} event if no chunk arrives within budget"""
+    iterator = events.__aiter__()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    waiting_for_first = True
+
+    while True:
+        next_event = asyncio.ensure_future(iterator.__anext__())
+        if waiting_for_first:
+            done, _ = await asyncio.wait({next_event}, timeout=max(deadline - loop.time(), 0))
+            if not done:
+                waiting_for_first = False
+                yield {"type": "hedge"}
+
+        try:
+            event = await next_event
+        except StopAsyncIteration:
+            return
+
+        if event["type"] == "chunk":
+            waiting_for_first = False
+        yield event
+
+async def collect_answer(events, first_token: asyncio.Event) -> Dict[str, Any]:
+    """Drain a shared answer stream into the /ask response shape"""
+    retrieval = {"sources": [], "sources_used": 0, "total_matches": 0}
+    answer_parts = []
+    deadline_summary = {"degraded": []}
+
+    async for event in events:
+        if event["type"] == "retrieval":
+            retrieval = event
+        elif event["type"] == "chunk":
+            first_token.set()
+            answer_parts.append(event["content"])
+        elif event["type"] == "done":
+            deadline_summary = event["deadline"]
+
+    answer = "".join(answer_parts)
+    print(f"✓ Generated answer: {answer[:100]}...")
+
+    return {
+        "answer": answer,
+        "sources": retrieval["sources"][:5],  # Limit to top 5 sources for UI
+        "sources_used": retrieval["sources_used"],
+        "total_matches": retrieval["total_matches"],
+        "cached": False,
+        "degraded": deadline_summary["degraded"],
+        "deadline": deadline_summary
+    }
+
 @app.websocket("/ws/atlas")
 async def atlas_websocket(websocket: WebSocket):
     """WebSocket endpoint for streaming ATLAS chat"""
     await websocket.accept()
-    
+
     try:
         while True:
             # Receive message from client
             data = await websocket.receive_json()
-            
+
             if data.get("type") == "message":
                 message = data.get("content", "").strip()
-                
+                requested = data.get("workspaces")
+                workspaces = parse_workspaces(",".join(requested) if isinstance(requested, list) else requested)
+
                 if not message:
                     continue
-                
+
+                # "When am I free ..." is answered exactly from the local calendar
+                schedule_answer = answer_schedule_question(message)
+                if schedule_answer:
+                    await websocket.send_json({"type": "chunk", "content": schedule_answer})
+                    await websocket.send_json({"type": "complete", "degraded": []})
+                    continue
+
                 if not openai_client or not idx:
                     await websocket.send_json({
                         "type": "error",
                         "message": "AI services not configured"
                     })
                     continue
-                
+
                 try:
-                    # Generate embedding for the query
-                    embed_response = openai_client.embeddings.create(
-                        input=message,
-                        model=EMBED_MD
+                    # Identical questions already streaming to another client share that stream
+                    key = question_flight_key(message, workspaces)
+                    events = single_flight.stream(
+                        key, lambda: stream_atlas_answer(message, Deadline(REQUEST_DEADLINES["ws"]), workspaces)
                     )
-                    query_vector = embed_response.data[0].embedding
-                    
-                    # Query Pinecone for relevant context
-                    results = idx.query(vector=query_vector, top_k=20, include_metadata=True, namespace=NS)
-                    
-                    # Also search uploaded documents
-                    doc_results = []
-                    if idx:
-                        doc_query = idx.query(vector=query_vector, top_k=10, include_metadata=True, namespace="documents")
-                        doc_results = doc_query.matches
-                    
-                    # Combine and deduplicate results
-                    all_matches = results.matches + doc_results
-                    all_matches.sort(key=lambda x: x.score, reverse=True)
-                    
-                    # Build context from top matches
-                    context_parts = []
-                    for match in all_matches[:8]:  # Use top 8 matches
-                        if match.metadata and 'text' in match.metadata:
-                            source = match.metadata.get('source', 'Unknown')
-                            text = match.metadata['text'][:500]  # Limit length
-                            context_parts.append(f"From {source}: {text}")
-                    
-                    context = "\n\n".join(context_parts)
-                    
-                    # System prompt with Michael's persona
-                    system_prompt = """You are ATLAS, Michael Slusher's personal AI companion and executive assistant. You are speaking directly to Michael Slusher, founder of Rocket Launch Studio.
-
-KEY CONTEXT ABOUT MICHAEL:
-- He has ADHD and autism (RAADS-R score 107) and benefits from clear, structured communication
-- He's a creative professional specializing in video production and content creation
-- Brand colors: Spruce Blue and Olive Green
-- Ultimate comfort movie: Stranger Than Fiction
-- Primary love language: Quality Time
-- Mother's birthday: May 12
-- He's a lifelong twin and red panda enthusiast from Atlanta
-
-YOUR COMMUNICATION STYLE:
-- Speak with direct kindness and clarity
-- Provide step-by-step structure for complex tasks
-- Never use emojis in responses
-- Be concise but thorough
-- Offer actionable micro-plans when he's in task paralysis
-- Support his neurodivergent needs with structured guidance
-
-ROCKET LAUNCH STUDIO CONTEXT:
-- Mission: Deliver striking, polished photo and video content that helps clients stand out
-- Core values: Creativity, Professionalism, Collaboration, Growth, Support
-- Services: Creative Development, Filming & Production, Editing & Post-Production
-- Tools: DaVinci Resolve, Adobe Suite, Sony FX6/FX3 cameras
-- Current projects: Focus on quality over quantity
-
-Use the provided context to answer Michael's questions accurately and helpfully. Be personable and remember details about his work and preferences."""
-                    
-                    # Generate streaming response using OpenAI
-                    messages = [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"Context: {context}\n\nQuestion: {message}"}
-                    ]
-                    
-                    response_stream = openai_client.chat.completions.create(
-                        model=CHAT_MD,
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=1000,
-                        stream=True
-                    )
-                    
-                    # Stream the response back to client
-                    for chunk in response_stream:
-                        if chunk.choices[0].delta.content:
+                    served_cached = False
+                    replaced = False
+                    degraded = []
+
+                    async for event in with_first_token_deadline(events, HEDGE_DEADLINES["ws"]):
+                        if event["type"] == "hedge":
+                            hedge_stats["fired"] += 1
+                            cached = await get_hedge_answer(message, workspaces)
+                            if cached:
+                                hedge_stats["served_cached"] += 1
+                                served_cached = True
+                                await websocket.send_json({
+                                    "type": "cached",
+                                    "content": cached
+                                })
+                            else:
+                                hedge_stats["no_cached_answer"] += 1
+
+                        elif event["type"] == "chunk":
+                            if served_cached and not replaced:
+                                # Tell the client to drop the cached answer in favour of the live one
+                                hedge_stats["live_replaced"] += 1
+                                replaced = True
+                                await websocket.send_json({"type": "replace"})
+
                             await websocket.send_json({
                                 "type": "chunk",
-                                "content": chunk.choices[0].delta.content
+                                "content": event["content"]
                             })
-                    
+
+                        elif event["type"] == "done":
+                            degraded = event["deadline"]["degraded"]
+
                     # Send completion signal
                     await websocket.send_json({
-                        "type": "complete"
+                        "type": "complete",
+                        "degraded": degraded
                     })
-                    
+
+                except WebSocketDisconnect:
+                    raise
                 except Exception as e:
                     print(f"❌ Error in WebSocket chat: {str(e)}")
                     await websocket.send_json({
                         "type": "error",
                         "message": f"Failed to process message: {str(e)}"
                     })
-                    
+
     except WebSocketDisconnect:
         print("WebSocket disconnected")
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
 
 @app.get("/ask")
-async def ask_question(q: str = Query(..., description="The question to ask")):
+async def ask_question(q: str = Query(..., description="The question to ask"),
+                       workspaces: Optional[str] = Query(None, description="Comma-separated Notion workspaces to search (default: all)")):
     """Main Q&A endpoint using RAG with Pinecone and OpenAI"""
     try:
+        # "When am I free ..." is answered exactly from the local calendar
+        schedule_answer = answer_schedule_question(q)
+        if schedule_answer:
+            return {
+                "answer": schedule_answer,
+                "sources": ["calendar"],
+                "sources_used": 1,
+                "total_matches": 0,
+                "cached": False,
+                "degraded": []
+            }
+
         if not openai_client or not idx:
             raise HTTPException(status_code=503, detail="AI services not configured")
 
         print(f"🔍 Processing question: {q}")
 
-        # Generate embedding for the query
-        embed_response = openai_client.embeddings.create(
-            input=q,
-            model=EMBED_MD
+        # Identical questions already in flight (here or on /ws/atlas) attach to that stream
+        scope = parse_workspaces(workspaces)
+        events = single_flight.stream(
+            question_flight_key(q, scope), lambda: stream_atlas_answer(q, Deadline(REQUEST_DEADLINES["ask"]), scope)
         )
-        query_vector = embed_response.data[0].embedding
-        print("✓ Generated embedding vector")
-
-        # Query Pinecone for relevant context
-        results = idx.query(vector=query_vector, top_k=20, include_metadata=True, namespace=NS)
+        first_token = asyncio.Event()
+        live = asyncio.ensure_future(collect_answer(events, first_token))
+        first_token_wait = asyncio.ensure_future(first_token.wait())
 
-        # Also search uploaded documents
-        doc_results = []
-        if idx:
-            doc_query = idx.query(vector=query_vector, top_k=10, include_metadata=True, namespace="documents")
-            doc_results = doc_query.matches
-
-        # Combine and deduplicate results
-        all_matches = results.matches + doc_results
-        all_matches.sort(key=lambda x: x.score, reverse=True)
-
-        if all_matches:
-            print(f"✓ Found {len(all_matches)} relevant matches ({len(results.matches)} from docs, {len(doc_results)} from Notion)")
-            scores = [f"{match.score:.3f}" for match in all_matches[:8]]
-            print(f"✓ Relevance scores: {scores}")
-
-            raw_scores = [f"{match.score:.3f}" for match in results.matches[:5]]
-            print(f"✓ Top 5 raw scores: {raw_scores}")
-
-        # Build context from top matches and collect sources
-        context_parts = []
-        sources = []
-        for match in all_matches[:8]:  # Use top 8 matches
-            if match.metadata and 'text' in match.metadata:
-                source = match.metadata.get('source', 'Unknown')
-                text = match.metadata['text'][:500]  # Limit length
-                context_parts.append(f"From {source}: {text}")
-
-                # Add to sources list if not already included
-                if source not in sources and source != 'Unknown':
-                    sources.append(source)
-
-        context = "\n\n".join(context_parts)
-        print(f"✓ Built context from {len(context_parts)} sources")
-
-        # System prompt with Michael's persona
-        system_prompt = """You are ATLAS, Michael Slusher's personal AI companion and executive assistant. You are speaking directly to Michael Slusher, founder of Rocket Launch Studio.
-
-KEY CONTEXT ABOUT MICHAEL:
-- He has ADHD and autism (RAADS-R score 107) and benefits from clear, structured communication
-- He's a creative professional specializing in video production and content creation
-- Brand colors: Spruce Blue and Olive Green
-- Ultimate comfort movie: Stranger Than Fiction
-- Primary love language: Quality Time
-- Mother's birthday: May 12
-- He's a lifelong twin and red panda enthusiast from Atlanta
-
-YOUR COMMUNICATION STYLE:
-- Speak with direct kindness and clarity
-- Provide step-by-step structure for complex tasks
-- Never use emojis in responses
-- Be concise but thorough
-- Offer actionable micro-plans when he's in task paralysis
-- Support his neurodivergent needs with structured guidance
-
-ROCKET LAUNCH STUDIO CONTEXT:
-- Mission: Deliver striking, polished photo and video content that helps clients stand out
-- Core values: Creativity, Professionalism, Collaboration, Growth, Support
-- Services: Creative Development, Filming & Production, Editing & Post-Production
-- Tools: DaVinci Resolve, Adobe Suite, Sony FX6/FX3 cameras
-- Current projects: Focus on quality over quantity
-
-Use the provided context to answer Michael's questions accurately and helpfully. Be personable and remember details about his work and preferences."""
-
-        # Generate response using OpenAI
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context: {context}\n\nQuestion: {q}"}
-        ]
-
-        response = openai_client.chat.completions.create(
-            model=CHAT_MD,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1000
-        )
+        try:
+            await asyncio.wait({live, first_token_wait}, timeout=HEDGE_DEADLINES["ask"], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            first_token_wait.cancel()
+
+        if not first_token.is_set() and not live.done():
+            hedge_stats["fired"] += 1
+            cached = await get_hedge_answer(q, scope)
+            if cached:
+                hedge_stats["served_cached"] += 1
+                print("⏱️  Live answer is slow, serving cached answer")
+
+                # Keep the live answer running so the client can swap it in when it lands
+                hedge_id = uuid.uuid4().hex
+                hedged_answers[hedge_id] = live
+
+                def forget_hedge(task):
+                    if not task.cancelled() and task.exception() is None:
+                        hedge_stats["live_replaced"] += 1
+                    asyncio.get_running_loop().call_later(HEDGE_RESULT_TTL, hedged_answers.pop, hedge_id, None)
+
+                live.add_done_callback(forget_hedge)
+
+                return {
+                    "answer": cached,
+                    "sources": [],
+                    "sources_used": 0,
+                    "total_matches": 0,
+                    "cached": True,
+                    "degraded": [],
+                    "live_answer_url": f"/ask/live/{hedge_id}"
+                }
 
-        answer = response.choices[0].message.content
-        print(f"✓ Generated answer: {answer[:100]}...")
+            hedge_stats["no_cached_answer"] += 1
 
-        return {
-            "answer": answer,
-            "sources": sources[:5],  # Limit to top 5 sources for UI
-            "sources_used": len(context_parts),
-            "total_matches": len(all_matches)
-        }
+        return await live
 
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        print(f"⏱️  Ask deadline exceeded: {str(e)}")
+        raise HTTPException(status_code=504, detail=f"Question timed out: {str(e)}")
     except Exception as e:
         print(f"❌ Error in ask endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
 
+@app.get("/ask/live/{hedge_id}")
+async def get_live_answer(hedge_id: str):
+    """Fetch the live answer that replaces a cached /ask answer"""
+    live = hedged_answers.get(hedge_id)
+    if live is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired answer id")
+
+    if not live.done():
+        return {"status": "pending"}
+
+    if live.cancelled() or live.exception() is not None:
+        return {"status": "failed"}
+
+    return {"status": "ready", **live.result()}
+
 @app.get("/debug/search")
 def debug_search(q: str = Query(..., description="Search term to debug")):
     """Debug endpoint to see what's actually in the knowledge base"""
@@ -1216,12 +1509,14 @@ async def get_dashboard():
     try:
         # Get calendar events
         calendar_events = []
-        emails = []
 
         access_token = await get_valid_google_token()
         if access_token:
             calendar_events = await get_google_calendar_events(access_token, days_ahead=1)
-            emails = await get_gmail_summary(access_token, max_results=5)
+
+        # Email comes from the local mirror the mail sync keeps current, never from Gmail
+        emails = await asyncio.to_thread(mirrored_emails, 5)
+        mail_counts = await asyncio.to_thread(mail_store.counts)
 
         # System health calculation
         health_factors = []
@@ -1253,10 +1548,10 @@ async def get_dashboard():
             ]),
             "last_sync": datetime.now().isoformat(),
             "calendar_events_today": len(calendar_events),
-            "unread_emails": len(emails),
+            "unread_emails": mail_counts["unread"],
             "knowledge_base_vectors": kb_stats["total_vectors"],
             "namespaces": kb_stats["namespaces"],
-            "background_sync_active": sync_task is not None and not sync_task.done() if sync_task else False,
+            "background_sync_active": bool(sync_worker.status()["active"]),
             "recent_events": [
                 {
                     "title": event.title,
@@ -1316,17 +1611,46 @@ def get_dashboard_metrics():
             "error": str(e)
         }
 
+@app.get("/metrics/llm")
+def get_llm_metrics():
+    """Get LLM scheduler queue depth, wait times, request coalescing, prompt cache and hedging stats"""
+    return {
+        "scheduler": llm_scheduler.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "prompt_cache": prompt_builder.get_stats(),
+        "hedge": {
+            **hedge_stats,
+            "deadlines_s": HEDGE_DEADLINES,
+            "max_age_s": HEDGE_MAX_AGE_S,
+            "pending_live_answers": len([task for task in hedged_answers.values() if not task.done()])
+        }
+    }
+
+@app.get("/metrics/http")
+def get_http_metrics():
+    """Get pooled HTTP session stats (connection reuse, DNS cache hits) and response cache hits and 304s per integration"""
+    return {
+        **http_client.get_stats(),
+        "response_cache": response_cache.get_stats()
+    }
+
+@app.get("/metrics/agenda")
+def get_agenda_metrics():
+    """Get agenda snapshot cache hits, rebuilds and 304 responses, and free/busy index stats"""
+    return {
+        **agenda_cache.get_stats(),
+        "free_busy": free_busy.get_stats()
+    }
+
 @app.post("/sync/trigger")
 async def trigger_sync():
     """Trigger manual sync"""
-    global sync_task
     try:
-        if sync_task and not sync_task.done():
-            return {"status": "already_running", "message": "Sync already in progress"}
-        
-        # Start new sync task
-        sync_task = asyncio.create_task(sync_notion_data())
-        return {"status": "triggered", "message": "Sync started successfully"}
+        from scripts.notion_sync import sync_notion_to_pinecone
+        job = sync_worker.start("notion", sync_notion_to_pinecone)
+        if job["already_running"]:
+            return {"status": "already_running", "message": "Sync already in progress", "job_id": job["id"]}
+        return {"status": "triggered", "message": "Sync started successfully", "job_id": job["id"]}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -1336,34 +1660,39 @@ async def get_work_metrics():
     try:
         # Get real data from integrations
         calendar_events = []
-        emails = []
 
         access_token = await get_valid_google_token()
         if access_token:
             calendar_events = await get_google_calendar_events(access_token, days_ahead=1)
-            emails = await get_gmail_summary(access_token, max_results=20)
+
+        # Client mail is recognised from Notion client emails, not keywords in the sender
+        client_emails = await asyncio.to_thread(mail_priority.client_messages)
+        mail_counts = await asyncio.to_thread(mail_store.counts)
 
         # Analyze calendar for work metrics
         work_events = [e for e in calendar_events if any(keyword in e.title.lower() 
                       for keyword in ['meeting', 'call', 'project', 'client', 'work'])]
 
-        client_emails = [e for e in emails if any(keyword in e.sender.lower() 
-                        for keyword in ['client', '@company', 'business'])]
+        # Projects, revenue and clients come from the local mirror of Notion databases
+        from scripts import notion_mirror
+        projects = await asyncio.to_thread(notion_mirror.project_summary)
+        revenue = await asyncio.to_thread(notion_mirror.revenue_summary)
+        clients = await asyncio.to_thread(notion_mirror.client_summary)
 
         return {
-            "active_projects": 3,  # This would come from Notion/project management
-            "projects_on_track": 2,
-            "projects_at_risk": 1,
-            "monthly_revenue": 12450,  # This would come from QuickBooks/accounting
-            "revenue_growth": 18,
-            "active_clients": 8,
-            "new_clients_this_week": 2,
+            "active_projects": projects["active_projects"],
+            "projects_on_track": projects["projects_on_track"],
+            "projects_at_risk": projects["projects_at_risk"],
+            "monthly_revenue": revenue["monthly_revenue"],
+            "revenue_growth": revenue["revenue_growth"],
+            "active_clients": clients["active_clients"],
+            "new_clients_this_week": clients["new_clients_this_week"],
             "tasks_today": len(work_events),
             "tasks_completed": 0,
             "tasks_remaining": len(work_events),
             "calendar_events_today": len(calendar_events),
             "work_events_today": len(work_events),
-            "unread_emails": len(emails),
+            "unread_emails": mail_counts["unread"],
             "client_emails": len(client_emails),
             "next_meeting": work_events[0].title if work_events else None,
             "next_meeting_time": work_events[0].start_time.strftime("%H:%M") if work_events else None
@@ -1405,7 +1734,23 @@ async def create_event(event_data: dict):
             "location": event_data.get("location", ""),
             "created_at": datetime.now().isoformat()
         }
-        return {"message": "Event created successfully", "event": event}
+
+        # Best effort: times that aren't ISO 8601 are stored as given, just without a conflict check
+        conflicts = []
+        if event["start_time"] and event["end_time"]:
+            try:
+                start_ts = normalize_time(event["start_time"])[1]
+                end_ts = normalize_time(event["end_time"])[1]
+            except (TypeError, ValueError):
+                pass
+            else:
+                conflicts = [calendar_event_summary(item) for item in free_busy.conflicts(start_ts, end_ts)]
+
+        return {
+            "message": "Event created successfully" if not conflicts else "Event created, but it overlaps other events",
+            "event": event,
+            "conflicts": conflicts
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create event: {str(e)}")
 
@@ -1431,13 +1776,22 @@ async def handle_quick_command(command_data: dict):
                 }
                 return {"action": "task_created", "task": task, "response": f"I've added '{task_text}' to your tasks."}
 
+        # Free/busy questions are answered from the local calendar index
+        schedule_answer = answer_schedule_question(command)
+        if schedule_answer:
+            return {"action": "schedule_answer", "response": schedule_answer}
+
         # Default to regular AI response
         if not openai_client:
             raise HTTPException(status_code=503, detail="AI not configured")
 
-        response = openai_client.chat.completions.create(
+        messages = [{"role": "user", "content": command}]
+        response = await llm_scheduler.run(
+            openai_client.chat.completions.create,
+            priority=INTERACTIVE,
+            est_tokens=estimate_tokens(messages, 200),
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": command}],
+            messages=messages,
             temperature=0.7,
             max_tokens=200
         )
@@ -1555,52 +1909,19 @@ def get_ai_personality():
         }
     }
 
+def agenda_response(request: Request, kind: str) -> Response:
+    """Serve a cached agenda snapshot, or 304 if the client already has it"""
+    snapshot = agenda_cache.get(kind)
+    headers = {"ETag": snapshot["etag"], "Cache-Control": "no-cache"}
+    if agenda_cache.not_modified(snapshot, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot["body"], media_type="application/json", headers=headers)
+
 @app.get("/api/events/today")
-async def get_todays_events():
-    """Get today's calendar events from local database"""
+async def get_todays_events(request: Request):
+    """Get today's calendar events from the cached agenda"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get today's date range
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-        
-        cursor.execute('''
-            SELECT id, title, start_time, end_time, color, description, location
-            FROM events 
-            WHERE start_time >= ? AND start_time < ?
-            ORDER BY start_time ASC
-        ''', (today_start.isoformat(), today_end.isoformat()))
-        
-        events = []
-        for row in cursor.fetchall():
-            event_id, title, start_time, end_time, color, description, location = row
-            
-            # Parse datetime strings
-            start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-            
-            events.append({
-                "id": event_id,
-                "title": title,
-                "start": start_dt.strftime("%H:%M"),
-                "end": end_dt.strftime("%H:%M"),
-                "start_full": start_dt.isoformat(),
-                "end_full": end_dt.isoformat(),
-                "color": color,
-                "description": description or "",
-                "location": location or ""
-            })
-        
-        conn.close()
-        
-        return {
-            "events": events,
-            "count": len(events),
-            "date": today_start.strftime("%Y-%m-%d")
-        }
-        
+        return agenda_response(request, "today")
     except Exception as e:
         print(f"❌ Error fetching today's events: {e}")
         return {
@@ -1610,62 +1931,10 @@ async def get_todays_events():
         }
 
 @app.get("/api/events/week")
-async def get_week_events():
-    """Get this week's calendar events from local database"""
+async def get_week_events(request: Request):
+    """Get this week's calendar events from the cached agenda"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get week date range (next 7 days)
-        week_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + timedelta(days=7)
-        
-        cursor.execute('''
-            SELECT id, title, start_time, end_time, color, description, location
-            FROM events 
-            WHERE start_time >= ? AND start_time < ?
-            ORDER BY start_time ASC
-        ''', (week_start.isoformat(), week_end.isoformat()))
-        
-        events = []
-        for row in cursor.fetchall():
-            event_id, title, start_time, end_time, color, description, location = row
-            
-            # Parse datetime strings
-            start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-            end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-            
-            events.append({
-                "id": event_id,
-                "title": title,
-                "start": start_dt.strftime("%m/%d %H:%M"),
-                "end": end_dt.strftime("%H:%M"),
-                "start_full": start_dt.isoformat(),
-                "end_full": end_dt.isoformat(),
-                "color": color,
-                "description": description or "",
-                "location": location or "",
-                "date": start_dt.strftime("%Y-%m-%d")
-            })
-        
-        conn.close()
-        
-        # Group events by date
-        events_by_date = {}
-        for event in events:
-            date = event["date"]
-            if date not in events_by_date:
-                events_by_date[date] = []
-            events_by_date[date].append(event)
-        
-        return {
-            "events": events,
-            "events_by_date": events_by_date,
-            "count": len(events),
-            "week_start": week_start.strftime("%Y-%m-%d"),
-            "week_end": week_end.strftime("%Y-%m-%d")
-        }
-        
+        return agenda_response(request, "week")
     except Exception as e:
         print(f"❌ Error fetching week events: {e}")
         return {
@@ -1675,6 +1944,102 @@ async def get_week_events():
             "error": str(e)
         }
 
+@app.get("/api/events/range")
+async def get_range_events(start: str = Query(..., description="First day, YYYY-MM-DD"),
+                           days: int = Query(7, ge=1, le=366)):
+    """Get calendar events for any window, recurring events expanded locally"""
+    try:
+        range_start = datetime.strptime(start, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start must be a date in YYYY-MM-DD format")
+
+    range_end = range_start + timedelta(days=days)
+    events, events_by_date = range_events(range_start, range_end)
+    return {
+        "events": events,
+        "events_by_date": events_by_date,
+        "count": len(events),
+        "start": range_start.strftime("%Y-%m-%d"),
+        "end": range_end.strftime("%Y-%m-%d")
+    }
+
+def parse_event_time(value: str, name: str) -> int:
+    try:
+        return normalize_time(value)[1]
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO date or datetime")
+
+def calendar_event_summary(event: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": event["id"],
+        "title": event["title"],
+        "start": event["start_time"],
+        "end": event["end_time"],
+        "calendar_id": event["calendar_id"]
+    }
+
+@app.get("/api/calendar/free-busy")
+async def get_free_busy(start: str = Query(..., description="Window start, ISO date or datetime (local if no offset)"),
+                        end: str = Query(..., description="Window end, ISO date or datetime"),
+                        min_free_minutes: int = Query(0, ge=0),
+                        include_all_day: bool = Query(False)):
+    """Busy blocks and free slots in a window, from the in-memory interval index"""
+    start_ts, end_ts = parse_event_time(start, "start"), parse_event_time(end, "end")
+    if end_ts <= start_ts:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    started = time.perf_counter()
+    busy = free_busy.busy_blocks(start_ts, end_ts, include_all_day)
+    free = free_busy.free_slots(start_ts, end_ts, min_free_minutes * 60, include_all_day)
+    elapsed_us = round((time.perf_counter() - started) * 1_000_000)
+
+    return {
+        "busy": [
+            {
+                "start": datetime.fromtimestamp(block["start_ts"]).isoformat(),
+                "end": datetime.fromtimestamp(block["end_ts"]).isoformat(),
+                "events": block["events"]
+            }
+            for block in busy
+        ],
+        "free": [
+            {"start": datetime.fromtimestamp(slot_start).isoformat(), "end": datetime.fromtimestamp(slot_end).isoformat()}
+            for slot_start, slot_end in free
+        ],
+        "query_us": elapsed_us
+    }
+
+@app.get("/api/calendar/conflicts")
+async def get_calendar_conflicts(start: str = Query(..., description="Proposed start, ISO datetime"),
+                                 end: str = Query(..., description="Proposed end, ISO datetime"),
+                                 include_all_day: bool = Query(False)):
+    """Events that overlap a proposed time"""
+    start_ts, end_ts = parse_event_time(start, "start"), parse_event_time(end, "end")
+    if end_ts <= start_ts:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    conflicts = free_busy.conflicts(start_ts, end_ts, include_all_day)
+    return {
+        "has_conflicts": bool(conflicts),
+        "conflicts": [calendar_event_summary(event) for event in conflicts]
+    }
+
+@app.get("/api/calendar/next-free")
+async def get_next_free_slot(duration_minutes: int = Query(30, ge=5, le=24 * 60),
+                             after: Optional[str] = Query(None, description="Earliest start, ISO datetime (default: now)"),
+                             within_days: int = Query(14, ge=1, le=90)):
+    """The earliest free slot of the given length inside working hours"""
+    after_dt = datetime.fromtimestamp(parse_event_time(after, "after")) if after else datetime.now()
+    slot = free_busy.next_free_slot(duration_minutes * 60, after_dt, within_days)
+    if not slot:
+        return {"slot": None, "message": f"No free {duration_minutes}-minute slot in the next {within_days} days"}
+    return {
+        "slot": {
+            "start": datetime.fromtimestamp(slot[0]).isoformat(),
+            "end": datetime.fromtimestamp(slot[1]).isoformat()
+        }
+    }
+
 @app.post("/api/events/sync")
 async def manual_calendar_sync():
     """Manually trigger calendar sync"""
@@ -1684,6 +2049,17 @@ async def manual_calendar_sync():
     except Exception as e:
         return {"error": f"Sync failed: {str(e)}"}
 
+@app.post("/api/email/sync")
+async def manual_mail_sync():
+    """Manually advance the local mail mirror"""
+    await sync_gmail()
+    return {
+        "message": "Mail sync completed",
+        "synced_at": mail_store.get_state("synced_at"),
+        **mail_store.counts(),
+        "scorer": mail_priority.get_stats()
+    }
+
 @app.post("/api/profile/training")
 async def save_training_profile(training_data: dict):
     """Save user training preferences and profile data"""
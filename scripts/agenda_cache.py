@@ -0,0 +1,125 @@
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from scripts.calendar_store import calendar_store
+
+def today_agenda(day_start: datetime) -> Dict[str, Any]:
+    day_end = day_start + timedelta(days=1)
+
+    # Stored times are already local ISO text, so no per-row parsing is needed
+    events = []
+    for event in calendar_store.events_between(int(day_start.timestamp()), int(day_end.timestamp())):
+        events.append({
+            "id": event["id"],
+            "title": event["title"],
+            "start": event["start_time"][11:16],
+            "end": event["end_time"][11:16],
+            "start_full": event["start_time"],
+            "end_full": event["end_time"],
+            "color": event["color"],
+            "description": event["description"] or "",
+            "location": event["location"] or "",
+            "calendar_id": event["calendar_id"]
+        })
+
+    return {
+        "events": events,
+        "count": len(events),
+        "date": day_start.strftime("%Y-%m-%d")
+    }
+
+def range_events(start: datetime, end: datetime) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+    """Agenda events starting in [start, end), and the same events grouped by date"""
+    events = []
+    events_by_date = {}
+    for event in calendar_store.events_between(int(start.timestamp()), int(end.timestamp())):
+        start_time = event["start_time"]
+        agenda_event = {
+            "id": event["id"],
+            "title": event["title"],
+            "start": f"{start_time[5:7]}/{start_time[8:10]} {start_time[11:16]}",
+            "end": event["end_time"][11:16],
+            "start_full": start_time,
+            "end_full": event["end_time"],
+            "color": event["color"],
+            "description": event["description"] or "",
+            "location": event["location"] or "",
+            "calendar_id": event["calendar_id"],
+            "date": start_time[:10]
+        }
+        events.append(agenda_event)
+        events_by_date.setdefault(agenda_event["date"], []).append(agenda_event)
+    return events, events_by_date
+
+def week_agenda(day_start: datetime) -> Dict[str, Any]:
+    week_end = day_start + timedelta(days=7)
+    events, events_by_date = range_events(day_start, week_end)
+    return {
+        "events": events,
+        "events_by_date": events_by_date,
+        "count": len(events),
+        "week_start": day_start.strftime("%Y-%m-%d"),
+        "week_end": week_end.strftime("%Y-%m-%d")
+    }
+
+AGENDAS = {"today": today_agenda, "week": week_agenda}
+
+class AgendaCache:
+    """Already-serialized today and week agendas, rebuilt only when the calendar store's version or the day changes.
+
+    Calendar syncs bump calendar_store.version when they commit changes and
+    then call refresh(), so agenda requests between syncs are memory
+    lookups. Each snapshot's ETag is a hash of its body, so clients get a
+    304 whenever nothing they would see has changed.
+    """
+
+    def __init__(self):
+        self.snapshots: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "builds": 0, "not_modified": 0}
+
+    def get(self, kind: str) -> Dict[str, Any]:
+        day = date.today()
+        version = calendar_store.version
+        snapshot = self.snapshots.get(kind)
+        if snapshot and snapshot["version"] == version and snapshot["day"] == day:
+            self.stats["hits"] += 1
+            return snapshot
+
+        day_start = datetime.combine(day, datetime.min.time())
+        body = json.dumps(AGENDAS[kind](day_start), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        snapshot = {
+            "version": version,
+            "day": day,
+            "body": body,
+            "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        }
+        self.snapshots[kind] = snapshot
+        self.stats["builds"] += 1
+        return snapshot
+
+    def refresh(self):
+        """Rebuild every snapshot now, rather than on the next request"""
+        for kind in AGENDAS:
+            self.get(kind)
+
+    def not_modified(self, snapshot: Dict[str, Any], if_none_match: str = None) -> bool:
+        """Whether the client's If-None-Match already names this snapshot"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if snapshot["etag"] in tags or "*" in tags:
+            self.stats["not_modified"] += 1
+            return True
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "calendar_version": calendar_store.version,
+            "snapshots": {kind: snapshot["day"].isoformat() for kind, snapshot in self.snapshots.items()}
+        }
+
+# Global instance
+agenda_cache = AgendaCache()
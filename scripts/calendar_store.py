@@ -0,0 +1,362 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from scripts import recurrence
+
+# Expanded recurring-event windows kept in memory, most recently used last
+EXPANSION_CACHE_SIZE = 32
+
+def normalize_time(value: str) -> Tuple[str, int]:
+    """An ISO timestamp as local-time ISO text plus UTC epoch seconds; naive times are taken as local"""
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt.isoformat(), int(dt.timestamp())
+
+class CalendarStore:
+    """Local SQLite copy of calendar events, kept current by incremental Google Calendar syncs"""
+
+    def __init__(self, db_path: str = "data/events.db"):
+        self.db_path = db_path
+        # Bumped whenever a sync commits changed events, so cached agendas know to rebuild
+        self.version = 0
+        self.expansions: "OrderedDict[Tuple[int, int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self.init_database()
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def init_database(self):
+        """Initialize SQLite tables for events and calendar sync tokens"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                start_time TEXT NOT NULL,
+                end_time TEXT NOT NULL,
+                color TEXT DEFAULT '#3b82f6',
+                description TEXT,
+                location TEXT,
+                last_updated TEXT NOT NULL,
+                start_ts INTEGER,
+                end_ts INTEGER,
+                calendar_id TEXT NOT NULL DEFAULT 'primary',
+                calendar_color TEXT,
+                attendees TEXT
+            )
+        ''')
+
+        # Event tables created before epoch columns get them backfilled once
+        cursor.execute('PRAGMA table_info(events)')
+        columns = [row[1] for row in cursor.fetchall()]
+        for column in ('start_ts', 'end_ts'):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE events ADD COLUMN {column} INTEGER')
+        self._backfill_epochs(cursor)
+
+        # Events synced before multi-calendar sync came from the primary calendar
+        if 'calendar_id' not in columns:
+            cursor.execute("ALTER TABLE events ADD COLUMN calendar_id TEXT NOT NULL DEFAULT 'primary'")
+        if 'calendar_color' not in columns:
+            cursor.execute('ALTER TABLE events ADD COLUMN calendar_color TEXT')
+        add_attendees = 'attendees' not in columns
+        if add_attendees:
+            cursor.execute('ALTER TABLE events ADD COLUMN attendees TEXT')
+
+        # Range indexes on the UTC epoch bounds (not covering): range queries seek on start, overlap
+        # queries on end, and each matching row is then read from the table for its other columns
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_start ON events(start_ts, end_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_end ON events(end_ts, start_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_calendar ON events(calendar_id)')
+
+        # Recurring series kept as their rules and expanded per query, when synced with local recurrence
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_events (
+                id TEXT PRIMARY KEY,
+                calendar_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                dtstart TEXT NOT NULL,
+                timezone TEXT,
+                duration_s INTEGER NOT NULL,
+                recurrence TEXT NOT NULL,
+                start_ts INTEGER NOT NULL,
+                until_ts INTEGER,
+                color TEXT,
+                description TEXT,
+                location TEXT,
+                calendar_color TEXT,
+                attendees TEXT,
+                last_updated TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('PRAGMA table_info(recurring_events)')
+        if 'attendees' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE recurring_events ADD COLUMN attendees TEXT')
+
+        # Original start of every moved or cancelled occurrence, which expansion skips
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_exceptions (
+                series_id TEXT NOT NULL,
+                original_ts INTEGER NOT NULL,
+                PRIMARY KEY (series_id, original_ts)
+            )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_recurring_window ON recurring_events(start_ts, until_ts)')
+
+        # Google Calendar nextSyncToken per calendar, for incremental syncs. A token only
+        # applies to the recurrence mode ("google" or "local") it was fetched with.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS calendar_sync_state (
+                calendar_id TEXT PRIMARY KEY,
+                sync_token TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                recurrence TEXT NOT NULL DEFAULT 'google'
+            )
+        ''')
+
+        cursor.execute('PRAGMA table_info(calendar_sync_state)')
+        if 'recurrence' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE calendar_sync_state ADD COLUMN recurrence TEXT NOT NULL DEFAULT 'google'")
+
+        # Events synced before attendees were kept only get them from a full sync
+        if add_attendees:
+            cursor.execute('DELETE FROM calendar_sync_state')
+
+        conn.commit()
+        conn.close()
+
+    def _backfill_epochs(self, cursor):
+        cursor.execute('SELECT id, start_time, end_time FROM events WHERE start_ts IS NULL OR end_ts IS NULL')
+        updates = []
+        for event_id, start_time, end_time in cursor.fetchall():
+            try:
+                start_time, start_ts = normalize_time(start_time)
+                end_time, end_ts = normalize_time(end_time)
+            except (TypeError, ValueError) as e:
+                print(f"⚠️  Event {event_id} has an unreadable time, leaving it out of range queries: {e}")
+                continue
+            updates.append((start_time, end_time, start_ts, end_ts, event_id))
+        cursor.executemany(
+            'UPDATE events SET start_time = ?, end_time = ?, start_ts = ?, end_ts = ? WHERE id = ?', updates
+        )
+        if updates:
+            print(f"🗄️  Migrated {len(updates)} events to epoch times")
+
+    def events_between(self, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+        """Events starting in [start_ts, end_ts), recurring occurrences included, soonest first"""
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, title, start_time, end_time, start_ts, end_ts, color, description, location,
+                   calendar_id, calendar_color
+            FROM events
+            WHERE start_ts >= ? AND start_ts < ?
+            ORDER BY start_ts ASC
+        ''', (start_ts, end_ts))
+        events = [dict(row) for row in cursor.fetchall()]
+        occurrences = self._expand_window(cursor, start_ts, end_ts)
+        conn.close()
+
+        if occurrences:
+            events = sorted(events + occurrences, key=lambda event: event["start_ts"])
+        return events
+
+    def _expand_window(self, cursor, start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+        """Occurrences of every stored series in the window, from the cache while the store is unchanged"""
+        key = (self.version, start_ts, end_ts)
+        if key in self.expansions:
+            self.expansions.move_to_end(key)
+            return self.expansions[key]
+
+        cursor.execute('''
+            SELECT * FROM recurring_events
+            WHERE start_ts < ? AND (until_ts IS NULL OR until_ts >= ?)
+        ''', (end_ts, start_ts))
+        series_rows = [dict(row) for row in cursor.fetchall()]
+
+        occurrences = []
+        if series_rows and recurrence.available():
+            cursor.execute('''
+                SELECT x.series_id, x.original_ts FROM recurring_exceptions x
+                JOIN recurring_events r ON r.id = x.series_id
+                WHERE r.start_ts < ? AND (r.until_ts IS NULL OR r.until_ts >= ?)
+            ''', (end_ts, start_ts))
+            exceptions: Dict[str, set] = {}
+            for series_id, original_ts in cursor.fetchall():
+                exceptions.setdefault(series_id, set()).add(original_ts)
+
+            for series in series_rows:
+                try:
+                    occurrences.extend(recurrence.expand_series(series, exceptions.get(series["id"], set()), start_ts, end_ts))
+                except (TypeError, ValueError) as e:
+                    print(f"⚠️  Could not expand recurring event {series['title']}: {e}")
+
+        self.expansions[key] = occurrences
+        while len(self.expansions) > EXPANSION_CACHE_SIZE:
+            self.expansions.popitem(last=False)
+        return occurrences
+
+    def get_sync_token(self, calendar_id: str, recurrence_mode: str = "google") -> Optional[str]:
+        """The calendar's sync token, if it was fetched with the same recurrence mode"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT sync_token FROM calendar_sync_state WHERE calendar_id = ? AND recurrence = ?',
+            (calendar_id, recurrence_mode)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def apply_changes(self, calendar_id: str, upserts: List[Dict[str, Any]], deleted_ids: List[str],
+                      sync_token: Optional[str], full: bool = False, series: List[Dict[str, Any]] = (),
+                      exceptions: List[Tuple[str, int]] = (), recurrence_mode: str = "google") -> Dict[str, int]:
+        """Apply one calendar's sync changes and its new sync token in a single transaction.
+
+        upserts are single events and series are recurring masters; exceptions
+        are (series id, original start) pairs of moved or cancelled
+        occurrences. A full resync also removes that calendar's synced events
+        and series it did not see. Readers keep seeing the previous state
+        until the commit, so the table is never empty halfway through a sync.
+        """
+        now = datetime.now().isoformat()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        removed = 0
+        try:
+            if full:
+                kept = {event["id"] for event in upserts} | {item["id"] for item in series}
+                cursor.execute("SELECT id FROM events WHERE id LIKE 'gcal_%' AND calendar_id = ?", (calendar_id,))
+                stale = [row[0] for row in cursor.fetchall() if row[0] not in kept]
+                cursor.execute('SELECT id FROM recurring_events WHERE calendar_id = ?', (calendar_id,))
+                stale += [row[0] for row in cursor.fetchall() if row[0] not in kept]
+                deleted_ids = list(deleted_ids) + stale
+                # Exceptions come back with the full listing
+                cursor.execute('''
+                    DELETE FROM recurring_exceptions
+                    WHERE series_id IN (SELECT id FROM recurring_events WHERE calendar_id = ?)
+                ''', (calendar_id,))
+
+            rows = []
+            for event in upserts:
+                start_time, start_ts = normalize_time(event["start_time"])
+                end_time, end_ts = normalize_time(event["end_time"])
+                rows.append((event["id"], event["title"], start_time, end_time, start_ts, end_ts,
+                             event["color"], event["description"], event["location"], now,
+                             calendar_id, event.get("calendar_color"), event.get("attendees")))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO events
+                (id, title, start_time, end_time, start_ts, end_ts, color, description, location, last_updated,
+                 calendar_id, calendar_color, attendees)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+            series_rows = []
+            for item in series:
+                start_ts, until_ts = recurrence.series_bounds(item)
+                series_rows.append((item["id"], calendar_id, item["title"], item["dtstart"], item.get("timezone"),
+                                    item["duration_s"], item["recurrence"], start_ts, until_ts, item["color"],
+                                    item["description"], item["location"], item.get("calendar_color"),
+                                    item.get("attendees"), now))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO recurring_events
+                (id, calendar_id, title, dtstart, timezone, duration_s, recurrence, start_ts, until_ts, color,
+                 description, location, calendar_color, attendees, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', series_rows)
+            # A series that used to be a single event (or the other way round) keeps one row
+            cursor.executemany('DELETE FROM events WHERE id = ?', [(item["id"],) for item in series])
+            cursor.executemany('DELETE FROM recurring_events WHERE id = ?', [(event["id"],) for event in upserts])
+            cursor.executemany('INSERT OR IGNORE INTO recurring_exceptions (series_id, original_ts) VALUES (?, ?)', exceptions)
+
+            for event_id in deleted_ids:
+                cursor.execute('DELETE FROM events WHERE id = ?', (event_id,))
+                removed += cursor.rowcount
+                cursor.execute('DELETE FROM recurring_events WHERE id = ?', (event_id,))
+                removed += cursor.rowcount
+            cursor.execute('DELETE FROM recurring_exceptions WHERE series_id NOT IN (SELECT id FROM recurring_events)')
+
+            if sync_token:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO calendar_sync_state (calendar_id, sync_token, updated_at, recurrence)
+                    VALUES (?, ?, ?, ?)
+                ''', (calendar_id, sync_token, now, recurrence_mode))
+
+            conn.commit()
+            if upserts or series or exceptions or removed:
+                self.version += 1
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return {"upserted": len(upserts) + len(series), "deleted": removed}
+
+    def attendee_emails(self) -> Set[str]:
+        """Everyone the user has shared a synced event or recurring series with"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT attendees FROM events WHERE attendees IS NOT NULL AND attendees != ''
+            UNION SELECT attendees FROM recurring_events WHERE attendees IS NOT NULL AND attendees != ''
+        ''')
+        emails = {email for (attendees,) in cursor.fetchall() for email in attendees.split(",")}
+        conn.close()
+        return emails
+
+    def has_synced(self) -> bool:
+        """Whether any calendar has completed a sync, so the events here reflect the real calendar"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM calendar_sync_state LIMIT 1')
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+
+    def stored_calendars(self) -> Dict[str, Optional[str]]:
+        """Color of every calendar with a sync token or synced events, keyed by calendar id"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT calendar_id, MAX(calendar_color) FROM events WHERE id LIKE 'gcal_%' GROUP BY calendar_id
+        ''')
+        calendars = dict(cursor.fetchall())
+        cursor.execute('SELECT calendar_id FROM calendar_sync_state')
+        for (calendar_id,) in cursor.fetchall():
+            calendars.setdefault(calendar_id, None)
+        conn.close()
+        return calendars
+
+    def remove_other_calendars(self, calendar_ids: List[str]) -> int:
+        """Drop synced events and sync tokens of every calendar not in calendar_ids"""
+        placeholders = ",".join("?" for _ in calendar_ids)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM events WHERE id LIKE 'gcal_%' AND calendar_id NOT IN ({placeholders})", calendar_ids
+        )
+        removed = cursor.rowcount
+        cursor.execute(f'DELETE FROM recurring_events WHERE calendar_id NOT IN ({placeholders})', calendar_ids)
+        removed += cursor.rowcount
+        cursor.execute('DELETE FROM recurring_exceptions WHERE series_id NOT IN (SELECT id FROM recurring_events)')
+        cursor.execute(f'DELETE FROM calendar_sync_state WHERE calendar_id NOT IN ({placeholders})', calendar_ids)
+        conn.commit()
+        conn.close()
+        if removed:
+            self.version += 1
+        return removed
+
+# Global instance
+calendar_store = CalendarStore()
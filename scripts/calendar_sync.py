@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts import recurrence
+from scripts.calendar_store import calendar_store, normalize_time
+from scripts.http_client import http_client
+from scripts.rate_limit import TokenBucket
+from scripts.response_cache import response_cache
+
+CALENDAR_API = "https://www.googleapis.com/calendar/v3"
+# A full sync starts this far back; incremental syncs then track every change
+CALENDAR_LOOKBACK_DAYS = int(os.environ.get("CALENDAR_LOOKBACK_DAYS", "30"))
+CALENDAR_PAGE_SIZE = 250
+
+# Which calendars to sync besides primary: "selected" (those shown in Google Calendar),
+# "all", or a comma-separated list of calendar IDs or names
+GOOGLE_CALENDARS = os.environ.get("GOOGLE_CALENDARS", "selected").strip()
+
+# Every calendar's requests share one rate limit
+CALENDAR_REQUESTS_PER_SECOND = float(os.environ.get("CALENDAR_REQUESTS_PER_SECOND", "5"))
+CALENDAR_MAX_CONCURRENCY = int(os.environ.get("CALENDAR_MAX_CONCURRENCY", "4"))
+CALENDAR_MAX_RETRIES = 3
+
+# "google" has Google expand recurring events into instances; "local" fetches each series once,
+# with its RRULE/EXDATE lines and exceptions, and expands it per query (needs python-dateutil)
+CALENDAR_RECURRENCE = os.environ.get("CALENDAR_RECURRENCE", "google").strip().lower()
+if CALENDAR_RECURRENCE == "local" and not recurrence.available():
+    print("⚠️  CALENDAR_RECURRENCE=local needs python-dateutil, letting Google expand recurring events")
+    CALENDAR_RECURRENCE = "google"
+
+PRIMARY_CALENDAR = {"id": "primary", "summary": "primary", "color": None, "primary": True, "selected": True}
+
+calendar_bucket = TokenBucket(CALENDAR_REQUESTS_PER_SECOND)
+
+class SyncTokenExpired(Exception):
+    """Google answered 410 Gone: the stored sync token is no longer valid and a full sync is needed"""
+
+def event_color(title: str) -> str:
+    """Color an event by keywords in its title"""
+    title_lower = title.lower()
+    if any(word in title_lower for word in ['meeting', 'call']):
+        return "#10b981"  # Green for meetings
+    if any(word in title_lower for word in ['project', 'work']):
+        return "#f59e0b"  # Amber for work
+    if any(word in title_lower for word in ['personal', 'doctor', 'appointment']):
+        return "#8b5cf6"  # Purple for personal
+    return "#3b82f6"  # Default blue
+
+def event_row_id(calendar_id: str, event_id: str) -> str:
+    """events table id; primary keeps the plain gcal_ ids, other calendars get a calendar prefix"""
+    if calendar_id == "primary":
+        return f"gcal_{event_id}"
+    return f"gcal_{hashlib.sha1(calendar_id.encode()).hexdigest()[:10]}_{event_id}"
+
+def event_attendees(item: Dict[str, Any]) -> str:
+    """Comma-separated emails of the other people on an event (organizer included), without rooms"""
+    people = list(item.get('attendees', []))
+    if item.get('organizer'):
+        people.append(item['organizer'])
+    emails = {
+        person['email'].lower() for person in people
+        if person.get('email') and not person.get('self') and not person.get('resource')
+        and not person['email'].endswith('calendar.google.com')
+    }
+    return ",".join(sorted(emails))
+
+def parse_event(item: Dict[str, Any], calendar: Dict[str, Any] = PRIMARY_CALENDAR) -> Dict[str, Any]:
+    """An events table row from a Google Calendar event resource"""
+    start = item['start'].get('dateTime', item['start'].get('date'))
+    end = item['end'].get('dateTime', item['end'].get('date'))
+    title = item.get('summary', 'No title')
+    return {
+        "id": event_row_id(calendar["id"], item['id']),
+        "title": title,
+        "start_time": datetime.fromisoformat(start.replace('Z', '+00:00')).isoformat(),
+        "end_time": datetime.fromisoformat(end.replace('Z', '+00:00')).isoformat(),
+        # Primary events are colored by title, other calendars keep their own Google color
+        "color": event_color(title) if calendar["primary"] or not calendar["color"] else calendar["color"],
+        "description": item.get('description', ''),
+        "location": item.get('location', ''),
+        "attendees": event_attendees(item),
+        "calendar_id": calendar["id"],
+        "calendar_color": calendar["color"]
+    }
+
+def parse_series(item: Dict[str, Any], calendar: Dict[str, Any] = PRIMARY_CALENDAR) -> Dict[str, Any]:
+    """A recurring_events row from a recurring master event resource"""
+    start = item['start'].get('dateTime', item['start'].get('date'))
+    end = item['end'].get('dateTime', item['end'].get('date'))
+    title = item.get('summary', 'No title')
+    return {
+        "id": event_row_id(calendar["id"], item['id']),
+        "title": title,
+        "dtstart": start,
+        "timezone": item['start'].get('timeZone'),
+        "duration_s": normalize_time(end)[1] - normalize_time(start)[1],
+        "recurrence": "\n".join(item['recurrence']),
+        "color": event_color(title) if calendar["primary"] or not calendar["color"] else calendar["color"],
+        "description": item.get('description', ''),
+        "location": item.get('location', ''),
+        "attendees": event_attendees(item),
+        "calendar_color": calendar["color"]
+    }
+
+def original_start_ts(item: Dict[str, Any]) -> int:
+    """Epoch start an exception's occurrence had before it was moved or cancelled"""
+    original = item['originalStartTime']
+    return normalize_time(original.get('dateTime', original.get('date')))[1]
+
+async def get_json(access_token: str, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """One rate-limited Calendar API GET, honouring Retry-After on 429 and retrying 5xx"""
+    session = http_client.session("google")
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    for attempt in range(CALENDAR_MAX_RETRIES + 1):
+        await calendar_bucket.acquire()
+        async with session.get(url, headers=headers, params=params) as response:
+            if response.status == 200:
+                return await response.json()
+            if response.status == 410:
+                raise SyncTokenExpired(url)
+            if (response.status == 429 or response.status >= 500) and attempt < CALENDAR_MAX_RETRIES:
+                retry_after = response.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+                print(f"⚠️  Calendar API {response.status}, retrying in {delay:.1f}s")
+                if response.status == 429:
+                    calendar_bucket.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            raise RuntimeError(f"Calendar API error: {response.status} - {await response.text()}")
+
+async def list_calendars(access_token: str) -> List[Dict[str, Any]]:
+    """Every calendar on the user's calendar list, with the primary one under the id "primary" """
+    params = {"maxResults": CALENDAR_PAGE_SIZE}
+    headers = {"Authorization": f"Bearer {access_token}"}
+    calendars = []
+    while True:
+        # The calendar list rarely changes, so each sync revalidates it with its ETag and usually gets a 304
+        status, data = await response_cache.get_json(
+            "google", f"{CALENDAR_API}/users/me/calendarList", headers, dict(params), ttl=0, stale_ttl=0,
+            before_request=calendar_bucket.acquire
+        )
+        if status != 200:
+            raise RuntimeError(f"Calendar list error: {status}")
+        for item in data.get("items", []):
+            calendars.append({
+                "id": "primary" if item.get("primary") else item["id"],
+                "summary": item.get("summaryOverride") or item.get("summary", item["id"]),
+                "color": item.get("backgroundColor"),
+                "primary": bool(item.get("primary")),
+                "selected": bool(item.get("selected"))
+            })
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return calendars
+        params["pageToken"] = page_token
+
+def select_calendars(calendars: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The calendars GOOGLE_CALENDARS asks for; primary is always synced"""
+    if GOOGLE_CALENDARS.lower() == "all":
+        chosen = calendars
+    elif GOOGLE_CALENDARS.lower() == "selected":
+        chosen = [calendar for calendar in calendars if calendar["primary"] or calendar["selected"]]
+    else:
+        wanted = {name.strip().lower() for name in GOOGLE_CALENDARS.split(",") if name.strip()}
+        chosen = [
+            calendar for calendar in calendars
+            if calendar["primary"] or calendar["id"].lower() in wanted or calendar["summary"].lower() in wanted
+        ]
+    if not any(calendar["primary"] for calendar in chosen):
+        chosen = [PRIMARY_CALENDAR] + chosen
+    return chosen
+
+async def list_event_changes(access_token: str, calendar_id: str,
+                             sync_token: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Every event changed since sync_token (or every event, without one), across all pages, and the next sync token"""
+    url = f"{CALENDAR_API}/calendars/{calendar_id}/events"
+    params = {"singleEvents": "false" if CALENDAR_RECURRENCE == "local" else "true", "maxResults": CALENDAR_PAGE_SIZE}
+    if sync_token:
+        params["syncToken"] = sync_token
+    else:
+        # timeMin may only be sent on the initial request, never with a sync token
+        params["timeMin"] = (datetime.utcnow() - timedelta(days=CALENDAR_LOOKBACK_DAYS)).isoformat() + 'Z'
+
+    items = []
+    while True:
+        data = await get_json(access_token, url, params)
+        items.extend(data.get("items", []))
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return items, data.get("nextSyncToken")
+        params["pageToken"] = page_token
+
+async def sync_calendar(access_token: str, calendar: Dict[str, Any] = PRIMARY_CALENDAR) -> Dict[str, Any]:
+    """Apply one calendar's changes since its last sync to events.db, or do a full sync without a valid sync token"""
+    calendar_id = calendar["id"]
+    # Switching recurrence modes changes what Google returns, so it starts from a full sync
+    sync_token = calendar_store.get_sync_token(calendar_id, CALENDAR_RECURRENCE)
+    try:
+        items, next_sync_token = await list_event_changes(access_token, calendar_id, sync_token)
+    except SyncTokenExpired:
+        print(f"📅 Sync token for calendar '{calendar['summary']}' expired, running a full sync")
+        sync_token = None
+        items, next_sync_token = await list_event_changes(access_token, calendar_id, None)
+
+    upserts = []
+    series = []
+    exceptions = []
+    deleted_ids = []
+    for item in items:
+        try:
+            # Only series masters are fetched in local mode, so moved or cancelled
+            # occurrences arrive as exceptions that expansion has to skip
+            if item.get("recurringEventId") and item.get("originalStartTime"):
+                exceptions.append((event_row_id(calendar_id, item['recurringEventId']), original_start_ts(item)))
+            if item.get("status") == "cancelled":
+                deleted_ids.append(event_row_id(calendar_id, item['id']))
+            elif item.get("recurrence") and CALENDAR_RECURRENCE == "local":
+                series.append(parse_series(item, calendar))
+            else:
+                upserts.append(parse_event(item, calendar))
+        except (KeyError, ValueError) as e:
+            print(f"❌ Error syncing event {item.get('summary', item.get('id'))}: {e}")
+
+    if CALENDAR_RECURRENCE != "local":
+        exceptions = []
+
+    full = sync_token is None
+    stats = calendar_store.apply_changes(
+        calendar_id, upserts, deleted_ids, next_sync_token, full=full,
+        series=series, exceptions=exceptions, recurrence_mode=CALENDAR_RECURRENCE
+    )
+    return {**stats, "full": full}
+
+def stored_calendars() -> List[Dict[str, Any]]:
+    """Calendars the store already holds, shaped like select_calendars' result, primary first"""
+    calendars = [PRIMARY_CALENDAR]
+    for calendar_id, color in calendar_store.stored_calendars().items():
+        if calendar_id != PRIMARY_CALENDAR["id"]:
+            calendars.append({"id": calendar_id, "summary": calendar_id, "color": color, "primary": False, "selected": True})
+    return calendars
+
+async def sync_calendars(access_token: str) -> Dict[str, Any]:
+    """Sync every selected calendar concurrently and drop events of calendars no longer selected"""
+    try:
+        calendars = select_calendars(await list_calendars(access_token))
+    except Exception as e:
+        # Without the list we cannot tell which calendars went away, so keep everything already synced
+        print(f"⚠️  Could not list calendars, syncing the ones already stored: {e}")
+        calendars = stored_calendars()
+    else:
+        calendar_store.remove_other_calendars([calendar["id"] for calendar in calendars])
+
+    semaphore = asyncio.Semaphore(CALENDAR_MAX_CONCURRENCY)
+
+    async def sync_one(calendar: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await sync_calendar(access_token, calendar)
+
+    results = await asyncio.gather(*[sync_one(calendar) for calendar in calendars], return_exceptions=True)
+
+    totals = {"calendars": len(calendars), "upserted": 0, "deleted": 0, "full": 0, "failed": 0}
+    for calendar, result in zip(calendars, results):
+        if isinstance(result, Exception):
+            print(f"❌ Calendar '{calendar['summary']}' sync failed: {result}")
+            totals["failed"] += 1
+            continue
+        totals["upserted"] += result["upserted"]
+        totals["deleted"] += result["deleted"]
+        totals["full"] += int(result["full"])
+    return totals
@@ -0,0 +1,83 @@
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+class DeadlineExceeded(TimeoutError):
+    """A required pipeline stage could not finish inside the request deadline"""
+
+class Deadline:
+    """Time budget carried through every stage of one request.
+
+    Required stages get whatever share of the remaining budget they are
+    allotted and fail the request if they overrun it. Optional stages are
+    skipped outright when too little time is left, and are dropped (not
+    failed) if they time out. Every skip or cut is recorded in `degraded`
+    so the response can say what was left out.
+    """
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_s
+        self.degraded: List[Dict[str, str]] = []
+        self.timings: Dict[str, float] = {}
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def stage_timeout(self, share: float, reserve_s: float = 0.0) -> float:
+        """Seconds a stage may take: its share of the budget, never eating into time reserved for later stages"""
+        return max(min(self.budget_s * share, self.remaining() - reserve_s), 0.0)
+
+    def degrade(self, stage: str, reason: str):
+        self.degraded.append({"stage": stage, "reason": reason})
+        print(f"⏱️  Degraded {stage}: {reason}")
+
+    async def run(self, stage: str, awaitable: Awaitable, share: float, reserve_s: float = 0.0) -> Any:
+        """Run a required stage, raising DeadlineExceeded if it overruns its budget"""
+        timeout = self.stage_timeout(share, reserve_s)
+        if timeout <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise DeadlineExceeded(f"no time left for {stage}")
+
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{stage} did not finish within {timeout:.2f}s")
+        finally:
+            self.timings[stage] = round(time.monotonic() - started, 3)
+
+    async def run_optional(self, stage: str, awaitable: Awaitable, share: float, min_s: float, reserve_s: float = 0.0) -> Optional[Any]:
+        """Run an optional stage, returning None if it is skipped or overruns its budget"""
+        timeout = self.stage_timeout(share, reserve_s)
+        if timeout < min_s:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.degrade(stage, f"skipped, only {self.remaining():.2f}s left")
+            return None
+
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            self.degrade(stage, f"timed out after {timeout:.2f}s")
+            return None
+        finally:
+            self.timings[stage] = round(time.monotonic() - started, 3)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget_s": self.budget_s,
+            "elapsed_s": round(self.elapsed(), 3),
+            "stage_timings_s": self.timings,
+            "degraded": self.degraded
+        }
@@ -0,0 +1,244 @@
+import os
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from scripts.calendar_store import calendar_store
+
+# The standing index covers this window around today; queries outside it get a one-off index
+FREE_BUSY_LOOKBACK_DAYS = 7
+FREE_BUSY_HORIZON_DAYS = int(os.environ.get("FREE_BUSY_HORIZON_DAYS", "180"))
+# Events starting further back than this before a window are not checked for overlap
+MAX_EVENT_DAYS = 7
+
+WORKDAY_START_HOUR = int(os.environ.get("WORKDAY_START_HOUR", "9"))
+WORKDAY_END_HOUR = int(os.environ.get("WORKDAY_END_HOUR", "18"))
+
+DAY_PARTS = {"morning": (WORKDAY_START_HOUR, 12), "afternoon": (12, 17), "evening": (17, 21)}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+# "Am I free thursday afternoon?", "When am I available?"; anything else goes to the normal answer path
+SCHEDULE_QUESTION = re.compile(r"^\W*(?:(?:hey|ok)\s+)?(?:atlas\W+)?(when\s+)?am\s+i\s+(?:free|busy|available)\b")
+
+def is_all_day(event: Dict[str, Any]) -> bool:
+    """All-day events (birthdays, holidays, out-of-office markers) don't block time by default"""
+    return (event["start_time"][11:19] == "00:00:00" and event["end_time"][11:19] == "00:00:00"
+            and event["end_ts"] - event["start_ts"] >= 23 * 3600)
+
+class IntervalTree:
+    """Static augmented interval tree over half-open [start, end) intervals.
+
+    Intervals are kept sorted by start, and the implicit balanced tree over
+    that array stores the latest end in each subtree, so an overlap query
+    skips every subtree that ends before the window and visits only
+    O(log n + matches) nodes.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int, Any]]):
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.items = [interval[2] for interval in intervals]
+        self.max_end = [0] * len(intervals)
+        self._build(0, len(intervals))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return -1
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start: int, end: int) -> List[Any]:
+        """Items whose interval overlaps [start, end), in start order"""
+        found = []
+        self._search(0, len(self.items), start, end, found)
+        return found
+
+    def _search(self, lo: int, hi: int, start: int, end: int, found: List[Any]):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return
+        self._search(lo, mid, start, end, found)
+        if self.starts[mid] >= end:
+            return
+        if self.ends[mid] > start:
+            found.append(self.items[mid])
+        self._search(mid + 1, hi, start, end, found)
+
+class FreeBusyEngine:
+    """Free/busy, overlap and next-free-slot answers from an in-memory interval index over events.db.
+
+    The index is rebuilt whenever calendar sync commits a change (the
+    store's version moves) or the day rolls over, so queries never touch
+    SQLite, embeddings or the LLM.
+    """
+
+    def __init__(self):
+        self.tree: Optional[IntervalTree] = None
+        self.version = None
+        self.day = None
+        self.span = (0, 0)
+        self.stats = {"queries": 0, "builds": 0, "one_off_builds": 0, "last_build_ms": 0.0}
+
+    def _build(self, start_ts: int, end_ts: int) -> IntervalTree:
+        started = time.perf_counter()
+        events = calendar_store.events_between(start_ts - MAX_EVENT_DAYS * 86400, end_ts)
+        tree = IntervalTree([(event["start_ts"], event["end_ts"], event) for event in events])
+        self.stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return tree
+
+    def refresh(self):
+        """Rebuild the standing index for the current calendar version and day"""
+        today = datetime.combine(date.today(), datetime.min.time())
+        span = (
+            int((today - timedelta(days=FREE_BUSY_LOOKBACK_DAYS)).timestamp()),
+            int((today + timedelta(days=FREE_BUSY_HORIZON_DAYS)).timestamp())
+        )
+        self.tree = self._build(*span)
+        self.span = span
+        self.version = calendar_store.version
+        self.day = today.date()
+        self.stats["builds"] += 1
+
+    def _tree_for(self, start_ts: int, end_ts: int) -> IntervalTree:
+        self.stats["queries"] += 1
+        if self.tree is None or self.version != calendar_store.version or self.day != date.today():
+            self.refresh()
+        if self.span[0] <= start_ts and end_ts <= self.span[1]:
+            return self.tree
+        self.stats["one_off_builds"] += 1
+        return self._build(start_ts, end_ts)
+
+    def conflicts(self, start_ts: int, end_ts: int, include_all_day: bool = False,
+                  exclude_id: str = None) -> List[Dict[str, Any]]:
+        """Events overlapping [start_ts, end_ts)"""
+        events = self._tree_for(start_ts, end_ts).overlapping(start_ts, end_ts)
+        return [
+            event for event in events
+            if event["id"] != exclude_id and (include_all_day or not is_all_day(event))
+        ]
+
+    def busy_blocks(self, start_ts: int, end_ts: int, include_all_day: bool = False) -> List[Dict[str, Any]]:
+        """Busy time in the window as merged, clipped blocks with the events behind each"""
+        blocks = []
+        for event in self.conflicts(start_ts, end_ts, include_all_day):
+            block_start, block_end = max(event["start_ts"], start_ts), min(event["end_ts"], end_ts)
+            if blocks and block_start <= blocks[-1]["end_ts"]:
+                blocks[-1]["end_ts"] = max(blocks[-1]["end_ts"], block_end)
+                blocks[-1]["events"].append(event["id"])
+            else:
+                blocks.append({"start_ts": block_start, "end_ts": block_end, "events": [event["id"]]})
+        return blocks
+
+    def free_slots(self, start_ts: int, end_ts: int, min_duration_s: int = 0,
+                   include_all_day: bool = False) -> List[Tuple[int, int]]:
+        """Gaps between busy blocks in the window, at least min_duration_s long"""
+        slots = []
+        cursor = start_ts
+        for block in self.busy_blocks(start_ts, end_ts, include_all_day):
+            if block["start_ts"] - cursor >= max(min_duration_s, 1):
+                slots.append((cursor, block["start_ts"]))
+            cursor = max(cursor, block["end_ts"])
+        if end_ts - cursor >= max(min_duration_s, 1):
+            slots.append((cursor, end_ts))
+        return slots
+
+    def next_free_slot(self, duration_s: int, after: datetime = None, within_days: int = 14,
+                       workday: Tuple[int, int] = (WORKDAY_START_HOUR, WORKDAY_END_HOUR)) -> Optional[Tuple[int, int]]:
+        """Earliest slot of duration_s inside working hours, starting no earlier than after"""
+        after = after or datetime.now()
+        for offset in range(within_days + 1):
+            day = datetime.combine(after.date() + timedelta(days=offset), datetime.min.time())
+            window_start = max(day.replace(hour=workday[0]), after)
+            window_end = day.replace(hour=workday[1])
+            if window_end <= window_start:
+                continue
+            slots = self.free_slots(int(window_start.timestamp()), int(window_end.timestamp()), duration_s)
+            if slots:
+                return slots[0][0], slots[0][0] + duration_s
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "indexed_events": len(self.tree) if self.tree else 0,
+            "calendar_version": self.version
+        }
+
+def format_time(ts: int) -> str:
+    return datetime.fromtimestamp(ts).strftime("%H:%M")
+
+def parse_day_window(text: str, now: datetime) -> Optional[Tuple[datetime, datetime, str]]:
+    """The day (and part of it) a question asks about, e.g. "thursday afternoon", "tomorrow" """
+    text = text.lower()
+    day = None
+    label = None
+    if "today" in text:
+        day, label = now.date(), "today"
+    elif "tomorrow" in text:
+        day, label = now.date() + timedelta(days=1), "tomorrow"
+    else:
+        for weekday, name in enumerate(WEEKDAYS):
+            if name in text:
+                day = now.date() + timedelta(days=(weekday - now.weekday()) % 7)
+                label = name.capitalize()
+                break
+    if day is None:
+        return None
+
+    hours = (WORKDAY_START_HOUR, WORKDAY_END_HOUR)
+    for part, part_hours in DAY_PARTS.items():
+        if part in text:
+            hours = part_hours
+            label = f"{label} {part}"
+            break
+
+    start = datetime.combine(day, datetime.min.time()).replace(hour=hours[0])
+    end = datetime.combine(day, datetime.min.time()).replace(hour=hours[1])
+    return max(start, now), end, label
+
+def answer_schedule_question(question: str, now: datetime = None) -> Optional[str]:
+    """An exact answer to "am I free ..." questions from the local calendar, or None if it isn't one.
+
+    "When am I free" asks for the next free slot; "am I free/busy/available"
+    needs a day to check. Nothing is answered before a calendar has synced,
+    since an empty index would say the user is free all the time.
+    """
+    text = question.lower()
+    match = SCHEDULE_QUESTION.match(text)
+    if not match:
+        return None
+    now = now or datetime.now()
+    window = parse_day_window(text, now)
+    if window is None and not match.group(1):
+        return None
+    if not calendar_store.has_synced():
+        return None
+    if window is None:
+        slot = free_busy.next_free_slot(30 * 60, now)
+        if not slot:
+            return "I couldn't find a free half hour in your working hours over the next two weeks."
+        return f"Your next free half hour is {datetime.fromtimestamp(slot[0]).strftime('%A at %H:%M')}."
+
+    start, end, label = window
+    if end <= start:
+        return f"{label.capitalize()} is already over."
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+    slots = free_busy.free_slots(start_ts, end_ts, 15 * 60)
+    if not slots:
+        busy = free_busy.conflicts(start_ts, end_ts)
+        titles = ", ".join(event["title"] for event in busy[:3])
+        return f"You're fully booked {label}" + (f" ({titles})." if titles else ".")
+    if slots == [(start_ts, end_ts)]:
+        return f"You're free all of {label} ({format_time(start_ts)}–{format_time(end_ts)})."
+    ranges = ", ".join(f"{format_time(slot_start)}–{format_time(slot_end)}" for slot_start, slot_end in slots)
+    return f"You're free {label} {ranges}."
+
+# Global instance
+free_busy = FreeBusyEngine()
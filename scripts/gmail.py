@@ -0,0 +1,162 @@
+import asyncio
+import email.utils
+import json
+import os
+import re
+import urllib.parse
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+GMAIL_API = "https://gmail.googleapis.com/gmail/v1/users/me"
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+
+# Only the headers and fields the app reads are downloaded
+METADATA_HEADERS = ["From", "To", "Cc", "Subject", "Date"]
+MESSAGE_FIELDS = "id,threadId,labelIds,snippet,internalDate,historyId,payload/headers"
+LIST_FIELDS = "messages/id,nextPageToken,resultSizeEstimate"
+
+# Gmail accepts 100 calls per batch but starts rate limiting parts above about 50
+GMAIL_BATCH_SIZE = 50
+GMAIL_MAX_CONCURRENCY = int(os.environ.get("GMAIL_MAX_CONCURRENCY", "10"))
+
+def metadata_params() -> List[Tuple[str, str]]:
+    """Query parameters for a metadata-only messages.get"""
+    return [("format", "metadata")] + [("metadataHeaders", name) for name in METADATA_HEADERS] + [("fields", MESSAGE_FIELDS)]
+
+def build_batch_body(message_ids: List[str], boundary: str) -> str:
+    """multipart/mixed body with one metadata-only messages.get per id"""
+    query = urllib.parse.urlencode(metadata_params())
+    parts = []
+    for n, message_id in enumerate(message_ids):
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item{n}>\r\n\r\n"
+            f"GET /gmail/v1/users/me/messages/{message_id}?{query}\r\n\r\n"
+        )
+    return "".join(parts) + f"--{boundary}--\r\n"
+
+def parse_batch_response(body: str, content_type: str) -> Dict[int, Tuple[int, Optional[Dict[str, Any]]]]:
+    """(status, JSON body) of each batch part, keyed by its position in the request"""
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError(f"Batch response has no boundary: {content_type}")
+
+    results = {}
+    for part in body.replace("\r\n", "\n").split(f"--{match.group(1)}"):
+        item = re.search(r"Content-ID:\s*<response-item(\d+)>", part, re.IGNORECASE)
+        status = re.search(r"^HTTP/[\d.]+ (\d{3})", part, re.MULTILINE)
+        if not item or not status:
+            continue
+        # The embedded response's body follows its own headers
+        http_response = part[status.start():]
+        payload = http_response.split("\n\n", 1)[1].strip() if "\n\n" in http_response else ""
+        try:
+            data = json.loads(payload) if payload else None
+        except json.JSONDecodeError:
+            data = None
+        results[int(item.group(1))] = (int(status.group(1)), data)
+    return results
+
+def address_list(*values: str) -> List[str]:
+    """Lowercased email addresses in From/To/Cc header values"""
+    return [address.lower() for _, address in email.utils.getaddresses([value for value in values if value]) if "@" in address]
+
+def message_summary(message: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields the app uses from a metadata-format message"""
+    headers = {header["name"]: header["value"] for header in message.get("payload", {}).get("headers", [])}
+    internal_date = message.get("internalDate")
+    senders = address_list(headers.get("From"))
+    return {
+        "id": message["id"],
+        "thread_id": message.get("threadId"),
+        "sender": headers.get("From", "Unknown"),
+        "sender_email": senders[0] if senders else None,
+        "recipients": address_list(headers.get("To"), headers.get("Cc")),
+        "subject": headers.get("Subject", "No subject"),
+        "date": headers.get("Date", ""),
+        "snippet": message.get("snippet", ""),
+        "labels": message.get("labelIds", []),
+        "history_id": message.get("historyId"),
+        "received_at": datetime.fromtimestamp(int(internal_date) / 1000) if internal_date else None
+    }
+
+async def fetch_messages(session, access_token: str,
+                         message_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Metadata of many messages in one batch round trip per 50, in the order asked for, and the ids that failed.
+
+    Parts the batch could not serve (rate limited or failed) are fetched
+    again individually with bounded concurrency. A 404 there means the
+    message is gone and it is left out; any other failure is returned in
+    the second list so callers can try again rather than lose it.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    found: Dict[str, Dict[str, Any]] = {}
+    retry_ids = []
+    failed = []
+
+    for offset in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        chunk = message_ids[offset:offset + GMAIL_BATCH_SIZE]
+        boundary = f"batch_{uuid.uuid4().hex}"
+        try:
+            async with session.post(
+                GMAIL_BATCH_URL,
+                data=build_batch_body(chunk, boundary),
+                headers={**headers, "Content-Type": f"multipart/mixed; boundary={boundary}"}
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Gmail batch error: {response.status}")
+                parts = parse_batch_response(await response.text(), response.headers.get("Content-Type", ""))
+        except Exception as e:
+            print(f"⚠️  Gmail batch failed, fetching {len(chunk)} messages individually: {e}")
+            parts = {}
+
+        for n, message_id in enumerate(chunk):
+            status, data = parts.get(n, (None, None))
+            if status == 200 and data:
+                found[message_id] = data
+            else:
+                retry_ids.append(message_id)
+
+    if retry_ids:
+        semaphore = asyncio.Semaphore(GMAIL_MAX_CONCURRENCY)
+
+        async def fetch_one(message_id: str):
+            async with semaphore:
+                async with session.get(
+                    f"{GMAIL_API}/messages/{message_id}", headers=headers, params=metadata_params()
+                ) as response:
+                    if response.status == 200:
+                        found[message_id] = await response.json()
+                    elif response.status != 404:
+                        raise RuntimeError(f"Gmail API error: {response.status}")
+
+        results = await asyncio.gather(*[fetch_one(message_id) for message_id in retry_ids], return_exceptions=True)
+        failed = [message_id for message_id, result in zip(retry_ids, results) if isinstance(result, Exception)]
+        if failed:
+            print(f"⚠️  Could not fetch {len(failed)} Gmail messages, e.g. {failed[0]}: "
+                  f"{results[retry_ids.index(failed[0])]}")
+
+    return [found[message_id] for message_id in message_ids if message_id in found], failed
+
+def fetch_messages_sync(access_token: str, message_ids: List[str]) -> List[Dict[str, Any]]:
+    """Blocking fetch_messages for callers using requests; failed parts are simply skipped"""
+    import requests
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    messages = []
+    for offset in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        chunk = message_ids[offset:offset + GMAIL_BATCH_SIZE]
+        boundary = f"batch_{uuid.uuid4().hex}"
+        response = requests.post(
+            GMAIL_BATCH_URL,
+            data=build_batch_body(chunk, boundary),
+            headers={**headers, "Content-Type": f"multipart/mixed; boundary={boundary}"}
+        )
+        if response.status_code != 200:
+            print(f"Gmail batch error: {response.status_code}")
+            continue
+        parts = parse_batch_response(response.text, response.headers.get("Content-Type", ""))
+        messages.extend(data for n, (status, data) in sorted(parts.items()) if status == 200 and data)
+    return messages
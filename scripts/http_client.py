@@ -0,0 +1,110 @@
+
+import asyncio
+from typing import Any, Dict, Tuple
+
+import aiohttp
+
+# Connection pool and timeout settings per integration
+INTEGRATIONS = {
+    "notion": {
+        "limit_per_host": 10,
+        "timeout": aiohttp.ClientTimeout(total=60, connect=10, sock_read=30)
+    },
+    "google": {
+        "limit_per_host": 20,
+        "timeout": aiohttp.ClientTimeout(total=30, connect=10, sock_read=20)
+    },
+    "oauth": {
+        "limit_per_host": 4,
+        "timeout": aiohttp.ClientTimeout(total=15, connect=5)
+    },
+    "default": {
+        "limit_per_host": 10,
+        "timeout": aiohttp.ClientTimeout(total=30, connect=10)
+    }
+}
+DNS_CACHE_TTL_S = 300
+KEEPALIVE_TIMEOUT_S = 60
+
+class HTTPClient:
+    """Application-scoped pooled HTTP sessions, one per integration.
+
+    Each integration gets its own aiohttp session with a per-host connection
+    pool, keep-alive, cached DNS lookups and its own timeouts, so repeated
+    calls to the same API reuse warm TLS connections instead of opening a
+    new one per call. aiohttp sessions belong to the event loop that made
+    them, so the sync worker's loop gets sessions of its own.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[Tuple[int, str], aiohttp.ClientSession] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        stats = self.stats.setdefault(name, {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0
+        })
+
+        def counter(key: str):
+            async def count(_session, _context, _params):
+                stats[key] += 1
+            return count
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace_config
+
+    def session(self, name: str = "default") -> aiohttp.ClientSession:
+        """The pooled session for an integration on the running event loop"""
+        settings = INTEGRATIONS.get(name, INTEGRATIONS["default"])
+        key = (id(asyncio.get_running_loop()), name)
+        session = self.sessions.get(key)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=settings["limit_per_host"],
+                ttl_dns_cache=DNS_CACHE_TTL_S,
+                keepalive_timeout=KEEPALIVE_TIMEOUT_S
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=settings["timeout"],
+                trace_configs=[self._trace_config(name)]
+            )
+            self.sessions[key] = session
+        return session
+
+    def open(self):
+        """Create every integration's session up front on the running loop"""
+        for name in INTEGRATIONS:
+            self.session(name)
+
+    async def close(self):
+        """Close the sessions that belong to the running event loop"""
+        loop_id = id(asyncio.get_running_loop())
+        for key in [key for key in self.sessions if key[0] == loop_id]:
+            await self.sessions.pop(key).close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        integrations = {}
+        for name, stats in self.stats.items():
+            connections = stats["connections_created"] + stats["connections_reused"]
+            integrations[name] = {
+                **stats,
+                "reuse_ratio": round(stats["connections_reused"] / connections, 3) if connections else 0
+            }
+        return {
+            "open_sessions": len([session for session in self.sessions.values() if not session.closed]),
+            "integrations": integrations
+        }
+
+# Global instance
+http_client = HTTPClient()
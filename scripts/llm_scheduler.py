@@ -0,0 +1,312 @@
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import openai
+
+# Priority classes, most latency-sensitive first
+INTERACTIVE = "interactive"
+BATCH = "batch"
+BACKGROUND = "background"
+
+# Share of dispatches each class gets while all of them have work queued
+PRIORITY_WEIGHTS = {INTERACTIVE: 8, BATCH: 3, BACKGROUND: 1}
+STRIDE = 1000
+# While the request whose turn it is waits for token budget, smaller ones that fit may go
+# ahead of it, but only for this long so a large request is never starved
+TOKEN_BYPASS_MAX_WAIT_S = float(os.getenv("LLM_TOKEN_BYPASS_MAX_WAIT_S", "30"))
+
+class AdmissionTimeout(TimeoutError):
+    """No concurrency slot was granted before the caller's timeout"""
+
+class _Waiter:
+    def __init__(self, priority: str, est_tokens: int, future: asyncio.Future):
+        self.priority = priority
+        self.est_tokens = est_tokens
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class LLMSlot:
+    """A granted unit of LLM concurrency; calls made through it back off on 429s"""
+
+    def __init__(self, scheduler: "LLMScheduler", priority: str, est_tokens: int):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.est_tokens = est_tokens
+        self.used_tokens: Optional[int] = None
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking OpenAI call on a worker thread, retrying rate-limit errors"""
+        attempt = 0
+        while True:
+            await self.scheduler.wait_for_backoff()
+            try:
+                result = await asyncio.to_thread(fn, *args, **kwargs)
+            except openai.RateLimitError as e:
+                attempt += 1
+                self.scheduler.record_rate_limit(e, attempt)
+                if attempt > self.scheduler.max_retries:
+                    raise
+                continue
+
+            usage = getattr(result, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.record_usage(usage.total_tokens)
+            return result
+
+    def record_usage(self, total_tokens: int):
+        self.used_tokens = (self.used_tokens or 0) + total_tokens
+
+class LLMScheduler:
+    """Central admission control for OpenAI requests.
+
+    Limits how many requests run at once and how many tokens are spent per
+    minute. Waiting requests are queued per priority class and dispatched by
+    stride scheduling, so interactive traffic gets most of the capacity while
+    batch and background work still make progress. The last `reserved` slots
+    are only ever handed to interactive requests, which keeps chat latency
+    bounded while background jobs soak up whatever is left. When the
+    request whose turn it is needs more tokens than the budget holds, the
+    head of another class that fits is dispatched instead, until the
+    blocked request has waited TOKEN_BYPASS_MAX_WAIT_S.
+
+    The scheduler belongs to one event loop (the app's, see bind_loop).
+    run() may also be awaited from another thread's loop, such as the sync
+    worker's; the call is then forwarded to the owning loop so every
+    request still goes through the same queues and budget.
+    """
+
+    def __init__(self, max_concurrency: int = None, tokens_per_minute: int = None):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv("LLM_TOKENS_PER_MINUTE", "150000"))
+        self.reserved_interactive = min(int(os.getenv("LLM_INTERACTIVE_RESERVED", "1")), self.max_concurrency - 1)
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+        self._queues: Dict[str, Deque[_Waiter]] = {name: deque() for name in PRIORITY_WEIGHTS}
+        self._pass: Dict[str, float] = {name: 0.0 for name in PRIORITY_WEIGHTS}
+        self._active = 0
+        self._tokens = float(self.tokens_per_minute)
+        self._tokens_checked_at = time.monotonic()
+        self._backoff_until = 0.0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._wait_times: Dict[str, Deque[float]] = {name: deque(maxlen=500) for name in PRIORITY_WEIGHTS}
+        self.stats = {
+            "dispatched": {name: 0 for name in PRIORITY_WEIGHTS},
+            "bypassed": 0,
+            "rate_limited": 0,
+            "tokens_used": 0
+        }
+
+    # Token budget
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._tokens_checked_at
+        self._tokens_checked_at = now
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    # Dispatching
+    def _eligible_classes(self) -> List[str]:
+        candidates = []
+        for name, queue in self._queues.items():
+            if not queue:
+                continue
+            if name != INTERACTIVE and self._active >= self.max_concurrency - self.reserved_interactive:
+                continue
+            candidates.append(name)
+        return candidates
+
+    def _pick_class(self) -> Optional[str]:
+        candidates = self._eligible_classes()
+        if not candidates:
+            return None
+        return min(candidates, key=lambda name: self._pass[name])
+
+    def _needed(self, waiter: _Waiter) -> float:
+        # A request larger than the whole budget is let through once the bucket is full
+        return min(waiter.est_tokens, self.tokens_per_minute)
+
+    def _pick_fitting_class(self, blocked: _Waiter) -> Optional[str]:
+        """Class whose head fits the tokens left, to go ahead of a head that does not"""
+        if time.monotonic() - blocked.enqueued_at >= TOKEN_BYPASS_MAX_WAIT_S:
+            return None
+        fitting = [
+            name for name in self._eligible_classes()
+            if not self._queues[name][0].future.done() and self._needed(self._queues[name][0]) <= self._tokens
+        ]
+        if not fitting:
+            return None
+        return min(fitting, key=lambda name: self._pass[name])
+
+    def _schedule_wakeup(self, delay: float):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(max(delay, 0.01), self._dispatch)
+
+    def _dispatch(self):
+        self._wakeup = None
+        now = time.monotonic()
+        if now < self._backoff_until:
+            self._schedule_wakeup(self._backoff_until - now)
+            return
+
+        while self._active < self.max_concurrency:
+            name = self._pick_class()
+            if name is None:
+                return
+
+            queue = self._queues[name]
+            waiter = queue[0]
+            if waiter.future.done():
+                # Cancelled while queued
+                queue.popleft()
+                continue
+
+            self._refill()
+            needed = self._needed(waiter)
+            if self._tokens < needed:
+                # Run a smaller request meanwhile rather than leave the budget idle behind this one
+                bypass = self._pick_fitting_class(waiter)
+                if bypass is None:
+                    self._schedule_wakeup((needed - self._tokens) * 60 / self.tokens_per_minute)
+                    return
+                self.stats["bypassed"] += 1
+                name = bypass
+                queue = self._queues[name]
+                waiter = queue[0]
+                needed = self._needed(waiter)
+
+            queue.popleft()
+            self._tokens -= needed
+            self._active += 1
+            self._pass[name] += STRIDE / PRIORITY_WEIGHTS[name]
+            self.stats["dispatched"][name] += 1
+            self._wait_times[name].append(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Make loop the one that owns the queues; calls from other loops are forwarded to it"""
+        self._loop = loop
+
+    async def acquire(self, priority: str, est_tokens: int):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        if priority not in self._queues:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+
+        # A class that was idle rejoins at the current virtual time instead of bursting ahead
+        if not self._queues[priority]:
+            busy = [self._pass[name] for name, queue in self._queues.items() if queue]
+            if busy:
+                self._pass[priority] = max(self._pass[priority], min(busy))
+
+        waiter = _Waiter(priority, est_tokens, asyncio.get_running_loop().create_future())
+        self._queues[priority].append(waiter)
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted and cancelled in the same tick, hand the slot back
+                self.release(waiter.est_tokens, None)
+            raise
+
+    def release(self, est_tokens: int, used_tokens: Optional[int]):
+        self._active -= 1
+        if used_tokens is not None:
+            # Correct the reservation with what the API actually reported
+            self._refill()
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + est_tokens - used_tokens)
+            self.stats["tokens_used"] += used_tokens
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str, est_tokens: int = 1000, timeout: Optional[float] = None):
+        """Hold one concurrency slot for the duration of the block.
+
+        With a timeout, AdmissionTimeout is raised if no slot is granted in time.
+        """
+        if timeout is None:
+            await self.acquire(priority, est_tokens)
+        else:
+            try:
+                await asyncio.wait_for(self.acquire(priority, est_tokens), max(timeout, 0))
+            except asyncio.TimeoutError:
+                raise AdmissionTimeout(f"no {priority} LLM slot within {timeout:.2f}s")
+        llm_slot = LLMSlot(self, priority, est_tokens)
+        try:
+            yield llm_slot
+        finally:
+            self.release(est_tokens, llm_slot.used_tokens)
+
+    async def run(self, fn: Callable, *args, priority: str = INTERACTIVE, est_tokens: int = 1000, **kwargs) -> Any:
+        """Queue a single blocking OpenAI call under the given priority class"""
+        if self._loop is not None and asyncio.get_running_loop() is not self._loop:
+            forwarded = asyncio.run_coroutine_threadsafe(
+                self.run(fn, *args, priority=priority, est_tokens=est_tokens, **kwargs), self._loop
+            )
+            return await asyncio.wrap_future(forwarded)
+
+        async with self.slot(priority, est_tokens) as llm_slot:
+            return await llm_slot.call(fn, *args, **kwargs)
+
+    # Rate-limit backoff
+    def record_rate_limit(self, error: Exception, attempt: int):
+        self.stats["rate_limited"] += 1
+        delay = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    delay = None
+        if delay is None:
+            delay = min(2 ** attempt, 30)
+
+        self._backoff_until = max(self._backoff_until, time.monotonic() + delay)
+        print(f"⚠️  OpenAI rate limited, backing off {delay:.1f}s (attempt {attempt})")
+
+    async def wait_for_backoff(self):
+        delay = self._backoff_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # Metrics
+    def get_stats(self) -> Dict[str, Any]:
+        self._refill()
+        wait_times = {}
+        for name, samples in self._wait_times.items():
+            ordered: List[float] = sorted(samples)
+            wait_times[name] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0,
+                "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else 0,
+                "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 1) if ordered else 0
+            }
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "tokens_per_minute": self.tokens_per_minute,
+            "active": self._active,
+            "queue_depth": {name: len(queue) for name, queue in self._queues.items()},
+            "wait_times": wait_times,
+            "tokens_available": int(self._tokens),
+            "backing_off": time.monotonic() < self._backoff_until,
+            **self.stats
+        }
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int = 0) -> int:
+    """Rough prompt + completion token estimate (about four characters per token)"""
+    prompt_chars = sum(len(message.get("content", "")) for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+# Global instance
+llm_scheduler = LLMScheduler()
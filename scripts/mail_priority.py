@@ -0,0 +1,166 @@
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from scripts.calendar_store import calendar_store
+from scripts.mail_store import mail_store
+
+# Client addresses come from Notion (reloaded this often) and calendar attendees (on every calendar change)
+CLIENT_REFRESH_S = 300
+# Unread or important messages considered for a priority inbox, newest first
+PRIORITY_CANDIDATES = 500
+
+HIGH_SCORE = 50
+NORMAL_SCORE = 25
+
+# A client domain only counts for business domains, not everyone at gmail.com
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "yahoo.com", "icloud.com",
+    "me.com", "aol.com", "proton.me", "protonmail.com", "gmx.com"
+}
+BULK_LABELS = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_UPDATES", "CATEGORY_FORUMS", "SPAM"}
+AUTOMATED_SENDERS = ("noreply", "no-reply", "donotreply", "do-not-reply", "notifications", "mailer-daemon", "newsletter")
+
+def email_domain(email: Optional[str]) -> str:
+    return email.rsplit("@", 1)[-1] if email and "@" in email else ""
+
+class MailPriorityScorer:
+    """Scores mirrored mail from precomputed per-sender statistics and known client addresses.
+
+    Sender stats are reloaded from mail.db only when a mail sync commits
+    a change, so scoring a message is a few dict lookups and some
+    arithmetic: no SQLite, Gmail or LLM call.
+    """
+
+    def __init__(self):
+        self.senders: Dict[str, Dict[str, Any]] = {}
+        self.notion_clients: Set[str] = set()
+        self.attendees: Set[str] = set()
+        self.client_domains: Set[str] = set()
+        self.mail_version = None
+        self.calendar_version = None
+        self.clients_loaded_at = 0.0
+        self.stats = {"scored": 0, "sender_reloads": 0, "client_reloads": 0}
+
+    def refresh(self, force: bool = False):
+        """Reload sender stats and client addresses that have changed since they were last loaded"""
+        if force or self.mail_version != mail_store.version:
+            self.senders = mail_store.sender_stats()
+            self.mail_version = mail_store.version
+            self.stats["sender_reloads"] += 1
+
+        if (force or self.calendar_version != calendar_store.version
+                or time.time() - self.clients_loaded_at > CLIENT_REFRESH_S):
+            try:
+                from scripts import notion_mirror
+                self.notion_clients = notion_mirror.client_emails()
+            except Exception as e:
+                print(f"⚠️  Could not load Notion client emails: {e}")
+            self.attendees = calendar_store.attendee_emails()
+            self.client_domains = {
+                email_domain(email) for email in self.notion_clients
+                if email_domain(email) not in FREE_MAIL_DOMAINS
+            }
+            self.calendar_version = calendar_store.version
+            self.clients_loaded_at = time.time()
+            self.stats["client_reloads"] += 1
+
+    def is_client(self, email: Optional[str]) -> bool:
+        return bool(email) and (email in self.notion_clients or email_domain(email) in self.client_domains)
+
+    def score(self, message: Dict[str, Any], now: float = None) -> Tuple[int, List[str]]:
+        """0–100 priority of a mirrored message, with the reasons that moved it"""
+        now = now or time.time()
+        email = message.get("sender_email")
+        labels = set(message["labels"])
+        sender = self.senders.get(email) or {}
+        score = 10.0
+        reasons = []
+
+        if email in self.notion_clients:
+            score += 40
+            reasons.append("client")
+        elif email_domain(email) in self.client_domains:
+            score += 20
+            reasons.append("client domain")
+        elif email in self.attendees:
+            score += 20
+            reasons.append("meets with you")
+
+        received = sender.get("received_count", 0)
+        replied = sender.get("replied_count", 0)
+        if received:
+            reply_rate = min(replied / received, 1.0)
+            score += 25 * reply_rate
+            if reply_rate >= 0.5:
+                reasons.append("you usually reply")
+            # Frequent senders you never answer are newsletters and notifications
+            if replied == 0 and received >= 10:
+                score -= min(5 * math.log2(received / 5), 20)
+                reasons.append("rarely answered")
+        if sender.get("last_replied_ts") and now - sender["last_replied_ts"] < 14 * 86400:
+            score += 10
+            reasons.append("recent conversation")
+
+        if "IMPORTANT" in labels:
+            score += 15
+            reasons.append("marked important")
+        if "STARRED" in labels:
+            score += 10
+            reasons.append("starred")
+        if "UNREAD" in labels:
+            score += 5
+        if labels & BULK_LABELS:
+            score -= 25
+            reasons.append("bulk category")
+        if email and any(marker in email for marker in AUTOMATED_SENDERS):
+            score -= 20
+            reasons.append("automated sender")
+
+        age_days = max(now - message["received_ts"], 0) / 86400
+        score -= min(age_days * 1.5, 15)
+
+        self.stats["scored"] += 1
+        return max(0, min(100, round(score))), reasons
+
+    @staticmethod
+    def importance(score: int) -> str:
+        if score >= HIGH_SCORE:
+            return "high"
+        if score >= NORMAL_SCORE:
+            return "normal"
+        return "low"
+
+    def rank(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Messages with score, importance and reasons added, highest priority first"""
+        self.refresh()
+        now = time.time()
+        ranked = []
+        for message in messages:
+            score, reasons = self.score(message, now)
+            ranked.append({**message, "score": score, "importance": self.importance(score), "reasons": reasons})
+        ranked.sort(key=lambda message: (message["score"], message["received_ts"]), reverse=True)
+        return ranked
+
+    def prioritized(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Priority inbox: the highest scoring unread or important messages"""
+        return self.rank(mail_store.priority_messages(PRIORITY_CANDIDATES))[:limit]
+
+    def client_messages(self) -> List[Dict[str, Any]]:
+        """Unread or important messages from clients"""
+        self.refresh()
+        return [
+            message for message in mail_store.priority_messages(PRIORITY_CANDIDATES)
+            if self.is_client(message["sender_email"])
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "senders": len(self.senders),
+            "notion_clients": len(self.notion_clients),
+            "calendar_contacts": len(self.attendees)
+        }
+
+# Global instance
+mail_priority = MailPriorityScorer()
@@ -0,0 +1,287 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+# Mirrored messages older than this are pruned as the mailbox advances
+MAIL_RETENTION_DAYS = int(os.environ.get("MAIL_RETENTION_DAYS", "90"))
+
+class MailStore:
+    """Local SQLite mirror of Gmail message metadata, labels and snippets, advanced by history.list"""
+
+    def __init__(self, db_path: str = "data/mail.db"):
+        self.db_path = db_path
+        # Bumped whenever a sync commits changed messages
+        self.version = 0
+        self.init_database()
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def init_database(self):
+        """Initialize SQLite tables for the mail mirror"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT,
+                sender TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                sender_email TEXT,
+                snippet TEXT,
+                received_ts INTEGER NOT NULL,
+                labels TEXT NOT NULL,
+                is_unread INTEGER NOT NULL DEFAULT 0,
+                is_important INTEGER NOT NULL DEFAULT 0,
+                is_priority INTEGER NOT NULL DEFAULT 0,
+                is_sent INTEGER NOT NULL DEFAULT 0,
+                synced_at TEXT NOT NULL
+            )
+        ''')
+
+        # To/Cc addresses of sent mail, which is what counts as replying to a sender
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS message_recipients (
+                message_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                PRIMARY KEY (message_id, email)
+            )
+        ''')
+
+        # Per-sender counts over the mirror, recomputed for the senders each sync touches
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sender_stats (
+                email TEXT PRIMARY KEY,
+                received_count INTEGER NOT NULL DEFAULT 0,
+                first_received_ts INTEGER,
+                last_received_ts INTEGER,
+                replied_count INTEGER NOT NULL DEFAULT 0,
+                last_replied_ts INTEGER
+            )
+        ''')
+
+        # History id the mirror is current to, and other small bits of sync state
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mail_sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        # Mirrors seeded before sender addresses were kept are seeded again by the next sync
+        cursor.execute('PRAGMA table_info(messages)')
+        columns = [row[1] for row in cursor.fetchall()]
+        if 'sender_email' not in columns:
+            cursor.execute('ALTER TABLE messages ADD COLUMN sender_email TEXT')
+            cursor.execute('ALTER TABLE messages ADD COLUMN is_sent INTEGER NOT NULL DEFAULT 0')
+            cursor.execute("DELETE FROM mail_sync_state WHERE key = 'history_id'")
+
+        # Priority is unread or important, so the inbox summary is one index range scan
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_priority ON messages(is_priority, received_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_unread ON messages(is_unread, received_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_received ON messages(received_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_email, received_ts)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipients_email ON message_recipients(email)')
+
+        conn.commit()
+        conn.close()
+
+    def get_state(self, key: str) -> Optional[str]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM mail_sync_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def retry_ids(self) -> Dict[str, int]:
+        """Messages a previous sync could not fetch, with how many times they have failed"""
+        value = self.get_state("retry_ids")
+        return json.loads(value) if value else {}
+
+    @staticmethod
+    def _label_flags(labels: List[str]) -> tuple:
+        is_unread = int("UNREAD" in labels)
+        is_important = int("IMPORTANT" in labels)
+        is_sent = int("SENT" in labels)
+        return json.dumps(labels), is_unread, is_important, int(bool(is_unread or is_important) and not is_sent), is_sent
+
+    @staticmethod
+    def _chunks(items: List[Any], size: int = 500):
+        for offset in range(0, len(items), size):
+            yield items[offset:offset + size]
+
+    def _addresses_of(self, cursor, message_ids: List[str]) -> Set[str]:
+        """Senders and recipients whose stats change when these messages do"""
+        emails = set()
+        for chunk in self._chunks(message_ids):
+            placeholders = ",".join("?" for _ in chunk)
+            cursor.execute(f'SELECT sender_email FROM messages WHERE id IN ({placeholders})', chunk)
+            emails.update(row[0] for row in cursor.fetchall() if row[0])
+            cursor.execute(f'SELECT email FROM message_recipients WHERE message_id IN ({placeholders})', chunk)
+            emails.update(row[0] for row in cursor.fetchall())
+        return emails
+
+    def _refresh_sender_stats(self, cursor, emails: Optional[Set[str]]):
+        """Recompute sender_stats for these addresses, or for everyone when emails is None"""
+        if emails is None:
+            cursor.execute('DELETE FROM sender_stats')
+            batches = [("", [])]
+        else:
+            batches = []
+            for chunk in self._chunks(sorted(emails)):
+                placeholders = ",".join("?" for _ in chunk)
+                cursor.execute(f'DELETE FROM sender_stats WHERE email IN ({placeholders})', chunk)
+                batches.append((f" AND {{column}} IN ({placeholders})", chunk))
+
+        for clause, params in batches:
+            stats = {}
+            cursor.execute(f'''
+                SELECT sender_email, COUNT(DISTINCT thread_id), MIN(received_ts), MAX(received_ts)
+                FROM messages
+                WHERE is_sent = 0 AND sender_email IS NOT NULL{clause.format(column="sender_email")}
+                GROUP BY sender_email
+            ''', params)
+            for email, threads, first_ts, last_ts in cursor.fetchall():
+                stats[email] = [threads, first_ts, last_ts, 0, None]
+            # Sent mail to someone counts as replying to them, once per thread
+            cursor.execute(f'''
+                SELECT r.email, COUNT(DISTINCT m.thread_id), MAX(m.received_ts)
+                FROM message_recipients r
+                JOIN messages m ON m.id = r.message_id
+                WHERE 1 = 1{clause.format(column="r.email")}
+                GROUP BY r.email
+            ''', params)
+            for email, threads, last_ts in cursor.fetchall():
+                stats.setdefault(email, [0, None, None, 0, None])[3:] = [threads, last_ts]
+            cursor.executemany('''
+                INSERT INTO sender_stats
+                (email, received_count, first_received_ts, last_received_ts, replied_count, last_replied_ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(email, *values) for email, values in stats.items()])
+
+    def apply_changes(self, upserts: List[Dict[str, Any]], deleted_ids: List[str], label_updates: Dict[str, List[str]],
+                      history_id: str, full: bool = False, retry_ids: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """Apply one sync's messages, deletions and label changes, and its history id, in a single transaction.
+
+        upserts are gmail.message_summary dicts. A full (seed) sync also
+        removes mirrored messages it did not see. Sender statistics are
+        recomputed for just the addresses the changes touch. retry_ids,
+        messages that could not be fetched and how often they failed,
+        replaces the stored retry queue when given.
+        """
+        now = datetime.now()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            if full:
+                cursor.execute('SELECT id FROM messages')
+                kept = {message["id"] for message in upserts}
+                deleted_ids = list(deleted_ids) + [row[0] for row in cursor.fetchall() if row[0] not in kept]
+
+            # Mail past the retention window leaves the mirror as it advances
+            cutoff = int((now - timedelta(days=MAIL_RETENTION_DAYS)).timestamp())
+            cursor.execute('SELECT id FROM messages WHERE received_ts < ?', (cutoff,))
+            deleted_ids = list(dict.fromkeys(list(deleted_ids) + [row[0] for row in cursor.fetchall()]))
+
+            rows = []
+            recipients = []
+            affected = None if full else set()
+            for message in upserts:
+                flags = self._label_flags(message["labels"])
+                rows.append((message["id"], message["thread_id"], message["sender"], message.get("sender_email"),
+                             message["subject"], message["snippet"],
+                             int(message["received_at"].timestamp()) if message["received_at"] else int(now.timestamp()),
+                             *flags, now.isoformat()))
+                addresses = message.get("recipients", []) if flags[4] else [message.get("sender_email")]
+                if flags[4]:
+                    recipients.extend((message["id"], email) for email in addresses)
+                if affected is not None:
+                    affected.update(address for address in addresses if address)
+
+            if affected is not None:
+                affected |= self._addresses_of(cursor, deleted_ids + [message["id"] for message in upserts])
+
+            cursor.executemany('''
+                INSERT OR REPLACE INTO messages
+                (id, thread_id, sender, sender_email, subject, snippet, received_ts, labels,
+                 is_unread, is_important, is_priority, is_sent, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.executemany('DELETE FROM message_recipients WHERE message_id = ?', [(message["id"],) for message in upserts])
+            cursor.executemany('INSERT OR IGNORE INTO message_recipients (message_id, email) VALUES (?, ?)', recipients)
+
+            cursor.executemany('''
+                UPDATE messages SET labels = ?, is_unread = ?, is_important = ?, is_priority = ?, is_sent = ?, synced_at = ?
+                WHERE id = ?
+            ''', [(*self._label_flags(labels), now.isoformat(), message_id) for message_id, labels in label_updates.items()])
+            relabeled = cursor.rowcount if label_updates else 0
+
+            cursor.executemany('DELETE FROM messages WHERE id = ?', [(message_id,) for message_id in deleted_ids])
+            removed = cursor.rowcount if deleted_ids else 0
+            cursor.executemany('DELETE FROM message_recipients WHERE message_id = ?', [(message_id,) for message_id in deleted_ids])
+
+            if affected is None or affected:
+                self._refresh_sender_stats(cursor, affected)
+
+            cursor.execute('INSERT OR REPLACE INTO mail_sync_state (key, value) VALUES (?, ?)', ("history_id", str(history_id)))
+            if retry_ids is not None:
+                cursor.execute('INSERT OR REPLACE INTO mail_sync_state (key, value) VALUES (?, ?)',
+                               ("retry_ids", json.dumps(retry_ids)))
+            cursor.execute('INSERT OR REPLACE INTO mail_sync_state (key, value) VALUES (?, ?)', ("synced_at", now.isoformat()))
+
+            conn.commit()
+            if upserts or relabeled or removed:
+                self.version += 1
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return {"upserted": len(upserts), "relabeled": relabeled, "deleted": removed}
+
+    def priority_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest unread or important messages"""
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM messages
+            WHERE is_priority = 1
+            ORDER BY received_ts DESC
+            LIMIT ?
+        ''', (limit,))
+        messages = [{**dict(row), "labels": json.loads(row["labels"])} for row in cursor.fetchall()]
+        conn.close()
+        return messages
+
+    def counts(self) -> Dict[str, int]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM messages WHERE is_unread = 1')
+        unread = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM messages WHERE is_priority = 1')
+        priority = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM messages')
+        total = cursor.fetchone()[0]
+        conn.close()
+        return {"unread": unread, "priority": priority, "total": total}
+
+    def sender_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Statistics of everyone who has written or been replied to, keyed by lowercased address"""
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM sender_stats')
+        stats = {row["email"]: dict(row) for row in cursor.fetchall()}
+        conn.close()
+        return stats
+
+# Global instance
+mail_store = MailStore()
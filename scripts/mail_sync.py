@@ -0,0 +1,126 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from scripts import gmail
+from scripts.http_client import http_client
+from scripts.mail_store import mail_store
+
+# The first sync mirrors this much of the mailbox; history.list keeps it current afterwards
+MAIL_SEED_DAYS = int(os.environ.get("MAIL_SEED_DAYS", "30"))
+MAIL_SEED_MAX_MESSAGES = int(os.environ.get("MAIL_SEED_MAX_MESSAGES", "2000"))
+MAIL_PAGE_SIZE = 500
+# Messages that fail to fetch are retried on this many following syncs, then given up on
+MAIL_FETCH_MAX_RETRIES = int(os.environ.get("MAIL_FETCH_MAX_RETRIES", "5"))
+
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+HISTORY_FIELDS = (
+    "history(messagesAdded/message/id,messagesDeleted/message/id,"
+    "labelsAdded/message(id,labelIds),labelsRemoved/message(id,labelIds)),nextPageToken,historyId"
+)
+
+class HistoryExpired(Exception):
+    """Gmail answered 404 for startHistoryId: the mirror is too far behind and has to be seeded again"""
+
+async def get_json(access_token: str, url: str, params) -> Dict[str, Any]:
+    session = http_client.session("google")
+    async with session.get(url, headers={"Authorization": f"Bearer {access_token}"}, params=params) as response:
+        if response.status == 200:
+            return await response.json()
+        if response.status == 404 and "/history" in url:
+            raise HistoryExpired(url)
+        raise RuntimeError(f"Gmail API error: {response.status} - {await response.text()}")
+
+async def seed_mailbox(access_token: str) -> Dict[str, Any]:
+    """Mirror the last MAIL_SEED_DAYS of mail and record the history id to follow from.
+
+    Messages that fail to fetch are queued for the following syncs to retry.
+    """
+    # Taking the history id before listing means nothing that arrives meanwhile is missed
+    profile = await get_json(access_token, f"{gmail.GMAIL_API}/profile", {"fields": "historyId"})
+
+    params = {"q": f"newer_than:{MAIL_SEED_DAYS}d", "maxResults": MAIL_PAGE_SIZE, "fields": gmail.LIST_FIELDS}
+    message_ids = []
+    while len(message_ids) < MAIL_SEED_MAX_MESSAGES:
+        data = await get_json(access_token, f"{gmail.GMAIL_API}/messages", params)
+        message_ids.extend(message["id"] for message in data.get("messages", []))
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            break
+        params["pageToken"] = page_token
+
+    messages, failed = await gmail.fetch_messages(
+        http_client.session("google"), access_token, message_ids[:MAIL_SEED_MAX_MESSAGES]
+    )
+    stats = mail_store.apply_changes(
+        [gmail.message_summary(message) for message in messages], [], {}, profile["historyId"], full=True,
+        retry_ids=next_retry_ids({}, failed)
+    )
+    return {**stats, "full": True, "failed": len(failed)}
+
+def next_retry_ids(retry_ids: Dict[str, int], failed: List[str]) -> Dict[str, int]:
+    """The retry queue after a sync: failed messages with one more failure, dropped once past the cap"""
+    queued = {}
+    for message_id in failed:
+        attempts = retry_ids.get(message_id, 0) + 1
+        if attempts > MAIL_FETCH_MAX_RETRIES:
+            print(f"⚠️  Giving up on Gmail message {message_id} after {attempts} failed fetches")
+            continue
+        queued[message_id] = attempts
+    return queued
+
+async def list_history(access_token: str, start_history_id: str) -> Tuple[List[Dict[str, Any]], str]:
+    """Every history record since start_history_id, across all pages, and the mailbox's current history id"""
+    params = [("startHistoryId", start_history_id), ("maxResults", MAIL_PAGE_SIZE), ("fields", HISTORY_FIELDS)]
+    params += [("historyTypes", history_type) for history_type in HISTORY_TYPES]
+
+    records = []
+    while True:
+        data = await get_json(access_token, f"{gmail.GMAIL_API}/history", params)
+        records.extend(data.get("history", []))
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return records, data.get("historyId", start_history_id)
+        params = [param for param in params if param[0] != "pageToken"] + [("pageToken", page_token)]
+
+async def sync_mailbox(access_token: str) -> Dict[str, Any]:
+    """Advance the mirror from its stored history id, or seed it when there is none or it expired"""
+    history_id = mail_store.get_state("history_id")
+    if not history_id:
+        return await seed_mailbox(access_token)
+
+    try:
+        records, next_history_id = await list_history(access_token, history_id)
+    except HistoryExpired:
+        print("📧 Gmail history expired, seeding the mail mirror again")
+        return await seed_mailbox(access_token)
+
+    added = []
+    deleted = set()
+    label_updates = {}
+    for record in records:
+        for change in record.get("messagesAdded", []):
+            added.append(change["message"]["id"])
+        for change in record.get("messagesDeleted", []):
+            deleted.add(change["message"]["id"])
+        # Label changes carry the message's full label list afterwards, so the latest one wins
+        for change in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+            label_updates[change["message"]["id"]] = change["message"].get("labelIds", [])
+
+    # Messages earlier syncs failed to fetch are tried again along with the new ones
+    retry_ids = mail_store.retry_ids()
+    added = [message_id for message_id in dict.fromkeys(added + list(retry_ids)) if message_id not in deleted]
+    messages, failed = (
+        await gmail.fetch_messages(http_client.session("google"), access_token, added) if added else ([], [])
+    )
+    fetched = {message["id"] for message in messages}
+    # New messages are fetched whole, so only relabel the ones already mirrored
+    label_updates = {
+        message_id: labels for message_id, labels in label_updates.items()
+        if message_id not in deleted and message_id not in fetched
+    }
+
+    stats = mail_store.apply_changes(
+        [gmail.message_summary(message) for message in messages], list(deleted), label_updates, next_history_id,
+        retry_ids=next_retry_ids(retry_ids, failed)
+    )
+    return {**stats, "full": False, "failed": len(failed)}
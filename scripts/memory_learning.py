@@ -8,6 +8,7 @@ from dataclasses import dataclass
 import asyncio
 import schedule
 import time
+from scripts.llm_scheduler import llm_scheduler, estimate_tokens, BACKGROUND
 
 @dataclass
 class Interaction:
@@ -121,12 +122,17 @@ class MemoryLearningSystem:
         """
         
         try:
-            response = await self.openai_client.chat.completions.acreate(
+            messages = [
+                {"role": "system", "content": "You are a personal fact extraction specialist. Extract only clear, specific facts about Michael."},
+                {"role": "user", "content": prompt}
+            ]
+            # Background priority so fact extraction only uses capacity chat is not using
+            response = await llm_scheduler.run(
+                self.openai_client.chat.completions.create,
+                priority=BACKGROUND,
+                est_tokens=estimate_tokens(messages, 1500),
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a personal fact extraction specialist. Extract only clear, specific facts about Michael."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.1,
                 max_tokens=1500
             )
@@ -0,0 +1,178 @@
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from scripts.notion_store import notion_store
+
+# Which mirrored databases hold projects and clients (matched against the database title)
+PROJECT_DATABASES = [name.strip().lower() for name in os.getenv("NOTION_PROJECT_DATABASES", "project").split(",") if name.strip()]
+CLIENT_DATABASES = [name.strip().lower() for name in os.getenv("NOTION_CLIENT_DATABASES", "client").split(",") if name.strip()]
+# Number properties summed as revenue, by property name
+REVENUE_PROPERTIES = [name.strip().lower() for name in os.getenv("NOTION_REVENUE_PROPERTIES", "revenue,amount,invoice total").split(",") if name.strip()]
+
+DONE_STATUSES = {"done", "complete", "completed", "archived", "cancelled", "canceled", "closed", "finished", "paid"}
+AT_RISK_KEYWORDS = ("risk", "blocked", "behind", "stuck", "overdue", "delayed")
+DUE_DATE_NAMES = ("due", "deadline", "due date", "end date", "launch")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+def load_rows(title_keywords: List[str], workspace: str = None, exclude_keywords: List[str] = ()) -> List[Dict[str, Any]]:
+    """Mirrored rows, with their properties, of databases whose title contains a keyword and no excluded keyword"""
+    if not title_keywords:
+        return []
+
+    conn = notion_store.get_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    title_filter = " OR ".join("LOWER(d.title) LIKE ?" for _ in title_keywords)
+    params: List[Any] = [f"%{keyword}%" for keyword in title_keywords]
+    extra_filters = ""
+    for keyword in exclude_keywords:
+        extra_filters += " AND LOWER(d.title) NOT LIKE ?"
+        params.append(f"%{keyword}%")
+    if workspace:
+        extra_filters += " AND r.workspace = ?"
+        params.append(workspace)
+
+    cursor.execute(f'''
+        SELECT r.*, d.title AS database_title
+        FROM notion_rows r
+        JOIN notion_databases d ON d.database_id = r.database_id
+        WHERE ({title_filter}){extra_filters}
+    ''', params)
+    rows = {row["page_id"]: {**dict(row), "properties": {}} for row in cursor.fetchall()}
+
+    cursor.execute(f'''
+        SELECT p.*
+        FROM notion_row_properties p
+        JOIN notion_rows r ON r.page_id = p.page_id
+        JOIN notion_databases d ON d.database_id = r.database_id
+        WHERE ({title_filter}){extra_filters}
+    ''', params)
+    for prop in cursor.fetchall():
+        rows[prop["page_id"]]["properties"][prop["name"]] = dict(prop)
+
+    conn.close()
+    return list(rows.values())
+
+def row_status(row: Dict[str, Any]) -> Optional[str]:
+    """The row's status: a status property, else a select named like "status" or "stage" """
+    properties = row["properties"].values()
+    for prop in properties:
+        if prop["type"] == "status" and prop["text_value"]:
+            return prop["text_value"]
+    for prop in properties:
+        if prop["type"] == "select" and prop["name"].lower() in ("status", "stage", "state") and prop["text_value"]:
+            return prop["text_value"]
+    return None
+
+def row_due_date(row: Dict[str, Any]) -> Optional[str]:
+    """End (or start) of the row's due date property, else of its only date property"""
+    dates = [prop for prop in row["properties"].values() if prop["type"] == "date" and prop["date_start"]]
+    named = [prop for prop in dates if any(name in prop["name"].lower() for name in DUE_DATE_NAMES)]
+    chosen = named or (dates if len(dates) == 1 else [])
+    if not chosen:
+        return None
+    return chosen[0]["date_end"] or chosen[0]["date_start"]
+
+def project_health(status: Optional[str], due: Optional[str], today: date) -> str:
+    if status and status.lower() in DONE_STATUSES:
+        return "done"
+    if status and any(keyword in status.lower() for keyword in AT_RISK_KEYWORDS):
+        return "at_risk"
+    if due and due[:10] < today.isoformat():
+        return "at_risk"
+    return "on_track"
+
+def list_projects(status: str = None, health: str = None, workspace: str = None) -> List[Dict[str, Any]]:
+    """Projects from the mirror, soonest due first, optionally filtered by status or health"""
+    today = date.today()
+    projects = []
+    for row in load_rows(PROJECT_DATABASES, workspace):
+        row_state = row_status(row)
+        due = row_due_date(row)
+        project = {
+            "id": row["page_id"],
+            "title": row["title"],
+            "status": row_state,
+            "due": due,
+            "health": project_health(row_state, due, today),
+            "database": row["database_title"],
+            "workspace": row["workspace"],
+            "url": row["url"],
+            "last_edited_time": row["last_edited_time"]
+        }
+        if status and (row_state or "").lower() != status.lower():
+            continue
+        if health and project["health"] != health:
+            continue
+        projects.append(project)
+
+    projects.sort(key=lambda project: (project["health"] == "done", project["due"] or "9999"))
+    return projects
+
+def project_summary(workspace: str = None) -> Dict[str, int]:
+    projects = list_projects(workspace=workspace)
+    active = [project for project in projects if project["health"] != "done"]
+    return {
+        "total_projects": len(projects),
+        "active_projects": len(active),
+        "projects_on_track": len([project for project in active if project["health"] == "on_track"]),
+        "projects_at_risk": len([project for project in active if project["health"] == "at_risk"])
+    }
+
+def revenue_summary(today: date = None) -> Dict[str, Any]:
+    """Revenue number properties summed per calendar month, dated by the row's date property or creation time"""
+    today = today or date.today()
+    this_month = today.strftime("%Y-%m")
+    last_month = (today.replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+    conn = notion_store.get_connection()
+    cursor = conn.cursor()
+    placeholders = ",".join("?" for _ in REVENUE_PROPERTIES)
+    cursor.execute(f'''
+        SELECT substr(COALESCE(
+                   (SELECT MIN(d.date_start) FROM notion_row_properties d
+                    WHERE d.page_id = p.page_id AND d.type = 'date' AND d.date_start IS NOT NULL),
+                   r.created_time), 1, 7) AS month,
+               SUM(p.number_value)
+        FROM notion_row_properties p
+        JOIN notion_rows r ON r.page_id = p.page_id
+        WHERE LOWER(p.name) IN ({placeholders}) AND p.number_value IS NOT NULL
+        GROUP BY month
+    ''', REVENUE_PROPERTIES)
+    by_month = {month: total for month, total in cursor.fetchall() if month}
+    conn.close()
+
+    current = by_month.get(this_month, 0)
+    previous = by_month.get(last_month, 0)
+    return {
+        "monthly_revenue": round(current, 2),
+        "previous_month_revenue": round(previous, 2),
+        "revenue_growth": round((current - previous) / previous * 100) if previous else None,
+        "has_revenue_data": bool(by_month)
+    }
+
+def client_summary(today: date = None) -> Dict[str, int]:
+    today = today or date.today()
+    week_ago = (datetime.combine(today, datetime.min.time()) - timedelta(days=7)).isoformat()
+    # "Client Projects" is a project database, not a client list
+    clients = load_rows(CLIENT_DATABASES, exclude_keywords=PROJECT_DATABASES)
+    active = [row for row in clients if (row_status(row) or "").lower() not in DONE_STATUSES]
+    return {
+        "total_clients": len(clients),
+        "active_clients": len(active),
+        "new_clients_this_week": len([row for row in clients if (row["created_time"] or "") >= week_ago])
+    }
+
+def client_emails() -> Set[str]:
+    """Lowercased email addresses found in the client databases' email (or email-named text) properties"""
+    emails = set()
+    for row in load_rows(CLIENT_DATABASES, exclude_keywords=PROJECT_DATABASES):
+        for prop in row["properties"].values():
+            if prop["text_value"] and (prop["type"] == "email" or "email" in prop["name"].lower()):
+                emails.update(match.lower() for match in EMAIL_PATTERN.findall(prop["text_value"]))
+    return emails
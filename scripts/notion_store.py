@@ -0,0 +1,346 @@
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class NotionSyncStore:
+    """Local SQLite ledger of what has been synced from Notion into Pinecone, plus a mirror of database rows"""
+
+    def __init__(self, db_path: str = "data/notion_sync.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def init_database(self):
+        """Initialize SQLite tables for the sync ledger"""
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        # One row per synced page or database entry
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notion_pages (
+                page_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                database_id TEXT,
+                last_edited_time TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector_count INTEGER NOT NULL DEFAULT 1,
+                synced_at TEXT NOT NULL,
+                workspace TEXT NOT NULL DEFAULT 'default'
+            )
+        ''')
+
+        # Ledgers created before multi-workspace sync belong to the default workspace
+        cursor.execute('PRAGMA table_info(notion_pages)')
+        if 'workspace' not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE notion_pages ADD COLUMN workspace TEXT NOT NULL DEFAULT 'default'")
+
+        # Watermarks and other small bits of sync state
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+        # Mirror of database rows and their typed property values, for local queries
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notion_databases (
+                database_id TEXT PRIMARY KEY,
+                workspace TEXT NOT NULL,
+                title TEXT NOT NULL,
+                synced_at TEXT NOT NULL
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notion_rows (
+                page_id TEXT PRIMARY KEY,
+                database_id TEXT NOT NULL,
+                workspace TEXT NOT NULL,
+                title TEXT,
+                url TEXT,
+                created_time TEXT,
+                last_edited_time TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notion_row_properties (
+                page_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                text_value TEXT,
+                number_value REAL,
+                date_start TEXT,
+                date_end TEXT,
+                PRIMARY KEY (page_id, name)
+            )
+        ''')
+
+        # One row per workspace per sync pass, for status and cost trends
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                workspace TEXT NOT NULL,
+                reconcile INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                duration_s REAL,
+                pages_scanned INTEGER DEFAULT 0,
+                pages_changed INTEGER DEFAULT 0,
+                chunks_embedded INTEGER DEFAULT 0,
+                vectors_deleted INTEGER DEFAULT 0,
+                vectors_total INTEGER DEFAULT 0,
+                api_calls INTEGER DEFAULT 0,
+                errors INTEGER DEFAULT 0,
+                error TEXT,
+                phase_durations TEXT
+            )
+        ''')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sync_runs_started ON sync_runs(workspace, started_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notion_rows_database ON notion_rows(database_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notion_rows_workspace ON notion_rows(workspace)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_row_properties_text ON notion_row_properties(name, text_value)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_row_properties_number ON notion_row_properties(name, number_value)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_row_properties_date ON notion_row_properties(name, date_start)')
+
+        conn.commit()
+        conn.close()
+
+    def get_state(self, key: str) -> Optional[str]:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT value FROM sync_state WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+        conn.commit()
+        conn.close()
+
+    def clear_watermarks(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM sync_state WHERE key LIKE '%watermark%'")
+        conn.commit()
+        conn.close()
+
+    def clear_pages(self):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM notion_pages')
+        conn.commit()
+        conn.close()
+
+    def delete_pages(self, page_ids: List[str]):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('DELETE FROM notion_pages WHERE page_id = ?', [(page_id,) for page_id in page_ids])
+        conn.commit()
+        conn.close()
+
+    def get_page(self, page_id: str) -> Optional[Dict[str, Any]]:
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM notion_pages WHERE page_id = ?', (page_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def record_page(self, page_id: str, kind: str, last_edited_time: str, text_hash: str,
+                    vector_count: int = 1, database_id: str = None, workspace: str = "default"):
+        """Record the state of a page after its vectors were written"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO notion_pages
+            (page_id, kind, database_id, last_edited_time, text_hash, vector_count, synced_at, workspace)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (page_id, kind, database_id, last_edited_time, text_hash, vector_count,
+              datetime.now().isoformat(), workspace))
+        conn.commit()
+        conn.close()
+
+    def touch_page(self, page_id: str, last_edited_time: str):
+        """Advance a page's edit time when it was edited but its text did not change"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE notion_pages SET last_edited_time = ?, synced_at = ?
+            WHERE page_id = ?
+        ''', (last_edited_time, datetime.now().isoformat(), page_id))
+        conn.commit()
+        conn.close()
+
+    def list_pages(self, workspace: str = None) -> List[Dict[str, Any]]:
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if workspace:
+            cursor.execute('SELECT * FROM notion_pages WHERE workspace = ?', (workspace,))
+        else:
+            cursor.execute('SELECT * FROM notion_pages')
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    def is_mirrored(self, database_id: str) -> bool:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM notion_databases WHERE database_id = ?', (database_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+
+    def mirror_rows(self, database_id: str, workspace: str, title: str, rows: List[Dict[str, Any]]):
+        """Write database rows and their property values to the mirror in one transaction.
+
+        Each row is {"page_id", "title", "url", "created_time", "last_edited_time",
+        "properties": [(name, type, text_value, number_value, date_start, date_end), ...]}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO notion_databases (database_id, workspace, title, synced_at)
+            VALUES (?, ?, ?, ?)
+        ''', (database_id, workspace, title, datetime.now().isoformat()))
+
+        for row in rows:
+            cursor.execute('''
+                INSERT OR REPLACE INTO notion_rows
+                (page_id, database_id, workspace, title, url, created_time, last_edited_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (row["page_id"], database_id, workspace, row["title"], row["url"],
+                  row["created_time"], row["last_edited_time"]))
+            cursor.execute('DELETE FROM notion_row_properties WHERE page_id = ?', (row["page_id"],))
+            cursor.executemany('''
+                INSERT INTO notion_row_properties
+                (page_id, name, type, text_value, number_value, date_start, date_end)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(row["page_id"], *values) for values in row["properties"]])
+
+        conn.commit()
+        conn.close()
+
+    def prune_mirror(self, workspace: str, seen: set) -> int:
+        """Drop a workspace's mirrored databases and rows whose IDs are not in seen"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT page_id FROM notion_rows WHERE workspace = ?', (workspace,))
+        stale_rows = [(row[0],) for row in cursor.fetchall() if row[0] not in seen]
+        cursor.execute('SELECT database_id FROM notion_databases WHERE workspace = ?', (workspace,))
+        stale_databases = [(row[0],) for row in cursor.fetchall() if row[0] not in seen]
+
+        cursor.executemany('DELETE FROM notion_row_properties WHERE page_id = ?', stale_rows)
+        cursor.executemany('DELETE FROM notion_rows WHERE page_id = ?', stale_rows)
+        cursor.executemany('DELETE FROM notion_databases WHERE database_id = ?', stale_databases)
+        conn.commit()
+        conn.close()
+        return len(stale_rows)
+
+    def vector_totals(self) -> Dict[str, Dict[str, int]]:
+        """Pages and vectors currently indexed, per workspace"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT workspace, COUNT(*), COALESCE(SUM(vector_count), 0) FROM notion_pages GROUP BY workspace')
+        totals = {workspace: {"pages": pages, "vectors": vectors} for workspace, pages, vectors in cursor.fetchall()}
+        conn.close()
+        return totals
+
+    def start_run(self, workspace: str, reconcile: bool) -> int:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO sync_runs (workspace, reconcile, status, started_at)
+            VALUES (?, ?, 'running', ?)
+        ''', (workspace, int(reconcile), datetime.now().isoformat()))
+        run_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return run_id
+
+    def finish_run(self, run_id: int, status: str, duration_s: float, stats: Dict[str, int],
+                   phase_durations: Dict[str, float], error: str = None):
+        """Record the outcome, counters and per-phase timings of a sync run"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE sync_runs SET
+                status = ?, finished_at = ?, duration_s = ?, pages_scanned = ?, pages_changed = ?,
+                chunks_embedded = ?, vectors_deleted = ?, vectors_total = ?, api_calls = ?, errors = ?,
+                error = ?, phase_durations = ?
+            WHERE id = ?
+        ''', (status, datetime.now().isoformat(), round(duration_s, 3), stats.get("pages_scanned", 0),
+              stats.get("pages_changed", 0), stats.get("chunks_embedded", 0), stats.get("vectors_deleted", 0),
+              stats.get("vectors_total", 0), stats.get("api_calls", 0), stats.get("errors", 0), error,
+              json.dumps({phase: round(seconds, 3) for phase, seconds in phase_durations.items()}), run_id))
+        conn.commit()
+        conn.close()
+
+    def list_runs(self, limit: int = 20, workspace: str = None) -> List[Dict[str, Any]]:
+        """Most recent sync runs first"""
+        conn = self.get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        if workspace:
+            cursor.execute('SELECT * FROM sync_runs WHERE workspace = ? ORDER BY id DESC LIMIT ?', (workspace, limit))
+        else:
+            cursor.execute('SELECT * FROM sync_runs ORDER BY id DESC LIMIT ?', (limit,))
+        runs = []
+        for row in cursor.fetchall():
+            run = dict(row)
+            run["reconcile"] = bool(run["reconcile"])
+            run["phase_durations"] = json.loads(run["phase_durations"]) if run["phase_durations"] else {}
+            runs.append(run)
+        conn.close()
+        return runs
+
+    def run_trends(self, limit: int = 200) -> Dict[str, Dict[str, Any]]:
+        """Cost of recent successful runs per workspace, incremental and reconciling runs apart.
+
+        Comparing the first and last runs (and the series) shows how duration
+        and API calls grow with the number of indexed vectors.
+        """
+        runs = [run for run in self.list_runs(limit) if run["status"] == "succeeded"]
+        grouped: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for run in reversed(runs):
+            kind = "reconcile" if run["reconcile"] else "incremental"
+            grouped.setdefault(run["workspace"], {}).setdefault(kind, []).append(run)
+
+        trends: Dict[str, Dict[str, Any]] = {}
+        for workspace, kinds in grouped.items():
+            for kind, series in kinds.items():
+                count = len(series)
+                pages_scanned = sum(run["pages_scanned"] for run in series)
+                api_calls = sum(run["api_calls"] for run in series)
+                first, last = series[0], series[-1]
+                trends.setdefault(workspace, {})[kind] = {
+                    "runs": count,
+                    "avg_duration_s": round(sum(run["duration_s"] or 0 for run in series) / count, 2),
+                    "avg_api_calls": round(api_calls / count, 1),
+                    "api_calls_per_page_scanned": round(api_calls / pages_scanned, 2) if pages_scanned else None,
+                    "first": {key: first[key] for key in ("started_at", "duration_s", "api_calls", "vectors_total")},
+                    "last": {key: last[key] for key in ("started_at", "duration_s", "api_calls", "vectors_total")},
+                    "series": [
+                        {key: run[key] for key in ("started_at", "duration_s", "pages_scanned", "api_calls", "vectors_total")}
+                        for run in series[-20:]
+                    ]
+                }
+        return trends
+
+# Global instance
+notion_store = NotionSyncStore()
@@ -1,21 +1,44 @@
 
 import os
 import asyncio
-import aiohttp
 import json
 import openai
 import pinecone
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import schedule
 import time
+import hashlib
+from contextlib import contextmanager
+from scripts.http_client import http_client
+from scripts.llm_scheduler import llm_scheduler, BATCH
+from scripts.rate_limit import TokenBucket
+from scripts.notion_store import notion_store
+from scripts.notion_workspaces import DEFAULT_WORKSPACE, load_workspaces
 
 # Configuration
-NOTION_API_KEY = os.environ.get("NOTION_API_KEY")
-NOTION_WORKSPACES = os.environ.get("NOTION_WORKSPACES", "")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 
+# Notion allows an average of three requests per second per integration (each workspace has its own)
+NOTION_REQUESTS_PER_SECOND = float(os.environ.get("NOTION_REQUESTS_PER_SECOND", "3"))
+NOTION_MAX_CONCURRENCY = int(os.environ.get("NOTION_MAX_CONCURRENCY", "3"))
+NOTION_MAX_RETRIES = 5
+NOTION_MAX_BLOCKS_PER_PAGE = int(os.environ.get("NOTION_MAX_BLOCKS_PER_PAGE", "2000"))
+
+# Pages are embedded as chunks of about this many tokens, several chunks per embeddings request
+NOTION_CHUNK_TOKENS = int(os.environ.get("NOTION_CHUNK_TOKENS", "300"))
+NOTION_CHUNK_OVERLAP_TOKENS = int(os.environ.get("NOTION_CHUNK_OVERLAP_TOKENS", "40"))
+NOTION_EMBED_BATCH_SIZE = int(os.environ.get("NOTION_EMBED_BATCH_SIZE", "64"))
+PINECONE_WRITE_CONCURRENCY = int(os.environ.get("PINECONE_WRITE_CONCURRENCY", "4"))
+
+# How often a sync also lists the whole workspace to drop deleted pages from the index
+NOTION_RECONCILE_INTERVAL_HOURS = float(os.environ.get("NOTION_RECONCILE_INTERVAL_HOURS", "24"))
+
+# Chunk vectors are stored as {prefix}{page_id}_{n}, tagged with their workspace
+VECTOR_PREFIXES = {"notion_page": "notion_page_", "notion_database_entry": "notion_db_"}
+VECTOR_ID_SCHEME = "workspace-chunks"
+
 # Initialize clients
 openai_client = None
 pc = None
@@ -40,272 +63,784 @@ if OPENAI_API_KEY and PINECONE_API_KEY:
     except Exception as e:
         print(f"❌ Failed to initialize Notion sync: {e}")
 
+class ListingIncomplete(Exception):
+    """A page of a paginated listing could not be fetched, so the listing is only partial"""
+
 class NotionSync:
-    def __init__(self):
-        self.api_key = NOTION_API_KEY
+    """Notion API crawler: follows every cursor, bounded concurrency, rate limited"""
+
+    def __init__(self, workspace: str = DEFAULT_WORKSPACE, token: str = None):
+        self.workspace = workspace
+        self.api_key = token
         self.base_url = "https://api.notion.com/v1"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "Notion-Version": "2022-06-28"
         }
-    
+        self.bucket = TokenBucket(NOTION_REQUESTS_PER_SECOND)
+        self.semaphore = asyncio.Semaphore(NOTION_MAX_CONCURRENCY)
+        self.api_calls = 0
+        # Any failed call means a crawl may be missing results
+        self.failed_requests = 0
+        # Per-run counters recorded in the sync history
+        self.stats = {"pages_scanned": 0, "page_errors": 0}
+        # Watermark keys of listings that came back partial; their watermarks must not move
+        self.incomplete_listings = set()
+
+    async def request(self, method: str, path: str, json_body: Dict = None, params: Dict = None) -> Optional[Dict]:
+        """Make one rate-limited API call, honouring Retry-After on 429 and retrying 5xx"""
+        # Pooled keep-alive connections shared by every workspace and run on this loop
+        session = http_client.session("notion")
+
+        for attempt in range(NOTION_MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            async with self.semaphore:
+                self.api_calls += 1
+                async with session.request(
+                    method, f"{self.base_url}{path}", headers=self.headers, json=json_body, params=params
+                ) as response:
+                    if response.status == 200:
+                        return await response.json()
+
+                    status = response.status
+                    if status != 429 and status < 500:
+                        response_text = await response.text()
+                        print(f"❌ Notion API error {status} on {path}: {response_text[:200]}")
+                        self.failed_requests += 1
+                        return None
+                    retry_after = response.headers.get("Retry-After")
+
+            # Back off with the connection and the concurrency slot released, so other calls keep going
+            delay = float(retry_after) if retry_after else min(2 ** attempt, 30)
+            print(f"⚠️  Notion {status} on {path}, retrying in {delay:.1f}s")
+            if status == 429:
+                # Every caller on this token waits, in acquire(), not just this one
+                self.bucket.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+
+        print(f"❌ Notion API gave up on {path} after {NOTION_MAX_RETRIES} retries")
+        self.failed_requests += 1
+        return None
+
+    async def paginate(self, method: str, path: str, json_body: Dict = None, stop=None) -> List[Dict]:
+        """Collect results across every page of a paginated endpoint.
+
+        stop, if given, is called with each batch of results and ends the crawl
+        early when it returns True. Raises ListingIncomplete if any page of
+        results could not be fetched, rather than passing off a partial
+        listing as complete.
+        """
+        results = []
+        cursor = None
+        while True:
+            if method == "GET":
+                params = {"page_size": 100, **({"start_cursor": cursor} if cursor else {})}
+                data = await self.request(method, path, params=params)
+            else:
+                body = {**(json_body or {}), "page_size": 100, **({"start_cursor": cursor} if cursor else {})}
+                data = await self.request(method, path, json_body=body)
+
+            if data is None:
+                raise ListingIncomplete(f"{method} {path} failed after {len(results)} results")
+
+            batch = data.get("results", [])
+            results.extend(batch)
+
+            if stop and stop(batch):
+                break
+            if not data.get("has_more") or not data.get("next_cursor"):
+                break
+            cursor = data["next_cursor"]
+
+        return results
+
     async def get_databases(self) -> List[Dict]:
         """Get all accessible databases"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/search",
-                    headers=self.headers,
-                    json={"filter": {"property": "object", "value": "database"}}
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("results", [])
-                    else:
-                        print(f"❌ Failed to get databases: {response.status}")
-                        return []
+            return await self.paginate("POST", "/search", {"filter": {"property": "object", "value": "database"}})
         except Exception as e:
             print(f"❌ Error getting databases: {e}")
+            self.failed_requests += 1
+            self.incomplete_listings.add("databases")
             return []
-    
-    async def get_pages(self) -> List[Dict]:
-        """Get all accessible pages"""
+
+    async def get_pages(self, since: Optional[str] = None) -> List[Dict]:
+        """Get accessible pages, newest edits first, optionally only those edited since a watermark"""
+        body = {
+            "filter": {"property": "object", "value": "page"},
+            "sort": {"direction": "descending", "timestamp": "last_edited_time"}
+        }
+
+        def older_than_watermark(batch):
+            return bool(since) and any(page.get("last_edited_time", "") < since for page in batch)
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/search",
-                    headers=self.headers,
-                    json={"filter": {"property": "object", "value": "page"}}
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("results", [])
-                    else:
-                        print(f"❌ Failed to get pages: {response.status}")
-                        return []
+            pages = await self.paginate("POST", "/search", body, stop=older_than_watermark)
+            if since:
+                # Search cannot filter by time, but results are sorted so this is a prefix
+                pages = [page for page in pages if page.get("last_edited_time", "") >= since]
+            return pages
         except Exception as e:
             print(f"❌ Error getting pages: {e}")
+            self.failed_requests += 1
+            self.incomplete_listings.add(f"pages_watermark:{self.workspace}")
             return []
-    
-    async def get_database_content(self, database_id: str) -> List[Dict]:
-        """Get content from a specific database"""
+
+    async def get_database_content(self, database_id: str, since: Optional[str] = None) -> List[Dict]:
+        """Get entries from a specific database, oldest edits first, optionally only those edited since a watermark"""
+        query = {"sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}]}
+        if since:
+            query["filter"] = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": since}}
+
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/databases/{database_id}/query",
-                    headers=self.headers,
-                    json={}
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("results", [])
-                    else:
-                        print(f"❌ Failed to get database content: {response.status}")
-                        return []
+            return await self.paginate("POST", f"/databases/{database_id}/query", query)
         except Exception as e:
             print(f"❌ Error getting database content: {e}")
+            self.failed_requests += 1
+            self.incomplete_listings.add(f"database_watermark:{database_id}")
             return []
-    
-    async def get_page_content(self, page_id: str) -> Dict:
-        """Get content from a specific page"""
+
+    async def get_block_tree(self, block_id: str) -> Tuple[List[Dict], bool]:
+        """Fetch the blocks under a page, expanding children breadth-first one level per round.
+
+        All blocks with children at the same depth are expanded in parallel
+        (bounded by the client's semaphore and rate limit), so a deep page
+        costs one round per level rather than one call per block in series.
+        At most NOTION_MAX_BLOCKS_PER_PAGE blocks are kept: each round only
+        expands as many parents as there is room left for (every parent has
+        at least one child), and children past the limit are dropped.
+        Returns the blocks and whether the tree was truncated.
+        """
+        blocks = await self.paginate("GET", f"/blocks/{block_id}/children")
+        truncated = len(blocks) > NOTION_MAX_BLOCKS_PER_PAGE
+        blocks = blocks[:NOTION_MAX_BLOCKS_PER_PAGE]
+        block_count = len(blocks)
+        frontier = [block for block in blocks if expandable(block)]
+
+        while frontier:
+            room = NOTION_MAX_BLOCKS_PER_PAGE - block_count
+            if len(frontier) > room:
+                print(f"⚠️  Block limit reached for {block_id}, {len(frontier) - max(room, 0)} nested blocks not expanded")
+                truncated = True
+                frontier = frontier[:max(room, 0)]
+            if not frontier:
+                break
+
+            children_lists = await asyncio.gather(*[
+                self.paginate("GET", f"/blocks/{block['id']}/children")
+                for block in frontier
+            ])
+
+            next_frontier = []
+            for parent, children in zip(frontier, children_lists):
+                room = NOTION_MAX_BLOCKS_PER_PAGE - block_count
+                if len(children) > room:
+                    truncated = True
+                    children = children[:room]
+                parent["children"] = children
+                block_count += len(children)
+                next_frontier.extend(child for child in children if expandable(child))
+            frontier = next_frontier
+
+        return blocks, truncated
+
+    async def get_page_content(self, page_id: str, page: Dict = None) -> Dict:
+        """Get a page and its full block tree; pass the page object from search to skip re-fetching it"""
         try:
-            async with aiohttp.ClientSession() as session:
-                # Get page properties
-                async with session.get(
-                    f"{self.base_url}/pages/{page_id}",
-                    headers=self.headers
-                ) as response:
-                    if response.status != 200:
-                        return {}
-                    
-                    page_data = await response.json()
-                
-                # Get page blocks (content)
-                async with session.get(
-                    f"{self.base_url}/blocks/{page_id}/children",
-                    headers=self.headers
-                ) as response:
-                    if response.status == 200:
-                        blocks_data = await response.json()
-                        page_data["blocks"] = blocks_data.get("results", [])
-                    
-                    return page_data
+            page_data = dict(page) if page else await self.request("GET", f"/pages/{page_id}")
+            if not page_data:
+                return {}
+
+            page_data["blocks"], page_data["blocks_truncated"] = await self.get_block_tree(page_id)
+            return page_data
         except Exception as e:
             print(f"❌ Error getting page content: {e}")
             return {}
-    
+
     def extract_text_from_page(self, page_data: Dict) -> str:
         """Extract readable text from a Notion page"""
         text_parts = []
-        
+
         # Extract title
         if "properties" in page_data:
             for prop_name, prop_data in page_data["properties"].items():
                 if prop_data.get("type") == "title" and prop_data.get("title"):
-                    title_text = " ".join([t.get("plain_text", "") for t in prop_data["title"]])
+                    title_text = plain_text(prop_data["title"])
                     text_parts.append(f"Title: {title_text}")
-        
-        # Extract blocks content
-        if "blocks" in page_data:
-            for block in page_data["blocks"]:
-                block_type = block.get("type", "")
-                
-                if block_type == "paragraph" and block.get("paragraph", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["paragraph"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(text)
-                
-                elif block_type == "heading_1" and block.get("heading_1", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["heading_1"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(f"# {text}")
-                
-                elif block_type == "heading_2" and block.get("heading_2", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["heading_2"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(f"## {text}")
-                
-                elif block_type == "heading_3" and block.get("heading_3", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["heading_3"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(f"### {text}")
-                
-                elif block_type == "bulleted_list_item" and block.get("bulleted_list_item", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["bulleted_list_item"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(f"• {text}")
-                
-                elif block_type == "numbered_list_item" and block.get("numbered_list_item", {}).get("rich_text"):
-                    text = " ".join([t.get("plain_text", "") for t in block["numbered_list_item"]["rich_text"]])
-                    if text.strip():
-                        text_parts.append(f"1. {text}")
-        
+
+        # Extract blocks content, nested blocks indented under their parent
+        text_parts.extend(extract_blocks(page_data.get("blocks", [])))
+
         return "\n".join(text_parts)
 
-async def sync_notion_to_pinecone():
-    """Sync Notion content to Pinecone"""
-    if not all([NOTION_API_KEY, openai_client, idx]):
-        print("⚠️  Notion sync skipped - missing configuration")
+def plain_text(rich_text: List[Dict]) -> str:
+    return "".join(t.get("plain_text", "") for t in rich_text or [])
+
+def property_value(prop: Dict) -> tuple:
+    """(text, number, date_start, date_end) for a Notion property value"""
+    prop_type = prop.get("type")
+    value = prop.get(prop_type)
+
+    if prop_type in ("formula", "rollup") and isinstance(value, dict):
+        # Computed values carry their own inner type
+        inner_type = value.get("type")
+        if inner_type == "array":
+            return (", ".join(str(item.get(item.get("type"), "")) for item in value.get("array") or []), None, None, None)
+        return property_value({"type": inner_type, inner_type: value.get(inner_type)})
+
+    if value is None:
+        return (None, None, None, None)
+    if prop_type in ("title", "rich_text"):
+        return (plain_text(value), None, None, None)
+    if prop_type == "number":
+        return (None, value, None, None)
+    if prop_type == "string":
+        return (value, None, None, None)
+    if prop_type in ("select", "status"):
+        return (value.get("name"), None, None, None)
+    if prop_type == "multi_select":
+        return (", ".join(option.get("name", "") for option in value), None, None, None)
+    if prop_type == "date":
+        return (None, None, value.get("start"), value.get("end"))
+    if prop_type in ("created_time", "last_edited_time"):
+        return (None, None, value, None)
+    if prop_type in ("checkbox", "boolean"):
+        return ("true" if value else "false", 1 if value else 0, None, None)
+    if prop_type in ("url", "email", "phone_number"):
+        return (value, None, None, None)
+    if prop_type == "people":
+        return (", ".join(person.get("name", "") for person in value), None, None, None)
+    if prop_type == "relation":
+        return (", ".join(related.get("id", "") for related in value), len(value), None, None)
+    if prop_type == "unique_id":
+        prefix = f"{value['prefix']}-" if value.get("prefix") else ""
+        return (f"{prefix}{value.get('number')}", value.get("number"), None, None)
+    return (None, None, None, None)
+
+def mirror_row(entry: Dict) -> Dict[str, Any]:
+    """A database entry in the shape the local mirror stores"""
+    properties = []
+    title = ""
+    for name, prop in entry.get("properties", {}).items():
+        values = property_value(prop)
+        if prop.get("type") == "title":
+            title = values[0] or ""
+        properties.append((name, prop.get("type", ""), *values))
+
+    return {
+        "page_id": entry["id"],
+        "title": title,
+        "url": entry.get("url"),
+        "created_time": entry.get("created_time"),
+        "last_edited_time": entry.get("last_edited_time"),
+        "properties": properties
+    }
+
+def expandable(block: Dict) -> bool:
+    # Child pages and databases are synced as pages of their own
+    return block.get("has_children", False) and block.get("type") not in ("child_page", "child_database")
+
+def prefixed(prefix: str, rich_text: List[Dict]) -> str:
+    text = plain_text(rich_text)
+    return f"{prefix}{text}" if text.strip() else ""
+
+def code_block(block: Dict) -> str:
+    text = plain_text(block.get("rich_text"))
+    return f"```{block.get('language', '')}\n{text}\n```" if text.strip() else ""
+
+# How each block type renders to text; types not listed are skipped but their children are still read
+BLOCK_EXTRACTORS = {
+    "paragraph": lambda b: prefixed("", b.get("rich_text")),
+    "heading_1": lambda b: prefixed("# ", b.get("rich_text")),
+    "heading_2": lambda b: prefixed("## ", b.get("rich_text")),
+    "heading_3": lambda b: prefixed("### ", b.get("rich_text")),
+    "bulleted_list_item": lambda b: prefixed("• ", b.get("rich_text")),
+    "numbered_list_item": lambda b: prefixed("1. ", b.get("rich_text")),
+    "to_do": lambda b: prefixed("[x] " if b.get("checked") else "[ ] ", b.get("rich_text")),
+    "toggle": lambda b: prefixed("▸ ", b.get("rich_text")),
+    "quote": lambda b: prefixed("> ", b.get("rich_text")),
+    "callout": lambda b: prefixed(f"{(b.get('icon') or {}).get('emoji', '💡')} ", b.get("rich_text")),
+    "code": code_block,
+    "table_row": lambda b: " | ".join(plain_text(cell) for cell in b.get("cells", [])),
+    "child_page": lambda b: f"Subpage: {b.get('title', '')}",
+    "child_database": lambda b: f"Database: {b.get('title', '')}",
+    "bookmark": lambda b: b.get("url", ""),
+    "equation": lambda b: b.get("expression", "")
+}
+
+def extract_blocks(blocks: List[Dict], depth: int = 0) -> List[str]:
+    """Render a block tree to lines of text in document order"""
+    lines = []
+    for block in blocks:
+        block_type = block.get("type", "")
+        extractor = BLOCK_EXTRACTORS.get(block_type)
+        if extractor:
+            text = extractor(block.get(block_type, {}))
+            if text.strip(" |"):
+                lines.append("  " * depth + text)
+
+        if block.get("children"):
+            lines.extend(extract_blocks(block["children"], depth + 1))
+    return lines
+
+def text_hash(text: str) -> str:
+    """Stable fingerprint of a page's extracted text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_text(text: str, max_tokens: int = NOTION_CHUNK_TOKENS,
+               overlap_tokens: int = NOTION_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split page text into chunks of about max_tokens (four characters per token).
+
+    Chunks break on line boundaries so blocks stay whole, lines longer than a
+    chunk are split on spaces, and each chunk repeats the last few lines of
+    the previous one so text spanning a boundary is still retrievable.
+    """
+    max_chars = max_tokens * 4
+    overlap_chars = overlap_tokens * 4
+
+    lines = []
+    for line in text.split("\n"):
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            lines.append(line[:cut])
+            line = line[cut:].lstrip()
+        lines.append(line)
+
+    chunks = []
+    current, size = [], 0
+    for line in lines:
+        if current and size + len(line) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            overlap, overlap_size = [], 0
+            for previous in reversed(current):
+                if overlap_size + len(previous) + 1 > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += len(previous) + 1
+            current, size = overlap, overlap_size
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def chunk_ids(vector_prefix: str, page_id: str, start: int, stop: int) -> List[str]:
+    return [f"{vector_prefix}{page_id}_{n}" for n in range(start, stop)]
+
+async def embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
+    """Embed texts in multi-input batches, all batches in flight at once under the LLM scheduler.
+
+    Returns one embedding per text, None for texts whose batch failed.
+    """
+    async def embed_batch(batch: List[str]) -> List[Optional[List[float]]]:
+        try:
+            response = await llm_scheduler.run(
+                openai_client.embeddings.create,
+                priority=BATCH,
+                est_tokens=sum(len(text) for text in batch) // 4,
+                model="text-embedding-3-small",
+                input=batch
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            print(f"❌ Error embedding batch of {len(batch)} chunks: {e}")
+            return [None] * len(batch)
+
+    batches = [texts[i:i + NOTION_EMBED_BATCH_SIZE] for i in range(0, len(texts), NOTION_EMBED_BATCH_SIZE)]
+    results = await asyncio.gather(*[embed_batch(batch) for batch in batches])
+    return [embedding for batch in results for embedding in batch]
+
+async def run_index_batches(operation, items: List, batch_size: int):
+    """Run a Pinecone write over items in batches, several requests in flight at once"""
+    semaphore = asyncio.Semaphore(PINECONE_WRITE_CONCURRENCY)
+
+    async def run_batch(batch: List):
+        async with semaphore:
+            await asyncio.to_thread(operation, batch)
+
+    await asyncio.gather(*[run_batch(items[i:i + batch_size]) for i in range(0, len(items), batch_size)])
+
+async def upsert_vectors(vectors: List):
+    await run_index_batches(lambda batch: idx.upsert(vectors=batch, namespace="notion"), vectors, 100)
+
+async def delete_vectors(vector_ids: List[str]):
+    await run_index_batches(lambda batch: idx.delete(ids=batch, namespace="notion"), vector_ids, 1000)
+
+async def sync_page(notion: NotionSync, page: Dict, kind: str, metadata: Dict, database_id: str = None):
+    """Return the page's new chunks if its text changed, None if not, False if it failed"""
+    page_id = page["id"]
+    last_edited = page.get("last_edited_time", "")
+    ledger = notion_store.get_page(page_id)
+
+    # Unchanged since the last run, no need to fetch it at all
+    if ledger and ledger["last_edited_time"] == last_edited:
+        return None
+
+    page_content = await notion.get_page_content(page_id, page=page)
+    if not page_content:
+        return False
+
+    text = notion.extract_text_from_page(page_content) or ""
+
+    fingerprint = text_hash(text)
+    if ledger and ledger["text_hash"] == fingerprint:
+        # Edited (properties, comments, ...) but the indexed text is identical
+        notion_store.touch_page(page_id, last_edited)
+        return None
+
+    # Pages without substantial content have no chunks; any they had before are removed below
+    chunks = chunk_text(text) if len(text.strip()) > 10 else []
+    vector_prefix = VECTOR_PREFIXES[kind]
+    previous_count = ledger["vector_count"] if ledger else 0
+    synced_at = datetime.now().isoformat()
+
+    return {
+        "chunks": chunks,
+        "vector_ids": chunk_ids(vector_prefix, page_id, 0, len(chunks)),
+        "metadata": [
+            {
+                **metadata,
+                "text": chunk,
+                "type": kind,
+                "page_id": page_id,
+                "chunk": n,
+                "chunk_count": len(chunks),
+                "workspace": notion.workspace,
+                # Only the first NOTION_MAX_BLOCKS_PER_PAGE blocks of the page were indexed
+                "truncated": bool(page_content.get("blocks_truncated")),
+                "synced_at": synced_at
+            }
+            for n, chunk in enumerate(chunks)
+        ],
+        # The page shrank, its trailing chunks from last time are no longer valid
+        "stale_ids": chunk_ids(vector_prefix, page_id, len(chunks), previous_count),
+        "ledger": (page_id, kind, last_edited, fingerprint, len(chunks), database_id, notion.workspace)
+    }
+
+async def sync_group(notion: NotionSync, items: List[Dict], since: Optional[str], kind: str,
+                     metadata_for, database_id: str = None):
+    """Sync a set of pages concurrently; returns (vectors, stale ids, ledger entries, new watermark)"""
+    items = sorted(items, key=lambda item: item.get("last_edited_time", ""))
+    results = await asyncio.gather(*[
+        sync_page(notion, item, kind, metadata_for(item), database_id=database_id)
+        for item in items
+    ])
+
+    # Embed every changed chunk of the group together
+    updates = [result for result in results if result]
+    embeddings = await embed_texts([chunk for update in updates for chunk in update["chunks"]])
+
+    vectors = []
+    stale_ids = []
+    ledger_entries = []
+    watermark = since
+    failed = False
+    position = 0
+    notion.stats["pages_scanned"] += len(items)
+    for item, result in zip(items, results):
+        if result:
+            page_embeddings = embeddings[position:position + len(result["chunks"])]
+            position += len(result["chunks"])
+            if any(embedding is None for embedding in page_embeddings):
+                result = False
+            else:
+                vectors.extend(zip(result["vector_ids"], page_embeddings, result["metadata"]))
+                stale_ids.extend(result["stale_ids"])
+                ledger_entries.append(result["ledger"])
+        if result is False:
+            notion.stats["page_errors"] += 1
+        # A failed page holds the watermark back so the next run retries it
+        failed = failed or result is False
+        if not failed:
+            watermark = item.get("last_edited_time", watermark)
+
+    return vectors, stale_ids, ledger_entries, watermark
+
+def edited_since(items: List[Dict], since: Optional[str]) -> List[Dict]:
+    return [item for item in items if item.get("last_edited_time", "") >= since] if since else items
+
+async def sync_database(notion: NotionSync, database: Dict, seen: Optional[set] = None):
+    """Sync the entries of one database edited since its own watermark.
+
+    With a seen set (during reconciliation) every entry is listed and its ID
+    added to the set, and only the edited ones are synced.
+    """
+    db_id = database["id"]
+    watermark_key = f"database_watermark:{db_id}"
+    db_since = notion_store.get_state(watermark_key)
+    # A database not mirrored yet is listed in full once to backfill the mirror
+    if seen is None and notion_store.is_mirrored(db_id):
+        listed = db_entries = await notion.get_database_content(db_id, since=db_since)
+    else:
+        listed = await notion.get_database_content(db_id)
+        if seen is not None:
+            seen.add(db_id)
+            seen.update(entry["id"] for entry in listed)
+        db_entries = edited_since(listed, db_since)
+    db_title = plain_text(database.get("title")) or "Unknown"
+
+    # Properties (status, dates, ...) change without the text changing, so every listed row is mirrored
+    notion_store.mirror_rows(db_id, notion.workspace, db_title, [mirror_row(entry) for entry in listed])
+
+    vectors, stale_ids, ledger_entries, watermark = await sync_group(
+        notion, db_entries, db_since, "notion_database_entry",
+        lambda _entry: {"source": f"Notion DB Entry: {db_title}", "database_id": db_id},
+        database_id=db_id
+    )
+    return vectors, stale_ids, ledger_entries, {watermark_key: watermark}
+
+async def migrate_vector_ids():
+    """Rewrite vectors stored before the current chunked, workspace-tagged format.
+
+    Pages were first stored as one unsuffixed vector each, then as chunks
+    without a workspace tag. Both forms known to the ledger are deleted and
+    the ledger is cleared once, which re-embeds every page in the current
+    format on this run. Unsuffixed vectors written before there was a
+    ledger are removed by remove_baseline_vectors during the crawl.
+    """
+    if notion_store.get_state("vector_id_scheme") == VECTOR_ID_SCHEME:
         return
-    
-    print("🔄 Starting Notion sync...")
-    
-    notion = NotionSync()
-    
+
+    legacy_ids = []
+    for page in notion_store.list_pages():
+        prefix = VECTOR_PREFIXES[page["kind"]]
+        legacy_ids.append(f"{prefix}{page['page_id']}")
+        legacy_ids.extend(chunk_ids(prefix, page["page_id"], 0, page["vector_count"]))
+    if legacy_ids:
+        print(f"🧹 Replacing {len(legacy_ids)} Notion vectors stored in an older format")
+        await delete_vectors(legacy_ids)
+    notion_store.clear_pages()
+    notion_store.clear_watermarks()
+    notion_store.set_state("vector_id_scheme", VECTOR_ID_SCHEME)
+
+async def remove_baseline_vectors(workspace: str, seen: set) -> int:
+    """Delete the single unsuffixed vector the original sync stored per page or database entry.
+
+    That sync kept no ledger, so the only record of those IDs is the crawl
+    itself: both ID forms are deleted for every crawled ID (deleting an ID
+    that does not exist is a no-op).
+    """
+    legacy_ids = [f"{prefix}{item_id}" for item_id in seen for prefix in VECTOR_PREFIXES.values()]
+    if legacy_ids:
+        print(f"🧹 [{workspace}] Removing vectors stored by the original, unchunked Notion sync")
+        await delete_vectors(legacy_ids)
+    return len(legacy_ids)
+
+def reconcile_due(workspace: str) -> bool:
+    last_reconciled = notion_store.get_state(f"last_reconciled_at:{workspace}")
+    if not last_reconciled:
+        return True
+    return datetime.now() - datetime.fromisoformat(last_reconciled) >= timedelta(hours=NOTION_RECONCILE_INTERVAL_HOURS)
+
+async def remove_stale_pages(workspace: str, seen: set) -> int:
+    """Delete the vectors and ledger rows of pages no longer visible to the workspace's integration;
+    returns the number of vectors deleted.
+
+    Works purely on IDs: the crawl's page IDs are diffed against the
+    workspace's ledger rows, and each stale page's chunk IDs are rebuilt from
+    its recorded vector count.
+    """
+    stale_pages = [page for page in notion_store.list_pages(workspace) if page["page_id"] not in seen]
+    if not stale_pages:
+        return 0
+
+    stale_ids = []
+    for page in stale_pages:
+        stale_ids.extend(chunk_ids(VECTOR_PREFIXES[page["kind"]], page["page_id"], 0, page["vector_count"]))
+
+    print(f"🧹 Removing {len(stale_pages)} deleted, archived or unshared pages from {workspace} ({len(stale_ids)} vectors)")
+    await delete_vectors(stale_ids)
+    notion_store.delete_pages([page["page_id"] for page in stale_pages])
+    return len(stale_ids)
+
+class PhaseTimer:
+    """Accumulates wall-clock seconds per named phase of a sync run"""
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self.started = time.monotonic()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0) + time.monotonic() - started
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+async def sync_workspace(workspace: str, token: str, reconcile: bool = False) -> int:
+    """Sync one workspace's pages edited since its last run; returns the number of pages synced.
+
+    With reconcile (or once NOTION_RECONCILE_INTERVAL_HOURS have passed) the
+    crawl lists every page and database entry instead of only edited ones,
+    and pages missing from it are removed from the index. Every run is
+    recorded in the sync history with its counters and phase timings.
+    """
+    notion = NotionSync(workspace, token)
+    # Until the original sync's vectors are gone, every run crawls in full to find their IDs
+    baseline_cleanup = not notion_store.get_state(f"baseline_vectors_removed:{workspace}")
+    reconcile = reconcile or reconcile_due(workspace) or baseline_cleanup
+    run_id = notion_store.start_run(workspace, reconcile)
+    timer = PhaseTimer()
+    stats = {"pages_changed": 0, "chunks_embedded": 0, "vectors_deleted": 0}
+    status = "failed"
+    error = None
+
     try:
-        # Get all pages
-        pages = await notion.get_pages()
-        print(f"📄 Found {len(pages)} pages")
-        
-        # Get all databases
-        databases = await notion.get_databases()
-        print(f"🗃️  Found {len(databases)} databases")
-        
+        seen = set() if reconcile else None
+
+        # Crawl every page edited since the last watermark and every database, in parallel
+        watermark_key = f"pages_watermark:{workspace}"
+        pages_since = notion_store.get_state(watermark_key)
+        with timer.phase("crawl"):
+            pages, databases = await asyncio.gather(
+                notion.get_pages(since=None if reconcile else pages_since),
+                notion.get_databases()
+            )
+        if reconcile:
+            seen.update(page["id"] for page in pages)
+            pages = edited_since(pages, pages_since)
+        # Database rows also come back from search; they are synced with their database
+        pages = [page for page in pages if page.get("parent", {}).get("type") != "database_id"]
+        print(f"📄 [{workspace}] Found {len(pages)} pages edited since {pages_since or 'the beginning'}")
+        print(f"🗃️  [{workspace}] Found {len(databases)} databases")
+
+        # Listing database entries, fetching changed pages and embedding them overlap
+        with timer.phase("fetch_and_embed"):
+            page_sync = sync_group(
+                notion, pages, pages_since, "notion_page",
+                lambda page: {"source": f"Notion Page: {page.get('url', page['id'])}"}
+            )
+            results = await asyncio.gather(page_sync, *[sync_database(notion, database, seen) for database in databases])
+
         vectors_to_upsert = []
-        
-        # Process pages
-        for page in pages[:10]:  # Limit to 10 pages for now
-            page_id = page["id"]
-            page_content = await notion.get_page_content(page_id)
-            
-            if page_content:
-                text = notion.extract_text_from_page(page_content)
-                
-                if text and len(text.strip()) > 10:  # Only process pages with substantial content
-                    try:
-                        # Generate embedding
-                        embedding_response = openai_client.embeddings.create(
-                            model="text-embedding-3-small",
-                            input=text[:8000]  # Limit text length
-                        )
-                        
-                        embedding = embedding_response.data[0].embedding
-                        
-                        # Prepare metadata
-                        metadata = {
-                            "source": f"Notion Page: {page.get('url', page_id)}",
-                            "text": text[:1000],  # Store first 1000 chars in metadata
-                            "type": "notion_page",
-                            "page_id": page_id,
-                            "synced_at": datetime.now().isoformat()
-                        }
-                        
-                        vectors_to_upsert.append((f"notion_page_{page_id}", embedding, metadata))
-                        
-                    except Exception as e:
-                        print(f"❌ Error processing page {page_id}: {e}")
-        
-        # Process database entries
-        for database in databases[:5]:  # Limit to 5 databases
-            db_id = database["id"]
-            db_entries = await notion.get_database_content(db_id)
-            
-            for entry in db_entries[:20]:  # Limit entries per database
-                entry_content = await notion.get_page_content(entry["id"])
-                
-                if entry_content:
-                    text = notion.extract_text_from_page(entry_content)
-                    
-                    if text and len(text.strip()) > 10:
-                        try:
-                            # Generate embedding
-                            embedding_response = openai_client.embeddings.create(
-                                model="text-embedding-3-small",
-                                input=text[:8000]
-                            )
-                            
-                            embedding = embedding_response.data[0].embedding
-                            
-                            # Prepare metadata
-                            metadata = {
-                                "source": f"Notion DB Entry: {database.get('title', [{}])[0].get('plain_text', 'Unknown')}",
-                                "text": text[:1000],
-                                "type": "notion_database_entry",
-                                "page_id": entry["id"],
-                                "database_id": db_id,
-                                "synced_at": datetime.now().isoformat()
-                            }
-                            
-                            vectors_to_upsert.append((f"notion_db_{entry['id']}", embedding, metadata))
-                            
-                        except Exception as e:
-                            print(f"❌ Error processing database entry {entry['id']}: {e}")
-        
+        stale_ids = []
+        ledger_entries = []
+        watermarks = {watermark_key: results[0][3]}
+        for vectors, stale, entries, *rest in results:
+            vectors_to_upsert.extend(vectors)
+            stale_ids.extend(stale)
+            ledger_entries.extend(entries)
+        for *_, database_watermarks in results[1:]:
+            watermarks.update(database_watermarks)
+        stats["pages_changed"] = len(ledger_entries)
+        stats["chunks_embedded"] = len(vectors_to_upsert)
+
         # Upsert vectors to Pinecone
         if vectors_to_upsert:
-            print(f"📤 Upserting {len(vectors_to_upsert)} vectors to Pinecone...")
-            
-            # Batch upsert (Pinecone supports up to 100 vectors per batch)
-            batch_size = 50
-            for i in range(0, len(vectors_to_upsert), batch_size):
-                batch = vectors_to_upsert[i:i + batch_size]
-                idx.upsert(vectors=batch, namespace="notion")
-            
-            print(f"✅ Notion sync completed - {len(vectors_to_upsert)} items synced")
-        else:
-            print("⚠️  No content to sync")
-    
+            print(f"📤 [{workspace}] Upserting {len(vectors_to_upsert)} chunks from {len(ledger_entries)} pages to Pinecone...")
+            with timer.phase("upsert"):
+                await upsert_vectors(vectors_to_upsert)
+
+        # Chunks left over from pages that got shorter
+        if stale_ids:
+            with timer.phase("delete"):
+                await delete_vectors(stale_ids)
+            stats["vectors_deleted"] += len(stale_ids)
+
+        # Only record progress once the vectors are safely stored. A partial listing may have
+        # missed edited items, so its watermark stays put and the next run lists them again.
+        with timer.phase("ledger"):
+            for entry in ledger_entries:
+                notion_store.record_page(*entry)
+            for key, value in watermarks.items():
+                if value and key not in notion.incomplete_listings:
+                    notion_store.set_state(key, value)
+        if notion.incomplete_listings:
+            print(f"⚠️  [{workspace}] Keeping {len(notion.incomplete_listings)} watermarks, their listings were incomplete")
+
+        if baseline_cleanup:
+            with timer.phase("delete"):
+                await remove_baseline_vectors(workspace, seen)
+            # Items a partial crawl missed still have theirs, so try again next run
+            if not notion.incomplete_listings:
+                notion_store.set_state(f"baseline_vectors_removed:{workspace}", datetime.now().isoformat())
+
+        if reconcile:
+            # A partial crawl would make live pages look deleted
+            if notion.failed_requests or notion.incomplete_listings:
+                print(f"⚠️  [{workspace}] Skipping reconciliation, {notion.failed_requests} requests failed during the crawl")
+            else:
+                with timer.phase("reconcile"):
+                    stats["vectors_deleted"] += await remove_stale_pages(workspace, seen)
+                    notion_store.prune_mirror(workspace, seen)
+                notion_store.set_state(f"last_reconciled_at:{workspace}", datetime.now().isoformat())
+
+        print(f"✅ [{workspace}] {len(ledger_entries)} items synced with {notion.api_calls} API calls")
+        status = "succeeded"
+        return len(ledger_entries)
+
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        notion_store.finish_run(run_id, status, timer.elapsed(), {
+            **stats,
+            "pages_scanned": notion.stats["pages_scanned"],
+            "vectors_total": notion_store.vector_totals().get(workspace, {}).get("vectors", 0),
+            "api_calls": notion.api_calls,
+            "errors": notion.stats["page_errors"] + notion.failed_requests
+        }, timer.durations, error)
+
+async def sync_notion_to_pinecone(reconcile: bool = False):
+    """Sync every configured workspace to Pinecone, all workspaces crawled concurrently"""
+    workspaces = load_workspaces()
+    if not all([workspaces, openai_client, idx]):
+        print("⚠️  Notion sync skipped - missing configuration")
+        return
+
+    print(f"🔄 Starting Notion sync for {', '.join(workspaces)}...")
+    started = time.monotonic()
+
+    try:
+        await migrate_vector_ids()
+
+        # Each workspace has its own token and so its own rate limit
+        results = await asyncio.gather(*[
+            sync_workspace(name, settings["token"], reconcile=reconcile)
+            for name, settings in workspaces.items()
+        ], return_exceptions=True)
+
+        synced = 0
+        for name, result in zip(workspaces, results):
+            if isinstance(result, Exception):
+                print(f"❌ Notion sync failed for {name}: {result}")
+            else:
+                synced += result
+
+        print(f"✅ Notion sync completed - {synced} items synced")
+        print(f"⏱️  Notion sync took {time.monotonic() - started:.1f}s")
+
     except Exception as e:
         print(f"❌ Notion sync failed: {e}")
 
-async def full_sync():
-    """Run a full Notion sync"""
-    await sync_notion_to_pinecone()
+async def full_sync(rescan: bool = False):
+    """Run a Notion sync; rescan ignores the watermarks and reconciles, unchanged text is still not re-embedded"""
+    if rescan:
+        notion_store.clear_watermarks()
+    await sync_notion_to_pinecone(reconcile=rescan)
 
-async def scheduler():
-    """Background scheduler for Notion sync"""
+def start_scheduler(worker):
+    """Schedule incremental syncs on the sync worker: first after 30 seconds, then every 6 hours"""
+    worker.every("notion", sync_notion_to_pinecone, interval_s=6 * 60 * 60, first_delay_s=30)
     print("🔄 Notion sync scheduler started")
-    
-    # Run initial sync after 30 seconds
-    await asyncio.sleep(30)
-    await sync_notion_to_pinecone()
-    
-    # Then sync every 6 hours
-    while True:
-        await asyncio.sleep(6 * 60 * 60)  # 6 hours
-        await sync_notion_to_pinecone()
+
+async def run_once():
+    try:
+        await full_sync()
+    finally:
+        await http_client.close()
 
 if __name__ == "__main__":
     # For testing
-    asyncio.run(full_sync())
+    asyncio.run(run_once())
@@ -0,0 +1,46 @@
+
+import json
+import os
+from typing import Any, Dict
+
+DEFAULT_WORKSPACE = "default"
+
+def load_workspaces() -> Dict[str, Dict[str, Any]]:
+    """Notion workspaces to sync, as {name: {"token": ..., "weight": ...}}.
+
+    NOTION_WORKSPACES holds JSON such as
+    {"studio": {"token": "secret_..."}, "personal": {"token": "secret_...", "weight": 0.8}}.
+    weight (default 1.0) scales that workspace's retrieval scores. Without
+    it, NOTION_API_KEY is used as a single workspace named "default".
+    """
+    raw = os.environ.get("NOTION_WORKSPACES", "").strip()
+    if raw:
+        try:
+            configured = json.loads(raw)
+        except json.JSONDecodeError as e:
+            print(f"⚠️  NOTION_WORKSPACES is not valid JSON, ignoring it: {e}")
+            configured = {}
+        if not isinstance(configured, dict):
+            print("⚠️  NOTION_WORKSPACES must be a JSON object of workspaces, ignoring it")
+            configured = {}
+
+        workspaces = {}
+        for name, settings in configured.items():
+            if isinstance(settings, str):
+                settings = {"token": settings}
+            if not isinstance(settings, dict) or not settings.get("token"):
+                print(f"⚠️  Notion workspace '{name}' has no token, skipping it")
+                continue
+            try:
+                weight = float(settings.get("weight", 1.0))
+            except (TypeError, ValueError):
+                print(f"⚠️  Notion workspace '{name}' has a non-numeric weight, skipping it")
+                continue
+            workspaces[name] = {"token": settings["token"], "weight": weight}
+        if workspaces:
+            return workspaces
+
+    api_key = os.environ.get("NOTION_API_KEY")
+    if api_key:
+        return {DEFAULT_WORKSPACE: {"token": api_key, "weight": 1.0}}
+    return {}
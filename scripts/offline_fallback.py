@@ -2,7 +2,7 @@
 import json
 import os
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import re
 
@@ -77,21 +77,21 @@ class OfflineFallbackSystem:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Check if similar question exists
+        # Check if the same question exists
         cursor.execute('''
             SELECT id, usage_count FROM cached_responses 
-            WHERE question = ? OR LOWER(question) LIKE LOWER(?)
-        ''', (question, f"%{question[:20]}%"))
+            WHERE LOWER(question) = LOWER(?)
+        ''', (question,))
         
         existing = cursor.fetchone()
         
         if existing:
-            # Update usage count
+            # Refresh the answer so hedged responses are never staler than the last live one
             cursor.execute('''
                 UPDATE cached_responses 
-                SET usage_count = usage_count + 1, timestamp = ?
+                SET answer = ?, usage_count = usage_count + 1, timestamp = ?
                 WHERE id = ?
-            ''', (datetime.now().isoformat(), existing[0]))
+            ''', (answer, datetime.now().isoformat(), existing[0]))
         else:
             # Insert new response
             cursor.execute('''
@@ -141,6 +141,30 @@ class OfflineFallbackSystem:
         conn.close()
         return None
     
+    def get_exact_response(self, question: str, max_age_s: float) -> Optional[str]:
+        """Cached answer to this same question, if it was answered live within max_age_s.
+
+        Unlike get_cached_response there is no keyword fallback: the answer
+        is served in place of a live one, so it has to be for the question asked.
+        Case, surrounding whitespace and trailing punctuation are ignored.
+        """
+        normalized = question.strip().rstrip('?!. ').lower()
+        if not normalized:
+            return None
+        cutoff = (datetime.now() - timedelta(seconds=max_age_s)).isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT answer FROM cached_responses
+            WHERE LOWER(RTRIM(TRIM(question), '?!. ')) = ? AND timestamp >= ?
+            ORDER BY timestamp DESC
+            LIMIT 1
+        ''', (normalized, cutoff))
+        result = cursor.fetchone()
+        conn.close()
+        return result[0] if result else None
+    
     def extract_keywords(self, text: str) -> List[str]:
         """Extract key words from question"""
         # Remove common words
@@ -0,0 +1,66 @@
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROMPTS_DIR = Path("prompts")
+PERSONA_VERSION = os.getenv("ATLAS_PERSONA_VERSION", "v1")
+
+class PromptBuilder:
+    """Assembles chat messages with a byte-identical persona prefix.
+
+    The persona is read once from prompts/atlas_persona.<version>.txt and
+    always sent as the first message, so every request shares the same
+    prefix and the provider's automatic prompt caching can reuse it.
+    Everything that changes per request (retrieved context, then the
+    question) is appended after it in a fixed order.
+    """
+
+    def __init__(self, version: str = PERSONA_VERSION):
+        self.version = version
+        self.persona_path = PROMPTS_DIR / f"atlas_persona.{version}.txt"
+        self.persona = self.persona_path.read_text(encoding="utf-8").rstrip("\n")
+        self.persona_hash = hashlib.sha256(self.persona.encode("utf-8")).hexdigest()[:12]
+        self.stats = {
+            "requests": 0,
+            "requests_with_cache_hit": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0
+        }
+
+    def build_messages(self, question: str, context: str = "") -> List[Dict[str, str]]:
+        """Static persona first, then the volatile context, then the question"""
+        messages = [{"role": "system", "content": self.persona}]
+        if context:
+            messages.append({"role": "system", "content": f"Context:\n{context}"})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def record_usage(self, usage: Any):
+        """Record prompt-cache usage from an OpenAI usage object"""
+        if usage is None:
+            return
+
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+        self.stats["cached_tokens"] += cached_tokens
+        if cached_tokens:
+            self.stats["requests_with_cache_hit"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        prompt_tokens = self.stats["prompt_tokens"]
+        return {
+            "persona_version": self.version,
+            "persona_hash": self.persona_hash,
+            **self.stats,
+            "cache_hit_rate": round(self.stats["requests_with_cache_hit"] / requests, 3) if requests else 0,
+            "cached_token_ratio": round(self.stats["cached_tokens"] / prompt_tokens, 3) if prompt_tokens else 0
+        }
+
+# Global instance
+prompt_builder = PromptBuilder()
@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Async token bucket that spaces out requests to stay under an API's rate limit"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so nothing is sent for the given number of seconds (e.g. after a 429)"""
+        self.tokens = min(self.tokens, -seconds * self.rate)
+        self.updated_at = time.monotonic()
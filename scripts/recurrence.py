@@ -0,0 +1,95 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+try:
+    from dateutil.rrule import rrulestr
+except ImportError:
+    rrulestr = None
+
+UNTIL_PATTERN = re.compile(r"UNTIL=(\d{8})(T\d{6})?(Z)?")
+
+def available() -> bool:
+    """Whether recurring events can be expanded locally (needs python-dateutil)"""
+    return rrulestr is not None
+
+def series_start(series: Dict[str, Any]) -> datetime:
+    """First occurrence of a series: naive for all-day events, else aware in the series' own time zone"""
+    dtstart = series["dtstart"]
+    if len(dtstart) == 10:
+        return datetime.fromisoformat(dtstart)
+    start = datetime.fromisoformat(dtstart.replace('Z', '+00:00'))
+    if series.get("timezone"):
+        try:
+            # Expanding in the event's zone keeps wall-clock times right across DST changes
+            start = start.astimezone(ZoneInfo(series["timezone"]))
+        except ZoneInfoNotFoundError:
+            pass
+    return start
+
+def _until(match: re.Match, aware: bool) -> str:
+    day, clock, _ = match.groups()
+    if not aware:
+        return f"UNTIL={day}{clock or ''}"
+    return f"UNTIL={day}{clock or 'T235959'}Z"
+
+def series_rules(series: Dict[str, Any]):
+    """The series' RRULE/RDATE/EXDATE lines as a dateutil rruleset"""
+    start = series_start(series)
+    aware = start.tzinfo is not None
+    # dateutil wants UNTIL in UTC for zoned starts and floating for all-day ones; Google mixes both
+    lines = [UNTIL_PATTERN.sub(lambda match: _until(match, aware), line) for line in series["recurrence"].splitlines()]
+    return rrulestr("\n".join(lines), dtstart=start, forceset=True)
+
+def _window_bound(ts: int, aware: bool) -> datetime:
+    if aware:
+        return datetime.fromtimestamp(ts, timezone.utc)
+    return datetime.fromtimestamp(ts)
+
+def series_bounds(series: Dict[str, Any]) -> Tuple[int, Optional[int]]:
+    """Epoch start of the first occurrence and of the last one (None for an endless series)"""
+    start = series_start(series)
+    start_ts = int(start.timestamp())
+    lines = [line for line in series["recurrence"].splitlines() if line.startswith("RRULE")]
+    if any("COUNT=" not in line and "UNTIL=" not in line for line in lines):
+        return start_ts, None
+    try:
+        last = series_rules(series)[-1]
+    except IndexError:
+        # Every occurrence is excluded
+        return start_ts, start_ts - 1
+    return start_ts, int(last.timestamp())
+
+def occurrence_id(series_id: str, occurrence: datetime) -> str:
+    """Instance id in Google's own form: {series id}_{start as UTC basic time, or date for all-day}"""
+    if occurrence.tzinfo is None:
+        return f"{series_id}_{occurrence.strftime('%Y%m%d')}"
+    return f"{series_id}_{occurrence.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+def expand_series(series: Dict[str, Any], exceptions: Set[int], start_ts: int, end_ts: int) -> List[Dict[str, Any]]:
+    """Occurrences of a series starting in [start_ts, end_ts), minus moved or cancelled ones"""
+    rules = series_rules(series)
+    aware = series_start(series).tzinfo is not None
+    instances = []
+    for occurrence in rules.between(_window_bound(start_ts, aware), _window_bound(end_ts, aware), inc=True):
+        occurrence_ts = int(occurrence.timestamp())
+        if occurrence_ts >= end_ts or occurrence_ts in exceptions:
+            continue
+        start_local = occurrence.astimezone().replace(tzinfo=None) if aware else occurrence
+        end_local = start_local + timedelta(seconds=series["duration_s"])
+        instances.append({
+            "id": occurrence_id(series["id"], occurrence),
+            "title": series["title"],
+            "start_time": start_local.isoformat(),
+            "end_time": end_local.isoformat(),
+            "start_ts": occurrence_ts,
+            "end_ts": occurrence_ts + series["duration_s"],
+            "color": series["color"],
+            "description": series["description"],
+            "location": series["location"],
+            "calendar_id": series["calendar_id"],
+            "calendar_color": series["calendar_color"],
+            "recurring_event_id": series["id"]
+        })
+    return instances
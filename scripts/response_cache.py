@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from scripts.http_client import http_client
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# Defaults for integration reads: served from memory while fresh, then served stale while one
+# background request (conditional, when the API gave us a validator) refreshes the entry
+DEFAULT_TTL_S = 60
+DEFAULT_STALE_S = 300
+
+class ResponseCache:
+    """In-memory HTTP response cache for Google and Notion JSON reads.
+
+    Entries are keyed by method, URL, query parameters, request body and
+    credential, and keep the parsed JSON with its ETag / Last-Modified.
+    A fresh entry is returned without a request. A stale one is returned
+    at once while a single background request revalidates it with
+    If-None-Match / If-Modified-Since, so a 304 only resets the entry's
+    age and nothing is downloaded or parsed again. Concurrent misses for
+    the same key share one request.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # In-flight fetches per (event loop, key); aiohttp sessions and tasks belong to one loop
+        self.in_flight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def make_key(method: str, url: str, params: Any, json_body: Any, authorization: Optional[str]) -> str:
+        """Cache key; the credential is hashed so each token or workspace key gets its own entries"""
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        credential = hashlib.sha256(authorization.encode()).hexdigest()[:16] if authorization else ""
+        body = json.dumps(json_body, sort_keys=True) if json_body is not None else ""
+        return f"{method} {url}?{json.dumps(params or [], default=str)}|{body}|{credential}"
+
+    def _count(self, integration: str, key: str):
+        stats = self.stats.setdefault(integration, {
+            "requests": 0,
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "revalidations": 0,
+            "coalesced": 0,
+            "stale_on_error": 0,
+            "errors": 0
+        })
+        stats[key] += 1
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get_json(self, integration: str, url: str, headers: Dict[str, str], params: Any = None,
+                       method: str = "GET", json_body: Any = None, ttl: float = DEFAULT_TTL_S,
+                       stale_ttl: float = DEFAULT_STALE_S,
+                       before_request: Callable[[], Awaitable[Any]] = None) -> Tuple[int, Optional[Any]]:
+        """(status, parsed JSON) of a read, from the cache when possible.
+
+        ttl=0 still keeps the response when it carries a validator. With
+        stale_ttl=0 as well, every call then waits on a conditional request
+        that a 304 answers cheaply; with the default stale_ttl the entry is
+        returned at once, up to stale_ttl seconds old, while it revalidates.
+        Non-200 responses are never cached and come back with None.
+        """
+        key = self.make_key(method, url, params, json_body, headers.get("Authorization"))
+        self._count(integration, "requests")
+        entry = self.entries.get(key)
+
+        if entry:
+            age = time.monotonic() - entry["fetched_at"]
+            if age < entry["ttl"]:
+                self._count(integration, "hits")
+                self.entries.move_to_end(key)
+                return 200, entry["data"]
+            if age < entry["ttl"] + entry["stale_ttl"]:
+                self._count(integration, "stale_hits")
+                self.entries.move_to_end(key)
+                self._start_fetch(key, integration, url, headers, params, method, json_body, ttl, stale_ttl, before_request)
+                return 200, entry["data"]
+
+        task_key = (id(asyncio.get_running_loop()), key)
+        if task_key in self.in_flight:
+            self._count(integration, "coalesced")
+        task = self._start_fetch(key, integration, url, headers, params, method, json_body, ttl, stale_ttl, before_request)
+        # Shield so one cancelled caller does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key: str, *args) -> asyncio.Task:
+        task_key = (id(asyncio.get_running_loop()), key)
+        task = self.in_flight.get(task_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, *args))
+            self.in_flight[task_key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(task_key, None))
+        return task
+
+    async def _fetch(self, key: str, integration: str, url: str, headers: Dict[str, str], params: Any, method: str,
+                     json_body: Any, ttl: float, stale_ttl: float,
+                     before_request: Optional[Callable[[], Awaitable[Any]]]) -> Tuple[int, Optional[Any]]:
+        entry = self.entries.get(key)
+        request_headers = dict(headers)
+        if entry and entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+        if entry:
+            self._count(integration, "revalidations")
+
+        try:
+            if before_request:
+                await before_request()
+            session = http_client.session(integration)
+            async with session.request(method, url, headers=request_headers, params=params, json=json_body) as response:
+                if response.status == 304 and entry:
+                    self._count(integration, "not_modified")
+                    entry["fetched_at"] = time.monotonic()
+                    entry["ttl"], entry["stale_ttl"] = ttl, stale_ttl
+                    return 200, entry["data"]
+                if response.status != 200:
+                    self._count(integration, "errors")
+                    print(f"⚠️  {integration} read {response.status} for {url}: {(await response.text())[:200]}")
+                    return response.status, None
+                data = await response.json()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            if entry:
+                # An outage keeps serving what we last knew rather than failing the page
+                self._count(integration, "stale_on_error")
+                print(f"⚠️  {integration} read failed for {url}, serving cached copy: {e}")
+                return 200, entry["data"]
+            self._count(integration, "errors")
+            raise
+
+        self._count(integration, "misses")
+        if ttl > 0 or etag or last_modified:
+            self._store(key, {
+                "data": data,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": time.monotonic(),
+                "ttl": ttl,
+                "stale_ttl": stale_ttl
+            })
+        return 200, data
+
+    def invalidate(self, url_prefix: str = "") -> int:
+        """Drop cached responses whose URL starts with url_prefix (all of them by default)"""
+        keys = [key for key in self.entries if key.split(" ", 1)[1].startswith(url_prefix)]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        integrations = {}
+        for name, stats in self.stats.items():
+            served = stats["hits"] + stats["stale_hits"]
+            integrations[name] = {
+                **stats,
+                "hit_ratio": round(served / stats["requests"], 3) if stats["requests"] else 0
+            }
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self.in_flight),
+            "integrations": integrations
+        }
+
+# Global instance
+response_cache = ResponseCache()
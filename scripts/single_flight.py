@@ -0,0 +1,100 @@
+
+import asyncio
+import re
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+class _Broadcast:
+    """Replayable chunk stream shared by every subscriber of one in-flight generation"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.condition = asyncio.Condition()
+
+    async def publish(self, chunk: Any):
+        async with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    async def close(self, error: Optional[BaseException] = None):
+        async with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yield every chunk from the start, then follow the live stream until it closes"""
+        position = 0
+        while True:
+            async with self.condition:
+                await self.condition.wait_for(lambda: position < len(self.chunks) or self.done)
+                pending = self.chunks[position:]
+                finished = self.done
+                error = self.error
+
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+
+            if finished and position >= len(self.chunks):
+                if error:
+                    raise error
+                return
+
+class SingleFlight:
+    """Coalesces concurrent identical requests onto one in-flight generation.
+
+    The first caller for a key becomes the leader and runs the producer as a
+    task; callers that arrive while it is running subscribe to its token
+    stream instead of starting their own. Keys are forgotten as soon as the
+    stream ends, so nothing is cached beyond the in-flight window.
+    """
+
+    def __init__(self):
+        self._streams: Dict[str, _Broadcast] = {}
+        self.stats = {
+            "streams_started": 0,
+            "streams_coalesced": 0
+        }
+
+    @staticmethod
+    def make_key(question: str, **params: Any) -> str:
+        """Build a key from a normalized question plus the retrieval parameters"""
+        normalized = re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+        param_text = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"{normalized}|{param_text}"
+
+    async def stream(self, key: str, producer: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Run producer once per key at a time and fan its chunks out to every concurrent subscriber"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.stats["streams_started"] += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            asyncio.ensure_future(self._pump(key, broadcast, producer))
+        else:
+            self.stats["streams_coalesced"] += 1
+
+        async for chunk in broadcast.subscribe():
+            yield chunk
+
+    async def _pump(self, key: str, broadcast: _Broadcast, producer: Callable[[], AsyncIterator[Any]]):
+        error = None
+        try:
+            async for chunk in producer():
+                await broadcast.publish(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            self._streams.pop(key, None)
+            await broadcast.close(error)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "in_flight_streams": len(self._streams)
+        }
+
+# Global instance
+single_flight = SingleFlight()
@@ -0,0 +1,167 @@
+
+import asyncio
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+class SyncJob:
+    """One run of a sync function on the worker"""
+
+    def __init__(self, name: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.params = params
+        self.status = "queued"
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "params": self.params,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+class SyncWorker:
+    """Runs sync jobs on a dedicated thread with its own event loop.
+
+    Sync passes crawl APIs, hash text and write to SQLite; doing that on the
+    request loop stalls every HTTP and WebSocket handler while it runs. Jobs
+    submitted here run on the worker's loop instead, one job per name at a
+    time, and can be inspected or cancelled from the app through start,
+    status and cancel.
+    """
+
+    def __init__(self, name: str = "sync-worker", history: int = 50):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.jobs: Dict[str, SyncJob] = {}
+        self.finished: Deque[str] = deque(maxlen=history)
+        self.schedules: List[Future] = []
+        self.shutdown_hooks: List[Callable] = []
+        self.lock = threading.Lock()
+
+    def ensure_started(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+            self.thread.start()
+
+    async def _run(self, job: SyncJob, fn: Callable, kwargs: Dict[str, Any]):
+        job.status = "running"
+        job.started_at = datetime.now().isoformat()
+        try:
+            await fn(**kwargs)
+            job.status = "succeeded"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Sync job {job.name} failed: {e}")
+
+    def _finish(self, job: SyncJob, future: Future):
+        # Also reached for jobs cancelled before they started running
+        if future.cancelled():
+            job.status = "cancelled"
+        job.finished_at = datetime.now().isoformat()
+        with self.lock:
+            self.finished.append(job.id)
+            # Keep only the most recent finished jobs
+            self.jobs = {job_id: other for job_id, other in self.jobs.items()
+                         if other.finished_at is None or job_id in self.finished}
+
+    def start(self, name: str, fn: Callable, **kwargs) -> Dict[str, Any]:
+        """Submit fn(**kwargs) as a job; if a job with this name is still active, return that one"""
+        self.ensure_started()
+        with self.lock:
+            for job in self.jobs.values():
+                if job.name == name and job.finished_at is None:
+                    return {**job.to_dict(), "already_running": True}
+
+            job = SyncJob(name, kwargs)
+            self.jobs[job.id] = job
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, fn, kwargs), self.loop)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return {**job.to_dict(), "already_running": False}
+
+    def status(self, job_id: str = None) -> Optional[Dict[str, Any]]:
+        """One job by id, or every active and recently finished job"""
+        with self.lock:
+            if job_id:
+                job = self.jobs.get(job_id)
+                return job.to_dict() if job else None
+            jobs = sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+            return {
+                "worker_running": bool(self.thread and self.thread.is_alive()),
+                "active": [job.to_dict() for job in jobs if job.finished_at is None],
+                "recent": [job.to_dict() for job in jobs if job.finished_at is not None]
+            }
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; the job's coroutine sees CancelledError at its next await"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if not job:
+            return None
+        if job.finished_at is None and job.future:
+            job.future.cancel()
+        return job.to_dict()
+
+    def every(self, name: str, fn: Callable, interval_s: float, first_delay_s: float = 0, **kwargs):
+        """Start fn as a job every interval_s seconds, skipping a tick while the previous run is active"""
+        self.ensure_started()
+
+        async def schedule():
+            await asyncio.sleep(first_delay_s)
+            while True:
+                self.start(name, fn, **kwargs)
+                await asyncio.sleep(interval_s)
+
+        self.schedules.append(asyncio.run_coroutine_threadsafe(schedule(), self.loop))
+
+    def add_shutdown_hook(self, fn: Callable):
+        """Run the coroutine function fn on the worker's loop when the worker stops (e.g. to close sessions)"""
+        self.shutdown_hooks.append(fn)
+
+    def stop(self, timeout: float = 10):
+        """Cancel schedules and active jobs, then stop the worker thread"""
+        if not self.loop:
+            return
+        for schedule in self.schedules:
+            schedule.cancel()
+        self.schedules = []
+        with self.lock:
+            active = [job for job in self.jobs.values() if job.finished_at is None and job.future]
+        for job in active:
+            job.future.cancel()
+        for job in active:
+            try:
+                job.future.result(timeout=timeout)
+            except BaseException:
+                pass
+        for hook in self.shutdown_hooks:
+            try:
+                asyncio.run_coroutine_threadsafe(hook(), self.loop).result(timeout=timeout)
+            except Exception as e:
+                print(f"⚠️  Sync worker shutdown hook failed: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+# Global instance
+sync_worker = SyncWorker()
@@ -56,6 +56,17 @@ function AtlasChatBox() {
                     
                     return newMessages;
                 });
+            } else if (data.type === 'cached') {
+                // Live answer is slow; show the cached one until it arrives
+                setMessages(prev => [
+                    ...prev,
+                    { role: 'assistant', content: data.content, cached: true }
+                ]);
+            } else if (data.type === 'replace') {
+                setMessages(prev => {
+                    const lastMessage = prev[prev.length - 1];
+                    return lastMessage && lastMessage.cached ? prev.slice(0, -1) : prev;
+                });
             } else if (data.type === 'complete') {
                 setMessages(prev => {
                     const newMessages = [...prev];
@@ -155,7 +166,17 @@ function AtlasChatBox() {
                 whiteSpace: 'pre-wrap',
                 wordBreak: 'break-word'
             }
-        }, message.content));
+        }, message.cached ? [
+            React.createElement('div', {
+                key: 'cached-label',
+                style: {
+                    fontSize: '0.75rem',
+                    opacity: 0.6,
+                    marginBottom: '4px'
+                }
+            }, 'Cached answer - updating when the live answer arrives'),
+            message.content
+        ] : message.content));
     };
 
     return React.createElement('div', {
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+def pytest_configure():
+    """Run from a scratch directory: the stores open data/*.db relative to the working directory on import"""
+    os.chdir(tempfile.mkdtemp(prefix="atlas-tests-"))
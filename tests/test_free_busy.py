@@ -0,0 +1,107 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from scripts import free_busy
+from scripts.free_busy import FreeBusyEngine, IntervalTree, answer_schedule_question
+
+def event(event_id, start, end):
+    start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    return {
+        "id": event_id,
+        "title": event_id,
+        "start_time": start_dt.isoformat(),
+        "end_time": end_dt.isoformat(),
+        "start_ts": int(start_dt.timestamp()),
+        "end_ts": int(end_dt.timestamp())
+    }
+
+@pytest.fixture
+def calendar(monkeypatch):
+    """A FreeBusyEngine over an in-memory list of events instead of events.db"""
+    events = []
+    monkeypatch.setattr(free_busy.calendar_store, "events_between",
+                        lambda start_ts, end_ts: [e for e in events if e["start_ts"] < end_ts and e["end_ts"] > start_ts])
+    monkeypatch.setattr(free_busy.calendar_store, "has_synced", lambda: True)
+    engine = FreeBusyEngine()
+    monkeypatch.setattr(free_busy, "free_busy", engine)
+    return events
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for n in range(300):
+        start = rng.randrange(0, 10_000)
+        intervals.append((start, start + rng.randrange(1, 500), n))
+    tree = IntervalTree(intervals)
+    assert len(tree) == 300
+
+    for _ in range(200):
+        start = rng.randrange(0, 10_500)
+        end = start + rng.randrange(1, 800)
+        expected = sorted(n for s, e, n in intervals if s < end and e > start)
+        assert sorted(tree.overlapping(start, end)) == expected
+
+def test_interval_tree_is_half_open():
+    tree = IntervalTree([(10, 20, "a"), (20, 30, "b")])
+    assert tree.overlapping(20, 25) == ["b"]
+    assert tree.overlapping(0, 10) == []
+    assert tree.overlapping(19, 21) == ["a", "b"]
+    assert tree.overlapping(30, 40) == []
+    assert IntervalTree([]).overlapping(0, 100) == []
+
+def test_free_slots_and_conflicts(calendar):
+    calendar.extend([
+        event("standup", "2030-01-07T09:00:00", "2030-01-07T09:30:00"),
+        event("review", "2030-01-07T09:15:00", "2030-01-07T10:00:00"),
+        event("lunch", "2030-01-07T12:00:00", "2030-01-07T13:00:00"),
+        event("holiday", "2030-01-07T00:00:00", "2030-01-08T00:00:00")
+    ])
+    engine = free_busy.free_busy
+    day_start = int(datetime(2030, 1, 7, 9).timestamp())
+    day_end = int(datetime(2030, 1, 7, 18).timestamp())
+
+    blocks = engine.busy_blocks(day_start, day_end)
+    assert [(block["start_ts"], block["end_ts"]) for block in blocks] == [
+        (day_start, int(datetime(2030, 1, 7, 10).timestamp())),
+        (int(datetime(2030, 1, 7, 12).timestamp()), int(datetime(2030, 1, 7, 13).timestamp()))
+    ]
+    assert blocks[0]["events"] == ["standup", "review"]
+
+    assert engine.free_slots(day_start, day_end, 60 * 60) == [
+        (int(datetime(2030, 1, 7, 10).timestamp()), int(datetime(2030, 1, 7, 12).timestamp())),
+        (int(datetime(2030, 1, 7, 13).timestamp()), day_end)
+    ]
+    # All-day events only block time when asked to
+    assert "holiday" not in [e["id"] for e in engine.conflicts(day_start, day_end)]
+    assert "holiday" in [e["id"] for e in engine.conflicts(day_start, day_end, include_all_day=True)]
+
+def test_next_free_slot_skips_busy_time(calendar):
+    calendar.append(event("focus", "2030-01-07T09:00:00", "2030-01-07T11:00:00"))
+    slot = free_busy.free_busy.next_free_slot(30 * 60, datetime(2030, 1, 7, 8))
+    assert slot[0] == int(datetime(2030, 1, 7, 11).timestamp())
+
+@pytest.mark.parametrize("question", [
+    "What should I do in my free time?",
+    "is the API free slot pricing per seat?",
+    "Tell me about my availability in general",
+    "am I free",
+    "Who is busy tomorrow?"
+])
+@pytest.mark.usefixtures("calendar")
+def test_other_questions_fall_through(question):
+    assert answer_schedule_question(question, datetime(2030, 1, 7, 8)) is None
+
+def test_availability_questions_are_answered(calendar):
+    calendar.append(event("lunch", "2030-01-08T12:00:00", "2030-01-08T13:00:00"))
+    now = datetime(2030, 1, 7, 8)
+    assert answer_schedule_question("Am I free tomorrow morning?", now) == \
+        "You're free all of tomorrow morning (09:00–12:00)."
+    assert answer_schedule_question("am i busy tomorrow afternoon", now) == "You're free tomorrow afternoon 13:00–17:00."
+    assert answer_schedule_question("Hey Atlas, when am I free?", now) == "Your next free half hour is Monday at 09:00."
+
+@pytest.mark.usefixtures("calendar")
+def test_nothing_is_answered_before_a_calendar_has_synced(monkeypatch):
+    monkeypatch.setattr(free_busy.calendar_store, "has_synced", lambda: False)
+    assert answer_schedule_question("Am I free tomorrow?", datetime(2030, 1, 7, 8)) is None
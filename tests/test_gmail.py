@@ -0,0 +1,110 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from scripts import gmail
+
+BOUNDARY = "batch_abc123"
+
+def batch_part(item: int, status: str, body=None) -> str:
+    payload = json.dumps(body) if body is not None else ""
+    return (
+        f"--{BOUNDARY}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <response-item{item}>\r\n\r\n"
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+        f"{payload}\r\n"
+    )
+
+def test_parse_batch_response_keys_parts_by_position():
+    body = (
+        batch_part(1, "429 Too Many Requests", {"error": {"code": 429}})
+        + batch_part(0, "200 OK", {"id": "m0", "snippet": "hello"})
+        + batch_part(2, "404 Not Found")
+        + f"--{BOUNDARY}--\r\n"
+    )
+    parts = gmail.parse_batch_response(body, f'multipart/mixed; boundary="{BOUNDARY}"')
+    assert parts[0] == (200, {"id": "m0", "snippet": "hello"})
+    assert parts[1][0] == 429
+    assert parts[2] == (404, None)
+
+def test_parse_batch_response_tolerates_bad_json_and_bare_newlines():
+    body = (batch_part(0, "200 OK", {"id": "m0"}) + f"--{BOUNDARY}\r\nContent-ID: <response-item1>\r\n\r\n"
+            "HTTP/1.1 500 Internal Server Error\r\n\r\n<html>oops</html>\r\n" + f"--{BOUNDARY}--").replace("\r\n", "\n")
+    parts = gmail.parse_batch_response(body, f"multipart/mixed; boundary={BOUNDARY}")
+    assert parts == {0: (200, {"id": "m0"}), 1: (500, None)}
+
+def test_parse_batch_response_needs_a_boundary():
+    with pytest.raises(ValueError):
+        gmail.parse_batch_response("", "application/json")
+
+def test_build_batch_body_asks_for_metadata_only():
+    body = gmail.build_batch_body(["a", "b"], BOUNDARY)
+    assert body.endswith(f"--{BOUNDARY}--\r\n")
+    assert re.findall(r"Content-ID: <item(\d+)>", body) == ["0", "1"]
+    assert "GET /gmail/v1/users/me/messages/b?format=metadata&metadataHeaders=From" in body
+
+def test_message_summary():
+    summary = gmail.message_summary({
+        "id": "m1",
+        "threadId": "t1",
+        "labelIds": ["UNREAD", "INBOX"],
+        "snippet": "See you then",
+        "internalDate": "1893456000000",
+        "payload": {"headers": [
+            {"name": "From", "value": "Ada Lovelace <Ada@Example.com>"},
+            {"name": "To", "value": "me@example.com, Bob <bob@example.com>"},
+            {"name": "Subject", "value": "Lunch"}
+        ]}
+    })
+    assert summary["sender_email"] == "ada@example.com"
+    assert summary["recipients"] == ["me@example.com", "bob@example.com"]
+    assert summary["subject"] == "Lunch"
+    assert summary["received_at"].timestamp() == 1893456000
+
+class FakeResponse:
+    def __init__(self, status, data=None, text="", headers=None):
+        self.status = status
+        self.data = data
+        self._text = text
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return self._text
+
+class FakeSession:
+    """Batch endpoint serving the first message and rate limiting the rest; single gets by id status"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.gets = []
+
+    def post(self, _url, **_kwargs):
+        body = batch_part(0, "200 OK", {"id": "ok-batch"}) + batch_part(1, "429 Too Many Requests") + f"--{BOUNDARY}--"
+        return FakeResponse(200, text=body, headers={"Content-Type": f"multipart/mixed; boundary={BOUNDARY}"})
+
+    def get(self, url, **_kwargs):
+        message_id = url.rsplit("/", 1)[1]
+        self.gets.append(message_id)
+        return FakeResponse(self.statuses[message_id], {"id": message_id})
+
+def test_fetch_messages_retries_individually_and_reports_failures():
+    ids = ["ok-batch", "ok-retry", "gone", "broken"]
+    session = FakeSession({"ok-retry": 200, "gone": 404, "broken": 503})
+    messages, failed = asyncio.run(gmail.fetch_messages(session, "token", ids))
+    assert [message["id"] for message in messages] == ["ok-batch", "ok-retry"]
+    # 404 means deleted and is dropped; anything else is handed back for a retry
+    assert failed == ["broken"]
+    assert sorted(session.gets) == ["broken", "gone", "ok-retry"]
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from scripts import llm_scheduler
+from scripts.llm_scheduler import BACKGROUND, BATCH, INTERACTIVE, AdmissionTimeout, LLMScheduler
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def hold(scheduler, priority, est_tokens, order, tag, release: asyncio.Event = None):
+    """Take a slot, note the dispatch, and keep it until release is set (or hand it straight back)"""
+    async with scheduler.slot(priority, est_tokens):
+        order.append(tag)
+        if release is not None:
+            await release.wait()
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_stride_shares_dispatches_by_weight():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=10 ** 9)
+        order = []
+        gate = asyncio.Event()
+        blocker = asyncio.create_task(hold(scheduler, INTERACTIVE, 1, order, "blocker", gate))
+        await settle()
+
+        tasks = [
+            asyncio.create_task(hold(scheduler, priority, 1, order, priority))
+            for _ in range(24)
+            for priority in (INTERACTIVE, BATCH, BACKGROUND)
+        ]
+        await settle()
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return order[1:]
+
+    order = run(scenario())
+    first = order[:24]
+    # 8:3:1 weights over 24 dispatches while every class has work queued
+    assert first.count(INTERACTIVE) == 16
+    assert first.count(BATCH) == 6
+    assert first.count(BACKGROUND) == 2
+    assert len(order) == 72
+
+def test_reserved_slot_is_only_for_interactive():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2, tokens_per_minute=10 ** 9)
+        assert scheduler.reserved_interactive == 1
+        order = []
+        gate = asyncio.Event()
+        first = asyncio.create_task(hold(scheduler, BACKGROUND, 1, order, "background-1", gate))
+        second = asyncio.create_task(hold(scheduler, BACKGROUND, 1, order, "background-2", gate))
+        await settle()
+        assert order == ["background-1"]
+
+        chat = asyncio.create_task(hold(scheduler, INTERACTIVE, 1, order, "interactive", gate))
+        await settle()
+        assert order == ["background-1", "interactive"]
+
+        gate.set()
+        await asyncio.gather(first, second, chat)
+        return order
+
+    assert run(scenario())[-1] == "background-2"
+
+def test_small_request_bypasses_head_waiting_for_tokens():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=4, tokens_per_minute=6000)
+        scheduler._tokens = 1000
+        order = []
+        large = asyncio.create_task(hold(scheduler, INTERACTIVE, 5000, order, "large"))
+        await settle()
+        small = asyncio.create_task(hold(scheduler, BATCH, 500, order, "small"))
+        await settle()
+        dispatched = list(order)
+        large.cancel()
+        await asyncio.gather(large, small, return_exceptions=True)
+        return dispatched, scheduler.stats["bypassed"]
+
+    dispatched, bypassed = run(scenario())
+    assert dispatched == ["small"]
+    assert bypassed == 1
+
+def test_bypass_stops_once_head_has_waited_too_long(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "TOKEN_BYPASS_MAX_WAIT_S", 0)
+
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=4, tokens_per_minute=6000)
+        scheduler._tokens = 1000
+        order = []
+        large = asyncio.create_task(hold(scheduler, INTERACTIVE, 5000, order, "large"))
+        await settle()
+        small = asyncio.create_task(hold(scheduler, BATCH, 500, order, "small"))
+        await settle()
+        dispatched = list(order)
+        large.cancel()
+        small.cancel()
+        await asyncio.gather(large, small, return_exceptions=True)
+        return dispatched, scheduler.stats["bypassed"]
+
+    assert run(scenario()) == ([], 0)
+
+def test_cancel_after_grant_hands_the_slot_back():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=10 ** 9)
+        await scheduler.acquire(INTERACTIVE, 1)
+        waiter = asyncio.create_task(scheduler.acquire(BATCH, 1))
+        await settle()
+
+        # Releasing grants the waiter's future; cancelling it in the same tick must not leak the slot
+        scheduler.release(1, None)
+        assert scheduler._active == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return scheduler._active
+
+    assert run(scenario()) == 0
+
+def test_slot_timeout_raises_admission_timeout():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, tokens_per_minute=10 ** 9)
+        gate = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, INTERACTIVE, 1, [], "holder", gate))
+        await settle()
+        started = time.monotonic()
+        with pytest.raises(AdmissionTimeout):
+            async with scheduler.slot(INTERACTIVE, 1, timeout=0.05):
+                pass
+        waited = time.monotonic() - started
+        gate.set()
+        await holder
+        return waited, scheduler._active, scheduler.get_stats()["queue_depth"]
+
+    waited, active, queue_depth = run(scenario())
+    assert waited < 1
+    assert active == 0
+    assert sum(queue_depth.values()) == 0
+
+def test_estimate_tokens():
+    messages = [{"role": "system", "content": "x" * 400}, {"role": "user", "content": "y" * 40}]
+    assert llm_scheduler.estimate_tokens(messages, max_tokens=100) == 210
@@ -0,0 +1,52 @@
+import asyncio
+
+from scripts import notion_sync
+from scripts.notion_store import notion_store
+from scripts.notion_sync import NotionSync, chunk_text, sync_page, text_hash
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("Title: Groceries\nmilk\neggs") == ["Title: Groceries\nmilk\neggs"]
+    assert chunk_text("") == []
+    assert chunk_text("\n\n  \n") == []
+
+def test_chunks_stay_under_the_limit_and_break_on_lines():
+    lines = [f"line {n} " + "word " * 10 for n in range(200)]
+    chunks = chunk_text("\n".join(lines), max_tokens=50, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    # Every line survives whole, in order, exactly once when there is no overlap
+    assert "\n".join(chunks).split("\n") == lines
+
+def test_chunks_repeat_the_tail_of_the_previous_one():
+    lines = [f"paragraph {n:03d} " + "x" * 40 for n in range(40)]
+    chunks = chunk_text("\n".join(lines), max_tokens=50, overlap_tokens=15)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split("\n")[0] == previous.split("\n")[-1]
+        assert len(current) <= 200
+
+def test_long_lines_are_split_on_spaces():
+    line = " ".join(f"w{n:04d}" for n in range(500))
+    chunks = chunk_text(line, max_tokens=25, overlap_tokens=0)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert " ".join(chunks).split() == line.split()
+    # No separator, so the line is cut at the limit
+    assert chunk_text("x" * 250, max_tokens=25, overlap_tokens=0) == ["x" * 100, "x" * 100, "x" * 50]
+
+def test_page_emptied_below_the_minimum_drops_its_old_chunks(monkeypatch):
+    notion = NotionSync("tests", "token")
+    notion_store.record_page("emptied", "notion_page", "2030-01-01T00:00:00.000Z", text_hash("old text"), 3,
+                             workspace="tests")
+
+    async def get_page_content(_page_id, **_kwargs):
+        return {"properties": {}, "blocks": [], "blocks_truncated": False}
+
+    monkeypatch.setattr(notion, "get_page_content", get_page_content)
+    page = {"id": "emptied", "last_edited_time": "2030-01-02T00:00:00.000Z"}
+    result = asyncio.run(sync_page(notion, page, "notion_page", {}))
+
+    assert result["chunks"] == []
+    assert result["vector_ids"] == []
+    assert result["stale_ids"] == [f"{notion_sync.VECTOR_PREFIXES['notion_page']}emptied_{n}" for n in range(3)]
+    assert result["ledger"][0] == "emptied"
+    assert result["ledger"][3] == text_hash("")
+    assert result["ledger"][4] == 0
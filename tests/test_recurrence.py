@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from scripts import recurrence
+
+pytestmark = pytest.mark.skipif(not recurrence.available(), reason="python-dateutil is not installed")
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+def series(recurrence_lines, dtstart="2030-03-04T09:00:00-05:00", tz="America/New_York", duration_s=1800):
+    return {
+        "id": "weekly",
+        "dtstart": dtstart,
+        "timezone": tz,
+        "recurrence": "\n".join(recurrence_lines),
+        "duration_s": duration_s,
+        "title": "Weekly sync",
+        "color": None,
+        "description": "",
+        "location": "",
+        "calendar_id": "primary",
+        "calendar_color": None
+    }
+
+def ts(year, month, day, hour=0, minute=0, tz=timezone.utc):
+    return int(datetime(year, month, day, hour, minute, tzinfo=tz).timestamp())
+
+def test_wall_clock_time_holds_across_dst():
+    # US daylight saving time starts on 2030-03-10
+    weekly = series(["RRULE:FREQ=WEEKLY;COUNT=3"])
+    instances = recurrence.expand_series(weekly, set(), ts(2030, 3, 1), ts(2030, 4, 1))
+    starts = [datetime.fromtimestamp(instance["start_ts"], NEW_YORK) for instance in instances]
+    assert [(start.day, start.hour) for start in starts] == [(4, 9), (11, 9), (18, 9)]
+    assert [instance["id"] for instance in instances] == [
+        "weekly_20300304T140000Z", "weekly_20300311T130000Z", "weekly_20300318T130000Z"
+    ]
+    assert all(instance["end_ts"] - instance["start_ts"] == 1800 for instance in instances)
+    assert instances[0]["recurring_event_id"] == "weekly"
+
+def test_exdate_and_moved_occurrences_are_left_out():
+    weekly = series(["RRULE:FREQ=WEEKLY;COUNT=4", "EXDATE;TZID=America/New_York:20300311T090000"])
+    moved = {ts(2030, 3, 18, 9, tz=NEW_YORK)}
+    instances = recurrence.expand_series(weekly, moved, ts(2030, 3, 1), ts(2030, 4, 1))
+    assert [datetime.fromtimestamp(i["start_ts"], NEW_YORK).day for i in instances] == [4, 25]
+
+def test_window_is_half_open():
+    weekly = series(["RRULE:FREQ=WEEKLY;COUNT=3"])
+    second = ts(2030, 3, 11, 9, tz=NEW_YORK)
+    assert [i["start_ts"] for i in recurrence.expand_series(weekly, set(), second, second + 1)] == [second]
+    assert recurrence.expand_series(weekly, set(), second - 3600, second) == []
+
+def test_date_only_until_covers_the_whole_last_day():
+    weekly = series(["RRULE:FREQ=WEEKLY;UNTIL=20300318"])
+    instances = recurrence.expand_series(weekly, set(), ts(2030, 3, 1), ts(2030, 5, 1))
+    assert len(instances) == 3
+    assert recurrence.series_bounds(weekly) == (ts(2030, 3, 4, 9, tz=NEW_YORK), ts(2030, 3, 18, 9, tz=NEW_YORK))
+
+def test_series_bounds():
+    assert recurrence.series_bounds(series(["RRULE:FREQ=WEEKLY"]))[1] is None
+    excluded = series(["RRULE:FREQ=WEEKLY;COUNT=1", "EXDATE;TZID=America/New_York:20300304T090000"])
+    start_ts, end_ts = recurrence.series_bounds(excluded)
+    assert end_ts < start_ts
+
+def test_all_day_series_expand_to_dates():
+    daily = series(["RRULE:FREQ=DAILY;UNTIL=20300103"], dtstart="2030-01-01", tz=None, duration_s=86400)
+    start = int(datetime(2030, 1, 1).timestamp())
+    instances = recurrence.expand_series(daily, set(), start, start + 10 * 86400)
+    assert [instance["id"] for instance in instances] == ["weekly_20300101", "weekly_20300102", "weekly_20300103"]
+    assert instances[0]["start_time"] == "2030-01-01T00:00:00"
+    assert instances[0]["end_time"] == "2030-01-02T00:00:00"
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from scripts.single_flight import SingleFlight
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+def test_make_key_normalizes_the_question():
+    assert SingleFlight.make_key("  What's on  today? ", k=5) == SingleFlight.make_key("what's on today", k=5)
+    assert SingleFlight.make_key("what's on today", k=5) != SingleFlight.make_key("what's on today", k=3)
+    assert SingleFlight.make_key("q", b=1, a=2) == "q|a=2&b=1"
+
+def test_concurrent_subscribers_share_one_producer():
+    async def scenario():
+        flight = SingleFlight()
+        runs = 0
+        release = asyncio.Event()
+
+        async def producer():
+            nonlocal runs
+            runs += 1
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        first = asyncio.create_task(collect(flight.stream("key", producer)))
+        second = asyncio.create_task(collect(flight.stream("key", producer)))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(first, second), runs, flight.get_stats()
+
+    results, runs, stats = asyncio.run(scenario())
+    assert results == [["a", "b"], ["a", "b"]]
+    assert runs == 1
+    assert stats["streams_started"] == 1
+    assert stats["streams_coalesced"] == 1
+    assert stats["in_flight_streams"] == 0
+
+def test_late_subscriber_replays_chunks_from_the_start():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def producer():
+            for chunk in ("one", "two"):
+                yield chunk
+            await release.wait()
+            yield "three"
+
+        first = asyncio.create_task(collect(flight.stream("key", producer)))
+        # Let the leader publish its first chunks before the second caller arrives
+        await asyncio.sleep(0.01)
+        late = asyncio.create_task(collect(flight.stream("key", producer)))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(first, late)
+
+    assert asyncio.run(scenario()) == [["one", "two", "three"], ["one", "two", "three"]]
+
+def test_key_is_forgotten_once_the_stream_ends():
+    async def scenario():
+        flight = SingleFlight()
+        runs = 0
+
+        async def producer():
+            nonlocal runs
+            runs += 1
+            yield runs
+
+        first = await collect(flight.stream("key", producer))
+        second = await collect(flight.stream("key", producer))
+        return first, second
+
+    assert asyncio.run(scenario()) == ([1], [2])
+
+def test_producer_error_reaches_every_subscriber_after_its_chunks():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def producer():
+            yield "partial"
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        async def subscriber():
+            received = []
+            with pytest.raises(RuntimeError, match="upstream failed"):
+                async for chunk in flight.stream("key", producer):
+                    received.append(chunk)
+            return received
+
+        return await asyncio.gather(subscriber(), subscriber())
+
+    assert asyncio.run(scenario()) == [["partial"], ["partial"]]